@@ -0,0 +1,453 @@
+"""Vectorized analytics over corpora of mahjong game states
+
+Loads a corpus of game states once into columnar NumPy arrays (one row per
+state, per player and per tile) and computes aggregates over all states with
+array operations instead of per-state Python code:
+
+    remaining_tiles      Tiles left in the wall, as in the rendered game
+                         information box
+    riichi_bets          Riichi sticks on the table per state
+    tile_visibility      How often each tile is held in a hand or discarded,
+                         discards being the tiles visible to every player
+    discards_by_suit     Discards per suit (man, pin, sou, honors)
+    riichi_by_seat_wind  Riichi declarations by the seat wind of the player
+
+Like mahjong_validator it does not import Pillow. JSONL files are parsed in
+batches in parallel worker processes. Records that fail validation or hold
+unknown tiles are skipped and counted.
+
+Usage:
+    python mahjong_analytics.py corpus.jsonl states/ 'logs/*.jsonl'
+                                [--workers N] [--output summary.json|.csv]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    # Unlike the renderer, which falls back to Pillow, nothing works without it
+    raise ImportError(
+        "mahjong_analytics requires NumPy: pip install numpy, or install "
+        "scriptmahjong with the numpy extra"
+    ) from None
+
+from mahjong_model import (
+    TILE_CODES,
+    InvalidInputError,
+    encode_tiles,
+    validate_game_data,
+)
+from mahjong_validator import collect_corpus, positive_int
+
+# Seat and round winds, in seat order; other wind values are grouped as
+# len(WINDS)
+WINDS = ("E", "S", "W", "N")
+WIND_INDEX = {wind: index for index, wind in enumerate(WINDS)}
+
+# Tiles in the wall, as used by MahjongVisualizer.calculate_remaining_tiles()
+WALL_TILES = 136
+
+# Suit of each tile id
+SUITS = ("man", "pin", "sou", "honors")
+TILE_SUIT = np.array(
+    [0] * 9 + [1] * 9 + [2] * 9 + [3] * 7 + [0, 1, 2],
+    dtype=np.uint8,
+)
+
+# Number of records handed to a worker at a time
+BATCH_SIZE = 2000
+
+
+class Corpus:
+    """Columnar arrays of the states of a corpus
+
+    State columns have one row per state, player columns one row per player
+    and tile columns one row per hand or discard tile. Rows refer to their
+    parent through player_state and tile_player.
+    """
+
+    STATE_COLUMNS = ("round_wind", "honba")
+    PLAYER_COLUMNS = ("player_state", "player_wind", "player_score", "player_riichi")
+    TILE_COLUMNS = ("tile_player", "tile_id", "tile_discard")
+
+    # Columns holding flags
+    BOOL_COLUMNS = ("player_riichi", "tile_discard")
+
+    def __init__(self, columns, skipped=0):
+        """Initialize the Corpus
+
+        Args:
+            columns: Dictionary of every STATE_COLUMNS, PLAYER_COLUMNS and
+                TILE_COLUMNS name to its NumPy array
+            skipped: Number of records left out as invalid
+        """
+        for name, values in columns.items():
+            setattr(self, name, values)
+        self.skipped = skipped
+
+    @property
+    def state_count(self):
+        return len(self.round_wind)
+
+    @property
+    def player_count(self):
+        return len(self.player_state)
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Join corpora loaded separately, in order, into one Corpus"""
+        parts = list(parts) or [CorpusBuilder().build()]
+        columns = {}
+        state_offsets = np.cumsum([0] + [part.state_count for part in parts[:-1]])
+        player_offsets = np.cumsum([0] + [part.player_count for part in parts[:-1]])
+        for name in cls.STATE_COLUMNS + cls.PLAYER_COLUMNS + cls.TILE_COLUMNS:
+            arrays = [getattr(part, name) for part in parts]
+            # Shift the parent references of every part past the rows before it
+            if name == "player_state":
+                arrays = [a + offset for a, offset in zip(arrays, state_offsets)]
+            elif name == "tile_player":
+                arrays = [a + offset for a, offset in zip(arrays, player_offsets)]
+            columns[name] = np.concatenate(arrays)
+        return cls(columns, sum(part.skipped for part in parts))
+
+    def tile_state(self):
+        """Return the state row of every tile"""
+        return self.player_state[self.tile_player]
+
+    def remaining_tiles(self):
+        """Return the tiles left in the wall of every state"""
+        used = np.bincount(self.tile_state(), minlength=self.state_count)
+        return WALL_TILES - used
+
+    def riichi_bets(self):
+        """Return the number of riichi sticks on the table in every state"""
+        return np.bincount(
+            self.player_state,
+            weights=self.player_riichi,
+            minlength=self.state_count,
+        ).astype(np.int64)
+
+    def tile_visibility(self):
+        """Return (hand counts, discard counts) arrays indexed by tile id"""
+        minlength = len(TILE_CODES)
+        discards = np.bincount(self.tile_id[self.tile_discard], minlength=minlength)
+        hands = np.bincount(self.tile_id[~self.tile_discard], minlength=minlength)
+        return hands, discards
+
+    def discards_by_suit(self):
+        """Return a (players, suits) array of discard counts per player"""
+        discard_player = self.tile_player[self.tile_discard]
+        discard_suit = TILE_SUIT[self.tile_id[self.tile_discard]]
+        flat = np.bincount(
+            discard_player.astype(np.int64) * len(SUITS) + discard_suit,
+            minlength=self.player_count * len(SUITS),
+        )
+        return flat.reshape(self.player_count, len(SUITS))
+
+    def riichi_by_seat_wind(self):
+        """Return (players, riichi declarations) arrays indexed by seat wind"""
+        minlength = len(WINDS) + 1
+        players = np.bincount(self.player_wind, minlength=minlength)
+        riichi = np.bincount(self.player_wind[self.player_riichi], minlength=minlength)
+        return players, riichi
+
+    def summary(self):
+        """Return every aggregate as a JSON-serializable dictionary"""
+        hands, discards = self.tile_visibility()
+        by_suit = self.discards_by_suit()
+        suit_totals = by_suit.sum(axis=0)
+        seat_players, seat_riichi = self.riichi_by_seat_wind()
+        riichi_bets = self.riichi_bets()
+
+        return {
+            "states": self.state_count,
+            "players": self.player_count,
+            "skipped": self.skipped,
+            "remaining_tiles": describe(self.remaining_tiles()),
+            "riichi_bets": {
+                **describe(riichi_bets),
+                "histogram": {
+                    str(bets): int(count)
+                    for bets, count in enumerate(np.bincount(riichi_bets))
+                    if count
+                },
+            },
+            "tile_visibility": {
+                code: {
+                    "hand": int(hands[tile_id]),
+                    "discards": int(discards[tile_id]),
+                    "total": int(hands[tile_id] + discards[tile_id]),
+                }
+                for tile_id, code in enumerate(TILE_CODES)
+            },
+            "discards_by_suit": {
+                suit: {
+                    "total": int(suit_totals[index]),
+                    "share": (
+                        float(suit_totals[index] / suit_totals.sum())
+                        if suit_totals.sum()
+                        else 0.0
+                    ),
+                    **{
+                        f"per_player_{key}": value
+                        for key, value in describe(by_suit[:, index]).items()
+                    },
+                }
+                for index, suit in enumerate(SUITS)
+            },
+            "riichi_by_seat_wind": {
+                wind: {
+                    "players": int(seat_players[index]),
+                    "riichi": int(seat_riichi[index]),
+                    "rate": (
+                        float(seat_riichi[index] / seat_players[index])
+                        if seat_players[index]
+                        else 0.0
+                    ),
+                }
+                for index, wind in enumerate(WINDS)
+            },
+        }
+
+
+def describe(values):
+    """Return the mean, min, percentiles and max of an array"""
+    if not len(values):
+        return {"mean": None, "min": None, "p50": None, "p95": None, "max": None}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {
+        "mean": float(values.mean()),
+        "min": values.min().item(),
+        "p50": float(p50),
+        "p95": float(p95),
+        "max": values.max().item(),
+    }
+
+
+class CorpusBuilder:
+    """Accumulates the columns of states one at a time"""
+
+    def __init__(self):
+        self.round_wind = array("B")
+        self.honba = array("q")
+        self.player_state = array("i")
+        self.player_wind = array("B")
+        self.player_score = array("d")
+        self.player_riichi = array("B")
+        self.tile_player = array("i")
+        self.tile_id = array("B")
+        self.tile_discard = array("B")
+        self.skipped = 0
+
+    def add(self, data):
+        """Add one decoded game state, skipping it if it is invalid"""
+        try:
+            validate_game_data(data)
+            players = [
+                (
+                    player,
+                    encode_tiles(player["hand"], player_id, "hand"),
+                    encode_tiles(player.get("discards") or [], player_id, "discards"),
+                )
+                for player_id, player in data["players"].items()
+            ]
+            honba = int(data.get("honba", 0))
+        except (InvalidInputError, TypeError, ValueError):
+            self.skipped += 1
+            return
+
+        state = len(self.round_wind)
+        self.round_wind.append(WIND_INDEX.get(data["round_wind"], len(WINDS)))
+        self.honba.append(honba)
+        for player, hand, discards in players:
+            player_row = len(self.player_state)
+            self.player_state.append(state)
+            self.player_wind.append(WIND_INDEX.get(player["wind"], len(WINDS)))
+            self.player_score.append(player["score"])
+            self.player_riichi.append(bool(player.get("riichi", False)))
+            self.tile_player.extend([player_row] * (len(hand) + len(discards)))
+            self.tile_id.extend(hand)
+            self.tile_id.extend(discards)
+            self.tile_discard.extend(bytes(len(hand)))
+            self.tile_discard.extend(b"\x01" * len(discards))
+
+    def add_record(self, text):
+        """Decode and add one JSON record, skipping it if it is invalid"""
+        try:
+            data = json.loads(text)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self.skipped += 1
+            return
+        self.add(data)
+
+    def build(self):
+        """Return the accumulated states as a Corpus"""
+        columns = {}
+        for name in Corpus.STATE_COLUMNS + Corpus.PLAYER_COLUMNS + Corpus.TILE_COLUMNS:
+            column = getattr(self, name)
+            values = np.frombuffer(column, dtype=column.typecode)
+            if name in Corpus.BOOL_COLUMNS:
+                columns[name] = values.astype(bool)
+            else:
+                columns[name] = values.copy()
+        return Corpus(columns, self.skipped)
+
+
+def _load_batch(lines):
+    """Load a batch of JSONL records in a worker"""
+    builder = CorpusBuilder()
+    for text in lines:
+        builder.add_record(text)
+    return builder.build()
+
+
+def _load_json_file(path):
+    """Load a .json file holding one state or a list of states in a worker"""
+    builder = CorpusBuilder()
+    try:
+        with open(path, "rb") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        builder.skipped += 1
+        return builder.build()
+    for state in data if isinstance(data, list) else [data]:
+        builder.add(state)
+    return builder.build()
+
+
+def iter_tasks(paths, batch_size=BATCH_SIZE):
+    """Split a corpus into (function, arguments) loading tasks, in order"""
+    for path in paths:
+        if not path.endswith(".jsonl"):
+            yield _load_json_file, (path,)
+            continue
+        with open(path, "rb") as f:
+            batch = []
+            for line in f:
+                if line.strip():
+                    batch.append(line)
+                if len(batch) >= batch_size:
+                    yield _load_batch, (batch,)
+                    batch = []
+            if batch:
+                yield _load_batch, (batch,)
+
+
+def load_corpus(sources, workers=None, batch_size=BATCH_SIZE):
+    """Load a corpus into a Corpus of columnar arrays
+
+    Args:
+        sources: Files, directories, globs or @listfiles, see
+            mahjong_validator.collect_corpus()
+        workers: Number of worker processes (defaults to the CPU count),
+            1 loads in this process
+        batch_size: Number of JSONL records handed to a worker at a time
+
+    Returns:
+        Corpus holding the valid states in input order
+
+    Raises:
+        FileNotFoundError: If an input file does not exist
+    """
+    tasks = iter_tasks(collect_corpus(sources), batch_size)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        return Corpus.concatenate(function(*arguments) for function, arguments in tasks)
+
+    parts = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Bound the batches in flight so the corpus is never read ahead
+        # further than the workers can keep up with
+        limit = workers * 4
+        pending = deque()
+        for function, arguments in tasks:
+            pending.append(executor.submit(function, *arguments))
+            if len(pending) >= limit:
+                parts.append(pending.popleft().result())
+        while pending:
+            parts.append(pending.popleft().result())
+    return Corpus.concatenate(parts)
+
+
+def summary_rows(summary):
+    """Flatten a summary into (section, key, field, value) rows for CSV"""
+    rows = [
+        ("corpus", "", name, summary[name]) for name in ("states", "players", "skipped")
+    ]
+    for section in ("remaining_tiles", "riichi_bets"):
+        for field, value in summary[section].items():
+            if field == "histogram":
+                rows.extend(
+                    (section, bets, "states", count) for bets, count in value.items()
+                )
+            else:
+                rows.append((section, "", field, value))
+    for section in ("tile_visibility", "discards_by_suit", "riichi_by_seat_wind"):
+        for key, fields in summary[section].items():
+            rows.extend((section, key, field, value) for field, value in fields.items())
+    return rows
+
+
+def write_summary(path, summary):
+    """Write a summary to a file, as CSV for .csv files and JSON otherwise"""
+    with open(path, "w", newline="") as f:
+        if path.endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(("section", "key", "field", "value"))
+            writer.writerows(summary_rows(summary))
+        else:
+            json.dump(summary, f, indent=2)
+            f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute tile usage and wall statistics over game state corpora"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        metavar="input",
+        help="JSON or JSONL file, directory, glob or @listfile",
+    )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=None,
+        help="number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="write the summary to this .json or .csv file (default: print JSON)",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        corpus = load_corpus(args.inputs, workers=args.workers)
+    except OSError as e:
+        print(f"Error: Cannot read input: {e}")
+        sys.exit(1)
+
+    summary = corpus.summary()
+    if args.output:
+        write_summary(args.output, summary)
+        print(
+            f"Summarized {summary['states']} states ({summary['skipped']} skipped) "
+            f"to {args.output}"
+        )
+    else:
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""Animated replays of mahjong game state sequences
+
+Renders a sequence of game states lazily with an IncrementalRenderer and
+streams the frames into an animated GIF, APNG or WebP file. Only the region
+that changed since the previous frame is encoded, identical consecutive
+states are merged into one longer frame, and at most one frame is held in
+memory, so memory use does not grow with the length of the replay.
+"""
+
+import io
+import json
+import struct
+import zlib
+from abc import ABC, abstractmethod
+
+from PIL import GifImagePlugin, Image
+
+from mahjong_visualizer import (
+    IncrementalRenderer,
+    InvalidInputError,
+    MahjongVisualizer,
+    MahjongVisualizerError,
+)
+from mahjong_replay import is_replay, iter_replay
+
+
+def iter_states(path):
+    """Iterate over the game states stored in a file
+
+    JSONL files (``.jsonl``) are read one line at a time and replay logs
+    (``.replay``, see mahjong_replay) one turn at a time. Other files are
+    parsed as JSON holding either a list of states, an object with a
+    "states" list, or a single state.
+
+    Args:
+        path: Path to the JSON or JSONL file
+
+    Yields:
+        Game state dictionaries, in file order
+
+    Raises:
+        InvalidInputError: If the file does not contain valid JSON
+    """
+    if is_replay(path):
+        yield from iter_replay(path)
+        return
+
+    try:
+        if str(path).endswith(".jsonl"):
+            with open(path, "r") as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise InvalidInputError(
+                            f"Invalid JSON on line {line_number}: {e}"
+                        )
+            return
+
+        with open(path, "r") as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise InvalidInputError(f"Invalid JSON in input file: {e}")
+
+    if isinstance(data, dict) and "states" in data:
+        data = data["states"]
+    if isinstance(data, list):
+        yield from data
+    else:
+        yield data
+
+
+def iter_frames(states, width=None, height=None):
+    """Render game states lazily into animation frames
+
+    The yielded image is the renderer's canvas and is overwritten by the
+    next frame; crop or copy it before advancing the iterator.
+
+    Args:
+        states: Iterable of game state dictionaries
+        width: Width of the frames in pixels
+        height: Height of the frames in pixels
+
+    Yields:
+        Tuple of (canvas image, changed box); the box is None when the state
+        looks the same as the previous one
+    """
+    renderer = IncrementalRenderer(
+        width or MahjongVisualizer.DEFAULT_WIDTH,
+        height or MahjongVisualizer.DEFAULT_HEIGHT,
+    )
+    for state in states:
+        image = renderer.render(state)
+        if not renderer.dirty_boxes:
+            yield image, None
+            continue
+
+        # Union of the repainted regions
+        boxes = renderer.dirty_boxes
+        yield image, (
+            min(box[0] for box in boxes),
+            min(box[1] for box in boxes),
+            max(box[2] for box in boxes),
+            max(box[3] for box in boxes),
+        )
+
+
+class AnimationWriter(ABC):
+    """Base class for streaming animation writers
+
+    Frames are added with add_frame() as (canvas, changed box) pairs. The
+    writer keeps only the pending frame, cropped to the changed box, so it
+    can extend its duration while following frames are unchanged.
+    """
+
+    def __init__(self, fp, size, duration=500, loop=0):
+        """Initialize the AnimationWriter
+
+        Args:
+            fp: Binary file object to write to
+            size: (width, height) of the animation
+            duration: Display time of each state in milliseconds
+            loop: Number of times to play the animation, 0 for forever
+        """
+        self.fp = fp
+        self.size = size
+        self.duration = duration
+        self.loop = loop
+        self.frame_count = 0
+        self.pending = None  # (cropped frame, box, duration)
+
+    def add_frame(self, image, box):
+        """Add one frame
+
+        Args:
+            image: Full canvas of the frame
+            box: (left, top, right, bottom) region that changed since the
+                previous frame, or None if nothing changed
+        """
+        if self.pending is None:
+            # The first frame is always encoded in full
+            box = (0, 0) + self.size
+        elif box is None:
+            frame, pending_box, duration = self.pending
+            self.pending = (frame, pending_box, duration + self.duration)
+            return
+        else:
+            self.flush()
+
+        box = self.align_box(box)
+        self.pending = (image.crop(box), box, self.duration)
+
+    def flush(self):
+        """Encode the pending frame"""
+        if self.pending is not None:
+            self.write_frame(*self.pending)
+            self.frame_count += 1
+
+    def align_box(self, box):
+        """Adjust a changed box to the constraints of the format"""
+        return box
+
+    @abstractmethod
+    def write_frame(self, frame, box, duration):
+        """Encode one frame; implemented by each format"""
+
+    def close(self):
+        """Encode the last frame and finish the file"""
+        self.flush()
+        self.pending = None
+
+
+class GifWriter(AnimationWriter):
+    """Streaming animated GIF writer with a single shared palette
+
+    The global palette is MahjongVisualizer.get_board_palette(), which holds
+    the exact board colors and colors quantized from the tile atlas, so every
+    frame maps to it without a per-frame quantization.
+    """
+
+    def write_frame(self, frame, box, duration):
+        if self.frame_count == 0:
+            self.palette = MahjongVisualizer.get_board_palette()
+            palette = bytes(self.palette.getpalette())
+            self.fp.write(
+                b"GIF89a"
+                + struct.pack("<HH", *self.size)
+                + bytes([0xF7, 0, 0])  # 256 color global table, background 0
+                + palette
+                # Netscape extension holding the loop count
+                + b"!\xff\x0bNETSCAPE2.0\x03\x01"
+                + struct.pack("<H", self.loop)
+                + b"\x00"
+            )
+
+        indexed = frame.quantize(palette=self.palette, dither=Image.Dither.NONE)
+        for data in GifImagePlugin.getdata(
+            indexed, offset=box[:2], duration=duration, disposal=1
+        ):
+            self.fp.write(data)
+
+    def close(self):
+        super().close()
+        self.fp.write(b";")
+
+
+def _png_chunk(chunk_type, data):
+    """Return a PNG chunk with its length and CRC"""
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data))
+    )
+
+
+class ApngWriter(AnimationWriter):
+    """Streaming lossless APNG writer
+
+    Each frame is encoded by Pillow's PNG encoder and its image data is
+    re-wrapped as APNG frame chunks. The frame count in the acTL chunk is
+    patched when the file is closed, so the file object must be seekable.
+    """
+
+    def __init__(self, fp, size, duration=500, loop=0, compress_level=6):
+        super().__init__(fp, size, duration, loop)
+        self.compress_level = compress_level
+        self.sequence = 0
+
+        self.fp.write(b"\x89PNG\r\n\x1a\n")
+        self.fp.write(
+            _png_chunk(b"IHDR", struct.pack(">IIBBBBB", *size, 8, 2, 0, 0, 0))
+        )
+        self.actl_offset = self.fp.tell()
+        self.fp.write(_png_chunk(b"acTL", struct.pack(">II", 0, self.loop)))
+
+    def write_frame(self, frame, box, duration):
+        buffer = io.BytesIO()
+        frame.save(buffer, "PNG", compress_level=self.compress_level)
+        data = buffer.getvalue()
+
+        # Collect the compressed image data of the encoded PNG
+        image_data = []
+        offset = 8
+        while offset < len(data):
+            (length,) = struct.unpack(">I", data[offset : offset + 4])
+            chunk_type = data[offset + 4 : offset + 8]
+            if chunk_type == b"IDAT":
+                image_data.append(data[offset + 8 : offset + 8 + length])
+            offset += length + 12
+
+        self.fp.write(
+            _png_chunk(
+                b"fcTL",
+                struct.pack(
+                    ">IIIIIHHBB",
+                    self.sequence,
+                    frame.width,
+                    frame.height,
+                    box[0],
+                    box[1],
+                    min(duration, 0xFFFF),
+                    1000,
+                    0,  # APNG_DISPOSE_OP_NONE
+                    0,  # APNG_BLEND_OP_SOURCE
+                ),
+            )
+        )
+        self.sequence += 1
+
+        if self.frame_count == 0:
+            # The first frame doubles as the default image
+            self.fp.write(_png_chunk(b"IDAT", b"".join(image_data)))
+        else:
+            self.fp.write(
+                _png_chunk(
+                    b"fdAT", struct.pack(">I", self.sequence) + b"".join(image_data)
+                )
+            )
+            self.sequence += 1
+
+    def close(self):
+        super().close()
+        self.fp.write(_png_chunk(b"IEND", b""))
+        end = self.fp.tell()
+        self.fp.seek(self.actl_offset)
+        self.fp.write(
+            _png_chunk(b"acTL", struct.pack(">II", self.frame_count, self.loop))
+        )
+        self.fp.seek(end)
+
+
+class WebpWriter(AnimationWriter):
+    """Streaming animated WebP writer
+
+    Each frame is encoded by Pillow's WebP encoder and wrapped in an ANMF
+    chunk. The RIFF size is patched when the file is closed, so the file
+    object must be seekable.
+    """
+
+    def __init__(
+        self, fp, size, duration=500, loop=0, lossless=True, quality=80, method=0
+    ):
+        super().__init__(fp, size, duration, loop)
+        self.lossless = lossless
+        self.quality = quality
+        self.method = method
+
+        self.start = self.fp.tell()
+        self.fp.write(b"RIFF\0\0\0\0WEBP")
+        self._write_chunk(
+            b"VP8X",
+            bytes([0x02, 0, 0, 0])  # animation flag
+            + self._uint24(size[0] - 1)
+            + self._uint24(size[1] - 1),
+        )
+        background = MahjongVisualizer.COLORS["background"]
+        self._write_chunk(
+            b"ANIM",
+            bytes([background[2], background[1], background[0], 255])
+            + struct.pack("<H", loop),
+        )
+
+    @staticmethod
+    def _uint24(value):
+        return struct.pack("<I", value)[:3]
+
+    def _write_chunk(self, chunk_type, data):
+        self.fp.write(chunk_type + struct.pack("<I", len(data)) + data)
+        if len(data) % 2:
+            self.fp.write(b"\0")
+
+    def align_box(self, box):
+        # Frame offsets are stored halved, so they must be even
+        return (box[0] & ~1, box[1] & ~1, box[2], box[3])
+
+    def write_frame(self, frame, box, duration):
+        buffer = io.BytesIO()
+        frame.save(
+            buffer,
+            "WEBP",
+            lossless=self.lossless,
+            quality=self.quality,
+            method=self.method,
+        )
+        data = buffer.getvalue()
+
+        # Keep the bitstream chunks of the encoded still image
+        bitstream = []
+        offset = 12
+        while offset < len(data):
+            chunk_type = data[offset : offset + 4]
+            (length,) = struct.unpack("<I", data[offset + 4 : offset + 8])
+            end = offset + 8 + length + (length % 2)
+            if chunk_type in (b"ALPH", b"VP8 ", b"VP8L"):
+                bitstream.append(data[offset:end])
+            offset = end
+
+        self._write_chunk(
+            b"ANMF",
+            self._uint24(box[0] // 2)
+            + self._uint24(box[1] // 2)
+            + self._uint24(frame.width - 1)
+            + self._uint24(frame.height - 1)
+            + self._uint24(min(duration, 0xFFFFFF))
+            + bytes([0x02])  # do not blend, do not dispose
+            + b"".join(bitstream),
+        )
+
+    def close(self):
+        super().close()
+        end = self.fp.tell()
+        self.fp.seek(self.start + 4)
+        self.fp.write(struct.pack("<I", end - self.start - 8))
+        self.fp.seek(end)
+
+
+# Writer class for each supported animation format
+WRITERS = {
+    "gif": GifWriter,
+    "png": ApngWriter,
+    "apng": ApngWriter,
+    "webp": WebpWriter,
+}
+
+
+def write_animation(
+    states,
+    output_path,
+    format=None,
+    duration=500,
+    loop=0,
+    width=None,
+    height=None,
+    **options,
+):
+    """Render a sequence of game states into an animated image file
+
+    Args:
+        states: Iterable of game state dictionaries, e.g. from iter_states()
+        output_path: Path of the animation file to write
+        format: "gif", "apng" (or "png") or "webp"; guessed from the output
+            extension by default
+        duration: Display time of each state in milliseconds
+        loop: Number of times to play the animation, 0 for forever
+        width: Width of the animation in pixels
+        height: Height of the animation in pixels
+        **options: Format specific options, e.g. compress_level for APNG or
+            lossless and quality for WebP
+
+    Returns:
+        Number of frames written
+
+    Raises:
+        MahjongVisualizerError: If the format is unsupported or there are no
+            states
+        InvalidInputError: If a state is invalid
+    """
+    if format is None:
+        format = str(output_path).rsplit(".", 1)[-1]
+    format = format.lower()
+    if format not in WRITERS:
+        raise MahjongVisualizerError(f"Unsupported animation format: {format}")
+
+    frames = iter_frames(states, width, height)
+    try:
+        image, box = next(frames)
+    except StopIteration:
+        raise MahjongVisualizerError("No game states to animate")
+
+    with open(output_path, "wb") as fp:
+        writer = WRITERS[format](fp, image.size, duration, loop, **options)
+        writer.add_frame(image, box)
+        for image, box in frames:
+            writer.add_frame(image, box)
+        writer.close()
+    return writer.frame_count
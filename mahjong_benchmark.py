@@ -0,0 +1,440 @@
+"""Benchmarks for the mahjong game state renderer
+
+Renders a seeded corpus of synthetic game states and reports the time and
+peak memory of each rendering stage separately, as JSON, so that results can
+be stored and compared between revisions.
+
+Usage:
+    python mahjong_benchmark.py [--states 200] [--seed 0] [--players 3|4]
+                                [--formats png,png8] [--output results.json]
+                                [--compare baseline.json] [--threshold 0.1]
+                                [--compositing pillow|numpy]
+
+Stages, in rendering order:
+    load_tile_images       Cold tile load (atlas memory-map or PNG decode),
+                           once per run as a process loads tiles once
+    construction           MahjongVisualizer(...), including validation
+    validate_game_data     Validation alone
+    get_board_template     Pasting the cached static board layers
+    draw_all_player_zones  Hands, discards, scores and riichi sticks
+    draw_center_wind       Round wind character
+    draw_game_info         Game information box contents
+    encode:<format>        encode_image() for each requested format
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import PIL
+
+from mahjong_visualizer import MahjongVisualizer, np
+
+# Tile kinds of a four player wall
+SUITED_TILES = [f"{suit}{number}" for suit in "MPS" for number in range(1, 10)]
+HONOR_TILES = ["E", "S", "W", "N", "Wh", "G", "R"]
+
+# Copies of each tile kind in the wall
+COPIES_PER_TILE = 4
+
+WINDS = ["E", "S", "W", "N"]
+
+
+def build_wall(player_count):
+    """Return the full list of tiles for a game
+
+    Three player games drop the 2 to 8 of characters, as in sanma.
+    """
+    kinds = SUITED_TILES + HONOR_TILES
+    if player_count == 3:
+        kinds = [
+            tile for tile in kinds if not (tile[0] == "M" and tile[1] in "2345678")
+        ]
+    return [tile for tile in kinds for _ in range(COPIES_PER_TILE)]
+
+
+def generate_state(rng, player_count=None, overflow_rate=0.15, winner_rate=0.2):
+    """Generate a random but plausible game state
+
+    Tiles are dealt from a shuffled wall, so no tile appears more often than
+    in a real game.
+
+    Args:
+        rng: random.Random instance driving the generation
+        player_count: 3 or 4, picked at random when None
+        overflow_rate: Probability that a player has more discards than fit
+            in their zone, so the discards are truncated
+        winner_rate: Probability that the state has a winner
+
+    Returns:
+        Dictionary containing the game state
+    """
+    if player_count is None:
+        player_count = rng.choice((3, 4))
+
+    wall = build_wall(player_count)
+    rng.shuffle(wall)
+
+    seat_offset = rng.randrange(player_count)
+    player_ids = [str(i) for i in range(1, player_count + 1)]
+    winner_id = rng.choice(player_ids) if rng.random() < winner_rate else None
+
+    players = {}
+    for index, player_id in enumerate(player_ids):
+        hand_size = 14 if player_id == winner_id else 13
+        if rng.random() < overflow_rate:
+            discard_count = rng.randint(21, 30)
+        else:
+            discard_count = rng.randint(0, 18)
+
+        hand = sorted(wall[:hand_size])
+        del wall[:hand_size]
+        discards = wall[:discard_count]
+        del wall[:discard_count]
+
+        player = {
+            "wind": WINDS[(index + seat_offset) % player_count],
+            "score": rng.randrange(0, 50001, 100),
+            "hand": hand,
+            "discards": discards,
+        }
+        if len(discards) >= 3 and rng.random() < 0.25:
+            player["riichi"] = True
+        players[player_id] = player
+
+    state = {
+        "round_wind": rng.choice(("E", "S")),
+        "honba": rng.randint(0, 4),
+        "players": players,
+        "legend": "Synthetic benchmark state",
+    }
+    if winner_id is not None:
+        state["winner_id"] = winner_id
+    return state
+
+
+def generate_states(count, seed=0, player_count=None):
+    """Generate a reproducible list of game states
+
+    Args:
+        count: Number of states
+        seed: Seed of the generator, equal seeds give equal states
+        player_count: 3 or 4, or None for a mix of both
+
+    Returns:
+        List of game state dictionaries
+    """
+    rng = random.Random(seed)
+    return [generate_state(rng, player_count) for _ in range(count)]
+
+
+def reload_tile_images():
+    """Drop the loaded tiles and load them again, as a new process would"""
+    MahjongVisualizer.tile_images.clear()
+    MahjongVisualizer.tile_atlas = None
+    MahjongVisualizer.load_tile_images()
+
+
+def run_stages(state, width, height, formats, measure):
+    """Render one state, passing each stage to measure(stage, function)"""
+    visualizer = measure(
+        "construction", lambda: MahjongVisualizer(state, width, height)
+    )
+    measure("validate_game_data", lambda: visualizer.validate_game_data(state))
+    measure(
+        "get_board_template",
+        lambda: visualizer.image.paste(visualizer.get_board_template()),
+    )
+    measure(
+        "draw_all_player_zones",
+        lambda: visualizer.draw_all_player_zones(draw_frame=False),
+    )
+    measure("draw_center_wind", lambda: visualizer.draw_center_wind(draw_frame=False))
+    measure("draw_game_info", lambda: visualizer.draw_game_info(draw_frame=False))
+    for format in formats:
+        measure(
+            f"encode:{format}",
+            lambda: MahjongVisualizer.encode_image(visualizer.image, format),
+        )
+
+
+def read_memory_status():
+    """Return (current RSS, peak RSS) of this process in KiB, or None
+
+    Only available on Linux, where the peak can also be reset.
+    """
+    values = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(value.split()[0])
+    except OSError:
+        return None
+    if len(values) != 2:
+        return None
+    return values["VmRSS"], values["VmHWM"]
+
+
+def reset_peak_rss():
+    """Reset the peak RSS of this process, returning whether it worked"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+class StageTimer:
+    """Collects wall times of each stage"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def __call__(self, stage, function):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        self.samples.setdefault(stage, []).append(elapsed)
+        return result
+
+
+class StageMemory:
+    """Collects the peak memory of each stage
+
+    Python allocations are traced with tracemalloc. Pixel buffers are
+    allocated by Pillow outside of the Python allocator, so the growth of the
+    process peak RSS during the stage is recorded as well where available.
+    """
+
+    def __init__(self):
+        self.python_peaks = {}
+        self.rss_peaks = {}
+        self.rss_available = read_memory_status() is not None and reset_peak_rss()
+
+    def __call__(self, stage, function):
+        if self.rss_available:
+            reset_peak_rss()
+            rss_before = read_memory_status()[0]
+        tracemalloc.reset_peak()
+        python_before = tracemalloc.get_traced_memory()[0]
+
+        result = function()
+
+        python_peak = tracemalloc.get_traced_memory()[1] - python_before
+        self.python_peaks[stage] = max(self.python_peaks.get(stage, 0), python_peak)
+        if self.rss_available:
+            rss_peak = read_memory_status()[1] - rss_before
+            self.rss_peaks[stage] = max(self.rss_peaks.get(stage, 0), rss_peak)
+        return result
+
+
+def summarize(samples):
+    """Summarize a list of durations in seconds as milliseconds"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "total_ms": sum(ordered) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def run_benchmark(
+    states, width=None, height=None, formats=("png",), memory=True, warmup=5
+):
+    """Benchmark the rendering stages over a list of states
+
+    Args:
+        states: List of game state dictionaries
+        width: Width of the rendered images (defaults to DEFAULT_WIDTH)
+        height: Height of the rendered images (defaults to DEFAULT_HEIGHT)
+        formats: Formats to benchmark encoding for, see encode_image()
+        memory: Whether to run a second pass measuring peak memory
+        warmup: Number of states rendered before timing starts
+
+    Returns:
+        Dictionary with the benchmark settings, environment and per-stage
+        results
+    """
+    width = width or MahjongVisualizer.DEFAULT_WIDTH
+    height = height or MahjongVisualizer.DEFAULT_HEIGHT
+
+    # Tiles are loaded once per process, so the cold load is measured once per
+    # run, before the caches it resets are filled again
+    timer = StageTimer()
+    timer("load_tile_images", reload_tile_images)
+    if memory:
+        tracer = StageMemory()
+        tracemalloc.start()
+        try:
+            tracer("load_tile_images", reload_tile_images)
+        finally:
+            tracemalloc.stop()
+
+    # Fill the font, template, layout and tile array caches as a long-running
+    # process would
+    for state in states[:warmup]:
+        run_stages(state, width, height, formats, lambda stage, function: function())
+
+    for state in states:
+        run_stages(state, width, height, formats, timer)
+    stages = {stage: summarize(samples) for stage, samples in timer.samples.items()}
+
+    # Memory is measured in a separate pass as tracing slows every allocation
+    if memory:
+        tracemalloc.start()
+        try:
+            for state in states:
+                run_stages(state, width, height, formats, tracer)
+        finally:
+            tracemalloc.stop()
+        for stage, result in stages.items():
+            result["peak_python_kib"] = tracer.python_peaks[stage] / 1024
+            result["peak_rss_kib"] = tracer.rss_peaks.get(stage)
+
+    return {
+        "settings": {
+            "states": len(states),
+            "width": width,
+            "height": height,
+            "formats": list(formats),
+            "compositing": MahjongVisualizer.COMPOSITING,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "numpy": np.__version__ if np is not None else None,
+            "platform": platform.platform(),
+        },
+        "stages": stages,
+    }
+
+
+def compare_results(results, baseline, threshold=0.1, min_delta_ms=0.05):
+    """Find stages whose median time regressed against a baseline
+
+    Args:
+        results: Output of run_benchmark()
+        baseline: Earlier output of run_benchmark()
+        threshold: Relative slowdown tolerated before a stage is reported
+        min_delta_ms: Absolute slowdown tolerated, so that timer noise on
+            very short stages is not reported
+
+    Returns:
+        List of (stage, baseline median ms, current median ms) tuples
+    """
+    regressions = []
+    for stage, result in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            continue
+        slowdown = result["median_ms"] - previous["median_ms"]
+        if slowdown > previous["median_ms"] * threshold and slowdown > min_delta_ms:
+            regressions.append((stage, previous["median_ms"], result["median_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the mahjong renderer")
+    parser.add_argument(
+        "--states", type=int, default=200, help="number of states (default: 200)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="generator seed")
+    parser.add_argument(
+        "--players",
+        type=int,
+        choices=(3, 4),
+        default=None,
+        help="player count of every state (default: a mix of 3 and 4)",
+    )
+    parser.add_argument(
+        "--formats",
+        default="png",
+        help="comma separated encoder formats to benchmark (default: png)",
+    )
+    parser.add_argument("--width", type=int, default=None, help="image width")
+    parser.add_argument("--height", type=int, default=None, help="image height")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the peak memory pass"
+    )
+    parser.add_argument(
+        "--output", default=None, help="write the results as JSON to this file"
+    )
+    parser.add_argument(
+        "--dump-states",
+        default=None,
+        help="also write the generated states to this JSONL file",
+    )
+    parser.add_argument(
+        "--compare",
+        default=None,
+        help="baseline results file; exit with 1 if a stage got slower",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown tolerated by --compare (default: 0.1)",
+    )
+    parser.add_argument(
+        "--compositing",
+        choices=("pillow", "numpy"),
+        default=MahjongVisualizer.COMPOSITING,
+        help="tile compositing path to benchmark (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.compositing == "numpy" and np is None:
+        print("Error: --compositing numpy requires NumPy")
+        sys.exit(1)
+    MahjongVisualizer.COMPOSITING = args.compositing
+
+    states = generate_states(args.states, args.seed, args.players)
+    if args.dump_states:
+        with open(args.dump_states, "w") as f:
+            for state in states:
+                f.write(json.dumps(state) + "\n")
+
+    results = run_benchmark(
+        states,
+        args.width,
+        args.height,
+        formats=[format for format in args.formats.split(",") if format],
+        memory=not args.no_memory,
+    )
+    results["settings"]["seed"] = args.seed
+    results["settings"]["players"] = args.players
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for stage, before, after in regressions:
+            print(
+                f"Regression: {stage} median {before:.3f} ms -> {after:.3f} ms",
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
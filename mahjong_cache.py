@@ -0,0 +1,317 @@
+"""Content-addressed cache of rendered mahjong game states
+
+Renders are keyed by a hash of the canonicalized game state together with the
+renderer version, the image size and format, and the visual theme (colors,
+fonts and tile images). Two states that differ only in key order or in fields
+that are not drawn, such as "legend", share one cache entry.
+
+Entries are stored either in memory or in a directory, and the least recently
+used ones are evicted once the total size exceeds the configured limit.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from mahjong_model import GameState
+from mahjong_visualizer import MahjongVisualizer, TileAtlas
+
+# Top-level game state fields that affect the rendered image
+VISUAL_FIELDS = ("round_wind", "honba", "winner_id", "players")
+
+# Player fields that affect the rendered image
+PLAYER_FIELDS = ("wind", "score", "hand", "discards", "riichi")
+
+# Default size limit of a render cache in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def canonical_state(game_data):
+    """Serialize the visual part of a game state in a canonical form
+
+    Only the fields that are drawn are kept, and keys are sorted, so states
+    that render to the same image serialize to the same string.
+
+    Args:
+        game_data: Dictionary containing the game state, or a
+            mahjong_model.GameState
+
+    Returns:
+        Canonical JSON string of the game state
+    """
+    if isinstance(game_data, GameState):
+        game_data = game_data.to_dict()
+    state = game_data
+    if isinstance(game_data, dict):
+        state = {key: game_data[key] for key in VISUAL_FIELDS if key in game_data}
+        players = state.get("players")
+        if isinstance(players, dict):
+            state["players"] = {
+                player_id: (
+                    {key: player[key] for key in PLAYER_FIELDS if key in player}
+                    if isinstance(player, dict)
+                    else player
+                )
+                for player_id, player in players.items()
+            }
+    return json.dumps(state, sort_keys=True, separators=(",", ":"))
+
+
+def theme_key():
+    """Return a hash of everything besides the game state that shapes a render
+
+    Covers the renderer version, colors, fonts, tile size and the tile source
+    images, so changing any of them invalidates cached renders.
+    """
+    cls = MahjongVisualizer
+    theme = {
+        "version": cls.RENDER_VERSION,
+        "colors": cls.COLORS,
+        "fonts": cls.FONT_SPECS,
+        "tiles": TileAtlas.cache_key(
+            cls.IMG_DIR, cls.TILE_FILES, cls.TILE_WIDTH, cls.TILE_HEIGHT
+        ),
+        "spacing": cls.TILE_SPACING,
+    }
+    return hashlib.sha256(json.dumps(theme, sort_keys=True).encode()).hexdigest()
+
+
+def render_key(
+    game_data, width=None, height=None, format="png", options=None, theme=None
+):
+    """Return the cache key of a render
+
+    Args:
+        game_data: Dictionary containing the game state
+        width: Width of the image in pixels (defaults to DEFAULT_WIDTH)
+        height: Height of the image in pixels (defaults to DEFAULT_HEIGHT)
+        format: Image format of the encoded render
+        options: Encoder options of the render, see render_bytes()
+        theme: Precomputed theme_key(), computed when omitted
+
+    Returns:
+        Hex digest identifying the encoded image
+    """
+    digest = hashlib.sha256()
+    digest.update((theme or theme_key()).encode())
+    digest.update(
+        f"|{width or MahjongVisualizer.DEFAULT_WIDTH}"
+        f"x{height or MahjongVisualizer.DEFAULT_HEIGHT}|{format.lower()}|".encode()
+    )
+    digest.update(json.dumps(options or {}, sort_keys=True).encode())
+    digest.update(canonical_state(game_data).encode())
+    return digest.hexdigest()
+
+
+class MemoryStore:
+    """In-memory LRU store of encoded renders"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        """Return the data stored under key, or None"""
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        """Store data under key and return the number of evicted entries"""
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = data
+        self.size += len(data)
+        evicted = 0
+        while self.size > self.max_bytes:
+            _, old = self.entries.popitem(last=False)
+            self.size -= len(old)
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskStore:
+    """On-disk LRU store of encoded renders, one file per entry
+
+    Recency is tracked through file modification times, which are refreshed
+    on every hit. Files are written atomically, so several processes can
+    share a directory.
+    """
+
+    SUFFIX = ".render"
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self.scan())
+
+    def scan(self):
+        """Return the directory entries of all stored renders"""
+        return [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(self.SUFFIX) and entry.is_file()
+        ]
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        """Return the data stored under key, or None"""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        """Store data under key and return the number of evicted entries"""
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        try:
+            # Overwriting an entry replaces its size
+            self.size -= os.stat(path).st_size
+        except OSError:
+            pass
+        os.replace(tmp_path, path)
+        self.size += len(data)
+        if self.size <= self.max_bytes:
+            return 0
+
+        # Rescan so entries added by other processes are accounted for
+        entries = sorted(self.scan(), key=lambda entry: entry.stat().st_mtime_ns)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        evicted = 0
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.size -= size
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self.scan())
+
+
+class RenderCache:
+    """Cache of encoded renders keyed on the canonical game state
+
+    Thread-safe; a directory-backed cache can also be shared between
+    processes.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        """Initialize the RenderCache
+
+        Args:
+            directory: Directory for the cached renders, None keeps them in memory
+            max_bytes: Maximum total size of the cached renders
+        """
+        if directory is None:
+            self.store = MemoryStore(max_bytes)
+        else:
+            self.store = DiskStore(directory, max_bytes)
+        self.theme = theme_key()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def key(self, game_data, width=None, height=None, format="png", **options):
+        """Return the cache key of a render, see render_key()"""
+        return render_key(game_data, width, height, format, options, self.theme)
+
+    def get(self, key):
+        """Return the cached render for key, or None"""
+        with self.lock:
+            data = self.store.get(key)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return data
+
+    def put(self, key, data):
+        """Store a render, evicting the least recently used ones if needed"""
+        if len(data) > self.store.max_bytes:
+            return
+        with self.lock:
+            self.evictions += self.store.put(key, data)
+
+    def render_bytes(self, game_data, width=None, height=None, format="png", **options):
+        """Return the encoded render of a game state, rendering it on a miss
+
+        Arguments are those of MahjongVisualizer and its render_bytes().
+
+        Raises:
+            MahjongVisualizerError: If the game data or format is invalid
+        """
+        key = self.key(game_data, width, height, format, **options)
+        data = self.get(key)
+        if data is None:
+            visualizer = MahjongVisualizer(
+                game_data,
+                width or MahjongVisualizer.DEFAULT_WIDTH,
+                height or MahjongVisualizer.DEFAULT_HEIGHT,
+            )
+            data = visualizer.render_bytes(format, **options)
+            self.put(key, data)
+        return data
+
+    def generate(self, game_data, output_path, width=None, height=None, **options):
+        """Write the render of a game state to output_path, like generate()
+
+        The image format follows the output file extension. Formats that
+        render_bytes() cannot encode, such as .gif or .bmp, are rendered
+        directly and not cached.
+        """
+        format = os.path.splitext(output_path)[1][1:].lower() or "png"
+        if format not in MahjongVisualizer.ENCODERS and format != "jpg":
+            MahjongVisualizer(
+                game_data,
+                width or MahjongVisualizer.DEFAULT_WIDTH,
+                height or MahjongVisualizer.DEFAULT_HEIGHT,
+            ).generate(output_path, **options)
+            return
+        data = self.render_bytes(game_data, width, height, format, **options)
+        with open(output_path, "wb") as f:
+            f.write(data)
+
+    def stats(self):
+        """Return cache statistics as a dictionary"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.store),
+                "bytes": self.store.size,
+                "max_bytes": self.store.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+@lru_cache(maxsize=None)
+def open_cache(directory, max_bytes=DEFAULT_MAX_BYTES):
+    """Return the process-wide RenderCache for a directory"""
+    return RenderCache(directory, max_bytes)
@@ -0,0 +1,272 @@
+"""Resident render daemon reading game states from stdin or a Unix socket
+
+Keeps one warm process (fonts, tile images, board templates and layout plans
+loaded once, and a single reused canvas) and renders a stream of
+newline-delimited JSON game states without restarting Python for each one.
+Throughput and latency statistics are written to stderr on shutdown.
+
+Usage:
+    python mahjong_visualizer.py --daemon - [--format png] [--reply bytes]
+    python mahjong_visualizer.py --daemon /tmp/mahjong.sock [--reply paths]
+
+Requests, one per line: a game state, or an object {"state": <game state>,
+"output": <path>} naming the output file in paths mode. Blank lines are
+ignored. Every other line gets exactly one reply, in order:
+
+    bytes mode  A frame of a 1-byte status (0 for an image, 1 for an error),
+                a 4-byte big-endian payload length and the payload: the
+                encoded image, or a UTF-8 error message
+    paths mode  One line holding the path of the written image, or
+                "error: <message>"
+
+With "-" requests are read from stdin and replies written to stdout, which
+then carries nothing else; messages go to stderr. Otherwise the argument is
+the path of a Unix socket to listen on, serving one connection at a time
+until interrupted.
+"""
+
+import json
+import os
+import signal
+import socketserver
+import stat
+import statistics
+import struct
+import sys
+import time
+from array import array
+from contextlib import redirect_stdout
+
+from mahjong_visualizer import MahjongVisualizer, MahjongVisualizerError, PooledRenderer
+
+# Header of a reply frame in bytes mode: status and payload length
+FRAME_HEADER = struct.Struct(">BI")
+
+# Frame status values
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# File extension of each output format in paths mode
+EXTENSIONS = {"png": "png", "png8": "png", "webp": "webp", "jpeg": "jpg"}
+
+
+class DaemonStats:
+    """Throughput and latency of the states handled by a RenderDaemon"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # Seconds from reading each request to having its reply ready
+        self.latencies = array("d")
+        self.errors = 0
+        self.bytes_out = 0
+
+    def add(self, seconds, size, ok):
+        """Record one handled request"""
+        self.latencies.append(seconds)
+        self.bytes_out += size
+        if not ok:
+            self.errors += 1
+
+    def to_dict(self):
+        """Return the statistics as a JSON-serializable dictionary"""
+        elapsed = time.perf_counter() - self.started
+        count = len(self.latencies)
+        result = {
+            "states": count,
+            "errors": self.errors,
+            "bytes_out": self.bytes_out,
+            "elapsed_seconds": elapsed,
+            "states_per_second": count / elapsed if elapsed else 0.0,
+        }
+        if count:
+            ordered = sorted(self.latencies)
+            result.update(
+                {
+                    "latency_mean_ms": statistics.fmean(ordered) * 1000,
+                    "latency_median_ms": statistics.median(ordered) * 1000,
+                    "latency_p95_ms": ordered[int(0.95 * (count - 1))] * 1000,
+                    "latency_max_ms": ordered[-1] * 1000,
+                }
+            )
+        return result
+
+    def format(self):
+        """Return a short human-readable summary"""
+        stats = self.to_dict()
+        lines = [
+            f"Rendered {stats['states'] - stats['errors']} states, "
+            f"{stats['errors']} errors, {stats['bytes_out']} bytes "
+            f"in {stats['elapsed_seconds']:.1f} s "
+            f"({stats['states_per_second']:.1f} states/s)"
+        ]
+        if stats["states"]:
+            lines.append(
+                f"Latency: mean {stats['latency_mean_ms']:.2f} ms, "
+                f"median {stats['latency_median_ms']:.2f} ms, "
+                f"p95 {stats['latency_p95_ms']:.2f} ms, "
+                f"max {stats['latency_max_ms']:.2f} ms"
+            )
+        return "\n".join(lines)
+
+
+class RenderDaemon:
+    """Renders newline-delimited game states with one warm setup"""
+
+    def __init__(
+        self, format="png", width=None, height=None, reply="bytes", output_dir="output"
+    ):
+        """Initialize the RenderDaemon and warm the fonts and tile images
+
+        Args:
+            format: Output format, see MahjongVisualizer.encode_image()
+            width: Width of the images (defaults to DEFAULT_WIDTH)
+            height: Height of the images (defaults to DEFAULT_HEIGHT)
+            reply: "bytes" to reply with framed image bytes, "paths" to write
+                image files and reply with their paths
+            output_dir: Directory for the images in paths mode
+
+        Raises:
+            MahjongVisualizerError: If the format or reply mode is not supported
+        """
+        format = format.lower()
+        if format == "jpg":
+            format = "jpeg"
+        if format not in MahjongVisualizer.ENCODERS:
+            raise MahjongVisualizerError(f"Unsupported image format: {format}")
+        if reply not in ("bytes", "paths"):
+            raise MahjongVisualizerError(f"Unsupported reply mode: {reply}")
+
+        self.format = format
+        self.reply = reply
+        self.output_dir = output_dir
+        self.sequence = 0
+        self.stats = DaemonStats()
+        # Requests are handled one at a time, so one canvas is enough
+        self.renderer = PooledRenderer(
+            width or MahjongVisualizer.DEFAULT_WIDTH,
+            height or MahjongVisualizer.DEFAULT_HEIGHT,
+            canvases=1,
+        )
+
+    def handle_line(self, line):
+        """Render the state of one request line and return the reply bytes"""
+        self.sequence += 1
+        start = time.perf_counter()
+        size = 0
+        try:
+            request = json.loads(line)
+            output_path = None
+            if isinstance(request, dict) and "state" in request:
+                output_path = request.get("output")
+                request = request["state"]
+            image = self.renderer.render(request, self.format)
+            size = len(image)
+            if self.reply == "bytes":
+                reply = FRAME_HEADER.pack(STATUS_OK, size) + image
+            else:
+                if output_path is None:
+                    os.makedirs(self.output_dir, exist_ok=True)
+                    output_path = os.path.join(
+                        self.output_dir,
+                        f"state-{self.sequence:06d}.{EXTENSIONS[self.format]}",
+                    )
+                with open(output_path, "wb") as f:
+                    f.write(image)
+                reply = f"{output_path}\n".encode()
+            error = None
+        except json.JSONDecodeError as e:
+            error = f"Invalid JSON: {e}"
+        except MahjongVisualizerError as e:
+            error = str(e)
+        except OSError as e:
+            error = f"Cannot write output: {e}"
+        except Exception as e:
+            # Keep serving; a bad request must not take the daemon down
+            error = f"Unexpected error: {e}"
+
+        if error is not None:
+            if self.reply == "bytes":
+                message = error.encode()
+                reply = FRAME_HEADER.pack(STATUS_ERROR, len(message)) + message
+            else:
+                reply = f"error: {error}\n".encode()
+        self.stats.add(
+            time.perf_counter() - start, size if error is None else 0, error is None
+        )
+        return reply
+
+    def serve_stream(self, reader, writer):
+        """Handle request lines from a binary reader until it is exhausted"""
+        for line in reader:
+            if not line.strip():
+                continue
+            writer.write(self.handle_line(line))
+            writer.flush()
+
+    def serve_socket(self, path):
+        """Listen on a Unix socket, serving one connection at a time
+
+        A stale socket file left at path is replaced. Runs until interrupted.
+        """
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    daemon.serve_stream(self.rfile, self.wfile)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+        with socketserver.UnixStreamServer(path, Handler) as server:
+            try:
+                server.serve_forever()
+            finally:
+                os.unlink(path)
+
+
+def _interrupt(signum, frame):
+    """Turn SIGTERM into KeyboardInterrupt so shutdown reports statistics"""
+    raise KeyboardInterrupt
+
+
+def run_daemon(args):
+    """Run the --daemon command line mode and return the process exit code"""
+    if len(args.inputs) != 1:
+        print(
+            "Usage: python mahjong_visualizer.py --daemon -|socket_path",
+            file=sys.stderr,
+        )
+        return 1
+    source = args.inputs[0]
+
+    # Keep stdout free for replies; anything printed goes to stderr
+    with redirect_stdout(sys.stderr):
+        try:
+            daemon = RenderDaemon(
+                format=args.format or "png",
+                width=args.width,
+                height=args.height,
+                reply=args.reply,
+                output_dir=args.output_dir,
+            )
+        except MahjongVisualizerError as e:
+            print(f"Error: {e}")
+            return 1
+
+        signal.signal(signal.SIGTERM, _interrupt)
+        try:
+            if source == "-":
+                daemon.serve_stream(sys.stdin.buffer, sys.__stdout__.buffer)
+            else:
+                print(f"Listening on {source}")
+                daemon.serve_socket(source)
+        except KeyboardInterrupt:
+            pass
+        except BrokenPipeError:
+            # The reader went away; report what was done
+            pass
+        finally:
+            print(daemon.stats.format())
+    return 0
@@ -0,0 +1,272 @@
+"""Opt-in instrumentation of MahjongVisualizer
+
+When enabled, the hot methods of MahjongVisualizer are replaced by wrappers
+that record their call count and wall time and count notable events (tile
+pastes, fallback text tiles, text measurements, truncated discard sections,
+cache hits and misses). When disabled the original methods are put back, so
+rendering runs the exact uninstrumented code.
+
+Metrics are kept for the current render, which starts when a visualizer is
+constructed, and aggregated over all renders since instrumentation was
+enabled. Both can be exported as JSON or in the Prometheus text format.
+
+Typical use:
+    instrumentation = MahjongVisualizer.enable_instrumentation()
+    MahjongVisualizer(game_data).render_bytes("png")
+    print(instrumentation.current.to_dict())
+    print(instrumentation.to_prometheus())
+"""
+
+import functools
+import json
+import time
+from collections import Counter
+
+import mahjong_visualizer
+from mahjong_visualizer import font_registry
+
+# Methods whose calls and wall time are recorded. Times are inclusive, so
+# render covers every drawing method it calls.
+TIMED_METHODS = (
+    "__init__",
+    "validate_game_data",
+    "load_fonts",
+    "load_tile_images",
+    "render",
+    "get_board_template",
+    "draw_all_player_zones",
+    "draw_player_zone",
+    "plan_player_zone",
+    "draw_riichi_sticks",
+    "draw_section_label",
+    "draw_tile",
+    "draw_tile_grid",
+    "draw_center_wind",
+    "draw_game_info",
+    "text_bbox",
+    "draw_text",
+    "encode_image",
+    "render_bytes",
+    "generate",
+)
+
+
+class RenderMetrics:
+    """Call counts, wall times and event counters of one or more renders"""
+
+    def __init__(self):
+        # Method name -> [calls, seconds]
+        self.timings = {}
+        self.counters = Counter()
+
+    def add_timing(self, method, seconds):
+        timing = self.timings.get(method)
+        if timing is None:
+            self.timings[method] = [1, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+
+    def merge(self, other):
+        """Add the metrics of another RenderMetrics or of its to_dict()"""
+        if isinstance(other, RenderMetrics):
+            other = other.to_dict()
+        for method, timing in other["timings"].items():
+            current = self.timings.setdefault(method, [0, 0.0])
+            current[0] += timing["calls"]
+            current[1] += timing["seconds"]
+        self.counters.update(other["counters"])
+
+    def to_dict(self):
+        """Return the metrics as a JSON-serializable dictionary"""
+        return {
+            "timings": {
+                method: {"calls": calls, "seconds": seconds}
+                for method, (calls, seconds) in sorted(self.timings.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+
+class Instrumentation:
+    """Records metrics of MahjongVisualizer by wrapping its methods
+
+    Use MahjongVisualizer.enable_instrumentation() rather than creating one
+    directly. Not thread-safe: renders in threads share one current record.
+    """
+
+    def __init__(self, cls):
+        """Initialize the Instrumentation
+
+        Args:
+            cls: Class whose methods are wrapped, normally MahjongVisualizer
+        """
+        self.cls = cls
+        self.originals = {}
+        self.renders = 0
+        self.current = RenderMetrics()
+        self.total = RenderMetrics()
+        self.font_stats = None
+
+    def install(self):
+        """Replace the instrumented methods by recording wrappers"""
+        for name in TIMED_METHODS:
+            descriptor = self.cls.__dict__[name]
+            self.originals[name] = descriptor
+            if isinstance(descriptor, classmethod):
+                wrapped = classmethod(self.wrap(name, descriptor.__func__))
+            else:
+                wrapped = self.wrap(name, descriptor)
+            setattr(self.cls, name, wrapped)
+        self.font_stats = dict(font_registry.stats)
+
+    def uninstall(self):
+        """Restore the original methods"""
+        self.finish_render()
+        for name, descriptor in self.originals.items():
+            setattr(self.cls, name, descriptor)
+        self.originals = {}
+
+    def wrap(self, name, function):
+        """Return a wrapper of function recording its time and events
+
+        Event counting uses the optional prepare_<name>(owner) hook, called
+        before the method, and count_<name>(owner, args, result, prepared)
+        hook, called after it.
+        """
+        hook_name = name.strip("_")
+        prepare = getattr(self, f"prepare_{hook_name}", None)
+        count_events = getattr(self, f"count_{hook_name}", None)
+
+        @functools.wraps(function)
+        def wrapper(owner, *args, **kwargs):
+            if name == "__init__":
+                self.start_render()
+            prepared = prepare(owner) if prepare is not None else None
+            start = time.perf_counter()
+            try:
+                result = function(owner, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.current.add_timing(name, elapsed)
+                self.total.add_timing(name, elapsed)
+            if count_events is not None:
+                count_events(owner, args, result, prepared)
+            return result
+
+        return wrapper
+
+    def count(self, event, amount=1):
+        """Add to an event counter of the current render and the total"""
+        self.current.counters[event] += amount
+        self.total.counters[event] += amount
+
+    def count_draw_tile(self, visualizer, args, result, prepared):
+        if visualizer.get_tile_sprite(args[2]) is not None:
+            self.count("tile_pastes")
+        else:
+            self.count("fallback_tiles")
+
+    def count_draw_tile_grid(self, visualizer, args, result, prepared):
+        # Placeholder tiles are counted by the draw_tile() calls they make
+        pasted = sum(visualizer.get_tile_sprite(tile) is not None for tile in args[2])
+        self.count("tile_pastes", pasted)
+
+    def count_text_bbox(self, visualizer, args, result, prepared):
+        self.count("text_bbox_calls")
+
+    def prepare_plan_player_zone(self, visualizer):
+        return mahjong_visualizer.plan_zone_layout.cache_info().hits
+
+    def count_plan_player_zone(self, visualizer, args, result, hits_before):
+        if result.discards_shown < args[1]:
+            self.count("truncated_discard_sections")
+        if mahjong_visualizer.plan_zone_layout.cache_info().hits > hits_before:
+            self.count("layout_cache_hits")
+        else:
+            self.count("layout_cache_misses")
+
+    def prepare_get_board_template(self, visualizer):
+        return len(visualizer.board_templates)
+
+    def count_get_board_template(self, visualizer, args, result, size_before):
+        if len(visualizer.board_templates) > size_before:
+            self.count("board_template_misses")
+        else:
+            self.count("board_template_hits")
+
+    def start_render(self):
+        """Finish the current render record and start a new one"""
+        self.finish_render()
+        self.current = RenderMetrics()
+        self.renders += 1
+        self.count("renders")
+
+    def finish_render(self):
+        """Fold the font registry cache counters into the current render"""
+        if self.font_stats is None:
+            return
+        for key, value in font_registry.stats.items():
+            delta = value - self.font_stats.get(key, 0)
+            if delta:
+                self.count(f"font_registry_{key}", delta)
+        self.font_stats = dict(font_registry.stats)
+
+    def to_dict(self):
+        """Return the current render and the totals as a dictionary"""
+        self.finish_render()
+        return {
+            "renders": self.renders,
+            "current": self.current.to_dict(),
+            "total": self.total.to_dict(),
+        }
+
+    def to_json(self, **kwargs):
+        """Return to_dict() serialized as JSON"""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self, prefix="mahjong_visualizer"):
+        """Return the totals in the Prometheus text exposition format"""
+        self.finish_render()
+        return format_prometheus(self.total, prefix)
+
+
+def format_prometheus(metrics, prefix="mahjong_visualizer"):
+    """Format a RenderMetrics in the Prometheus text exposition format"""
+    lines = [
+        f"# HELP {prefix}_method_calls_total Calls of each instrumented method.",
+        f"# TYPE {prefix}_method_calls_total counter",
+    ]
+    for method, (calls, _) in sorted(metrics.timings.items()):
+        lines.append(f'{prefix}_method_calls_total{{method="{method}"}} {calls}')
+    lines += [
+        f"# HELP {prefix}_method_seconds_total Wall time spent in each method.",
+        f"# TYPE {prefix}_method_seconds_total counter",
+    ]
+    for method, (_, seconds) in sorted(metrics.timings.items()):
+        lines.append(
+            f'{prefix}_method_seconds_total{{method="{method}"}} {seconds:.9f}'
+        )
+    lines += [
+        f"# HELP {prefix}_events_total Rendering events by kind.",
+        f"# TYPE {prefix}_events_total counter",
+    ]
+    for event, value in sorted(metrics.counters.items()):
+        lines.append(f'{prefix}_events_total{{event="{event}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, metrics, renders):
+    """Write metrics to a file, in Prometheus format for .prom files
+
+    Args:
+        path: Output file; other extensions than .prom are written as JSON
+        metrics: RenderMetrics to write
+        renders: Number of renders the metrics cover
+    """
+    with open(path, "w") as f:
+        if path.endswith(".prom"):
+            f.write(format_prometheus(metrics))
+        else:
+            json.dump({"renders": renders, **metrics.to_dict()}, f, indent=2)
+            f.write("\n")
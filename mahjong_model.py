@@ -0,0 +1,280 @@
+"""Compact in-memory model of mahjong game states
+
+Game states arrive as nested JSON dictionaries of string tile codes. This
+module parses them once into a compact form for processes that keep many
+states alive at a time: tiles become small integers, hands and discards
+become array('B') buffers, and players and states are __slots__ classes.
+
+It also holds the exceptions and the structural validation shared by the
+renderer and the standalone tools, and does not depend on Pillow.
+
+Tile ids:
+    0-8    M1-M9 (Man/Characters)
+    9-17   P1-P9 (Pin/Dots)
+    18-26  S1-S9 (Sou/Bamboo)
+    27-30  E, S, W, N (winds)
+    31-33  Wh, G, R (white, green and red dragons)
+    34-36  M0, P0, S0 (red fives)
+
+The white dragon is coded "Wh" since "W" already denotes the West wind.
+"""
+
+from array import array
+
+
+class MahjongVisualizerError(Exception):
+    """Base exception for MahjongVisualizer
+
+    Serves as the parent class for all custom exceptions in the visualizer.
+    Allows for catching all visualizer-specific errors with a single except block.
+    """
+
+    pass
+
+
+class InvalidInputError(MahjongVisualizerError):
+    """Raised when input JSON is invalid
+
+    Used when the input game data has formatting or structure issues.
+    """
+
+    pass
+
+
+# Tile code of each tile id, see the module docstring
+TILE_CODES = (
+    [f"M{n}" for n in range(1, 10)]
+    + [f"P{n}" for n in range(1, 10)]
+    + [f"S{n}" for n in range(1, 10)]
+    + ["E", "S", "W", "N", "Wh", "G", "R", "M0", "P0", "S0"]
+)
+
+# Tile id of each tile code
+TILE_IDS = {code: tile_id for tile_id, code in enumerate(TILE_CODES)}
+
+# Number of distinct tile kinds, not counting red fives
+TILE_KINDS = 34
+
+# Tile id of the regular five each red five stands for
+RED_FIVES = {
+    TILE_IDS["M0"]: TILE_IDS["M5"],
+    TILE_IDS["P0"]: TILE_IDS["P5"],
+    TILE_IDS["S0"]: TILE_IDS["S5"],
+}
+
+# Kind (0-33) of each tile id, mapping red fives onto their five
+TILE_KIND = bytes(RED_FIVES.get(tile_id, tile_id) for tile_id in range(len(TILE_CODES)))
+
+
+def validate_game_data(data):
+    """Validate the game data structure
+
+    Checks that the game data has the required fields and structure.
+    Raises InvalidInputError if the data doesn't meet requirements.
+
+    Args:
+        data: Dictionary containing the game state to validate
+
+    Returns:
+        True if the data is valid
+
+    Raises:
+        InvalidInputError: If the data structure is invalid
+    """
+    # Check required top-level keys
+    if not isinstance(data, dict):
+        raise InvalidInputError("Game data must be a dictionary")
+
+    if "players" not in data:
+        raise InvalidInputError("Game data missing 'players' field")
+
+    if "round_wind" not in data:
+        raise InvalidInputError("Game data missing 'round_wind' field")
+
+    # Validate players section
+    if not isinstance(data["players"], dict):
+        raise InvalidInputError("Players data must be a dictionary")
+
+    if not data["players"]:
+        raise InvalidInputError("Players data cannot be empty")
+
+    # Validate each player's data structure
+    for player_id, player_data in data["players"].items():
+        # Check player data structure
+        if not isinstance(player_data, dict):
+            raise InvalidInputError(f"Player {player_id} data must be a dictionary")
+
+        # Check required player fields
+        for field in ["wind", "score", "hand"]:
+            if field not in player_data:
+                raise InvalidInputError(
+                    f"Player {player_id} missing required field: {field}"
+                )
+
+        # Validate score is a number
+        if not isinstance(player_data["score"], (int, float)):
+            raise InvalidInputError(f"Player {player_id} score must be a number")
+
+        # Validate hand is a list
+        if not isinstance(player_data["hand"], list):
+            raise InvalidInputError(f"Player {player_id} hand must be a list")
+
+        # Validate optional discards
+        if "discards" in player_data and not isinstance(player_data["discards"], list):
+            raise InvalidInputError(f"Player {player_id} discards must be a list")
+
+        # Validate riichi flag
+        if "riichi" in player_data and not isinstance(player_data["riichi"], bool):
+            raise InvalidInputError(f"Player {player_id} riichi must be a boolean")
+
+    # Validate optional winner_id
+    if "winner_id" in data and str(data["winner_id"]) not in data["players"]:
+        raise InvalidInputError(
+            f"Winner ID {data['winner_id']} is not a valid player ID"
+        )
+
+    # All validations passed
+    return True
+
+
+def encode_tiles(codes, player_id="", field="hand"):
+    """Convert a list of tile codes to an array of tile ids
+
+    Raises:
+        InvalidInputError: If a tile code is unknown
+    """
+    try:
+        return array("B", [TILE_IDS[code] for code in codes])
+    except (KeyError, TypeError):
+        for code in codes:
+            if not isinstance(code, str) or code not in TILE_IDS:
+                raise InvalidInputError(
+                    f"Player {player_id} {field} has unknown tile: {code!r}"
+                )
+        raise
+
+
+def decode_tiles(tile_ids):
+    """Convert an array of tile ids back to a list of tile codes"""
+    return [TILE_CODES[tile_id] for tile_id in tile_ids]
+
+
+class PlayerState:
+    """Compact state of one player"""
+
+    __slots__ = ("player_id", "wind", "score", "hand", "discards", "riichi")
+
+    def __init__(self, player_id, wind, score, hand, discards=None, riichi=False):
+        """Initialize the PlayerState
+
+        Args:
+            player_id: Player ID as a string
+            wind: Seat wind (E/S/W/N)
+            score: Current score
+            hand: array('B') of tile ids in the hand
+            discards: array('B') of discarded tile ids
+            riichi: Whether the player has declared riichi
+        """
+        self.player_id = player_id
+        self.wind = wind
+        self.score = score
+        self.hand = hand
+        self.discards = discards if discards is not None else array("B")
+        self.riichi = riichi
+
+    def __eq__(self, other):
+        if not isinstance(other, PlayerState):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def to_dict(self, tile_ids=False):
+        """Return the player as a JSON-style dictionary
+
+        Args:
+            tile_ids: Keep the hand and discards as copies of their tile id
+                arrays instead of decoding them to tile codes
+        """
+        if tile_ids:
+            hand, discards = self.hand[:], self.discards[:]
+        else:
+            hand, discards = decode_tiles(self.hand), decode_tiles(self.discards)
+        return {
+            "wind": self.wind,
+            "score": self.score,
+            "hand": hand,
+            "discards": discards,
+            "riichi": self.riichi,
+        }
+
+
+class GameState:
+    """Compact game state, parsed once from the JSON representation
+
+    Fields that are not drawn, such as "legend", are not kept.
+    """
+
+    __slots__ = ("round_wind", "honba", "winner_id", "players")
+
+    def __init__(self, round_wind, players, honba=0, winner_id=None):
+        """Initialize the GameState
+
+        Args:
+            round_wind: Current round wind (E/S/W/N)
+            players: Tuple of PlayerState, in input order
+            honba: Honba counter
+            winner_id: ID of the winning player, or None
+        """
+        self.round_wind = round_wind
+        self.players = players
+        self.honba = honba
+        self.winner_id = winner_id
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate and parse a JSON-style game state dictionary
+
+        Raises:
+            InvalidInputError: If the data is invalid or has unknown tiles
+        """
+        validate_game_data(data)
+        players = tuple(
+            PlayerState(
+                str(player_id),
+                player["wind"],
+                player["score"],
+                encode_tiles(player["hand"], player_id, "hand"),
+                encode_tiles(player.get("discards") or [], player_id, "discards"),
+                player.get("riichi", False),
+            )
+            for player_id, player in data["players"].items()
+        )
+        return cls(
+            data["round_wind"], players, data.get("honba", 0), data.get("winner_id")
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def to_dict(self, tile_ids=False):
+        """Return the state as a JSON-style dictionary accepted by the renderer
+
+        Args:
+            tile_ids: Keep hands and discards as arrays of tile ids, which
+                MahjongVisualizer draws without decoding them
+        """
+        data = {
+            "round_wind": self.round_wind,
+            "honba": self.honba,
+            "players": {
+                player.player_id: player.to_dict(tile_ids) for player in self.players
+            },
+        }
+        if self.winner_id is not None:
+            data["winner_id"] = self.winner_id
+        return data
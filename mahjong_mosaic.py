@@ -0,0 +1,230 @@
+"""Multi-table mosaics for tournament displays
+
+Renders many game states into the cells of one shared image, which is then
+encoded once, instead of rendering and encoding every table on its own and
+stitching the decoded images afterwards.
+
+Every table is drawn at the full table size on a canvas of a PooledRenderer,
+optionally reduced (see MahjongVisualizer.reduce_image()), and pasted into
+its cell. Tables are rendered by a pool of threads that share the fonts, tile
+images and board templates of the process.
+
+With a SharedRenderPool, tables are rendered by worker processes into
+shared memory instead, and pasted into their cells from there.
+
+Usage:
+    python mahjong_visualizer.py --mosaic 4 tables.jsonl 'more/*.json' floor.png
+                                 [--cell 4] [--gap 8] [--workers N] [--processes]
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from mahjong_visualizer import (
+    MahjongVisualizer,
+    MahjongVisualizerError,
+    PooledRenderer,
+    collect_inputs,
+)
+
+# Default number of rendering threads
+DEFAULT_THREADS = 4
+
+
+def mosaic_layout(count, columns, cell_size, gap=0):
+    """Compute the canvas size and the cell origins of a mosaic
+
+    Args:
+        count: Number of tables
+        columns: Number of cells per row
+        cell_size: (width, height) of every cell
+        gap: Space between cells and around the mosaic in pixels
+
+    Returns:
+        ((width, height) of the canvas, list of (x, y) cell origins in
+        row-major order)
+    """
+    rows = max(1, math.ceil(count / columns))
+    cell_width, cell_height = cell_size
+    size = (
+        columns * cell_width + (columns + 1) * gap,
+        rows * cell_height + (rows + 1) * gap,
+    )
+    origins = [
+        (
+            gap + (index % columns) * (cell_width + gap),
+            gap + (index // columns) * (cell_height + gap),
+        )
+        for index in range(count)
+    ]
+    return size, origins
+
+
+def cell_size_for(level, table_width, table_height):
+    """Return the size of a table reduced to a pyramid level"""
+    if isinstance(level, int):
+        return -(-table_width // level), -(-table_height // level)
+    return tuple(level)
+
+
+def render_mosaic(
+    states,
+    columns,
+    table_width=None,
+    table_height=None,
+    level=1,
+    gap=0,
+    threads=DEFAULT_THREADS,
+    renderer=None,
+    pool=None,
+):
+    """Render game states into the cells of one image
+
+    Args:
+        states: List of game state dictionaries or mahjong_model.GameState
+        columns: Number of tables per row; rows are added as needed
+        table_width: Width each table is drawn at (defaults to DEFAULT_WIDTH)
+        table_height: Height each table is drawn at (defaults to
+            DEFAULT_HEIGHT)
+        level: Reduction of each table into its cell, an integer factor or a
+            (width, height) size, see MahjongVisualizer.reduce_image()
+        gap: Space between cells and around the mosaic in pixels, filled
+            with the board background color
+        threads: Number of tables rendered at once
+        renderer: PooledRenderer of the table size to draw with, e.g. one
+            kept across mosaics; a new one is created by default
+        pool: mahjong_shared.SharedRenderPool of the table size; when given,
+            tables are rendered by its worker processes and pasted from
+            shared memory instead of rendered in threads
+
+    Returns:
+        RGB image holding every table
+
+    Raises:
+        InvalidInputError: If a game state is invalid
+    """
+    if columns < 1:
+        raise MahjongVisualizerError("A mosaic needs at least one column")
+    table_width = table_width or MahjongVisualizer.DEFAULT_WIDTH
+    table_height = table_height or MahjongVisualizer.DEFAULT_HEIGHT
+    if renderer is None and pool is None:
+        renderer = PooledRenderer(table_width, table_height, canvases=threads)
+
+    size, origins = mosaic_layout(
+        len(states), columns, cell_size_for(level, table_width, table_height), gap
+    )
+    mosaic = Image.new("RGB", size, MahjongVisualizer.COLORS["background"])
+
+    if pool is not None:
+        if (pool.width, pool.height) != (table_width, table_height):
+            raise MahjongVisualizerError(
+                f"Render pool size {pool.width}x{pool.height} does not match "
+                f"the table size {table_width}x{table_height}"
+            )
+        for index, frame in enumerate(pool.imap(states)):
+            mosaic.paste(
+                MahjongVisualizer.reduce_image(frame.image, level), origins[index]
+            )
+        return mosaic
+
+    def render_cell(index):
+        with renderer.rendered(states[index]) as image:
+            # Cells do not overlap, so threads paste into the mosaic at once
+            mosaic.paste(MahjongVisualizer.reduce_image(image, level), origins[index])
+
+    if threads <= 1 or len(states) <= 1:
+        for index in range(len(states)):
+            render_cell(index)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # list() re-raises the first error of any table
+            list(executor.map(render_cell, range(len(states))))
+    return mosaic
+
+
+def render_mosaic_bytes(states, columns, format="png", encoder_options=None, **kwargs):
+    """Render a mosaic and encode it once
+
+    Args:
+        states: List of game states, see render_mosaic()
+        columns: Number of tables per row
+        format: Output format, see MahjongVisualizer.encode_image()
+        encoder_options: Dictionary of encoder options
+        **kwargs: Other render_mosaic() arguments
+
+    Returns:
+        Encoded image as bytes
+    """
+    return MahjongVisualizer.encode_image(
+        render_mosaic(states, columns, **kwargs), format, **(encoder_options or {})
+    )
+
+
+def load_tables(sources):
+    """Load the game states of every table from files
+
+    Each .json file holds one state or a list of states; .jsonl files hold
+    one state per line. Sources are expanded as for batch rendering.
+
+    Raises:
+        InvalidInputError: If a file does not contain valid JSON
+        FileNotFoundError: If an input file does not exist
+    """
+    # Imported here as mahjong_animation depends on mahjong_visualizer
+    from mahjong_animation import iter_states
+
+    states = []
+    for path in collect_inputs(sources):
+        states.extend(iter_states(path))
+    return states
+
+
+def run_mosaic(args):
+    """Run the --mosaic command line mode and return the process exit code"""
+    if len(args.inputs) < 2:
+        print(
+            "Usage: python mahjong_visualizer.py --mosaic COLUMNS "
+            "tables.jsonl [more inputs] mosaic.png"
+        )
+        return 1
+
+    *sources, output_file = args.inputs
+    try:
+        states = load_tables(sources)
+        if not states:
+            print("Error: No game states found in the inputs")
+            return 1
+        options = dict(
+            level=args.cell, gap=args.gap, threads=args.workers or DEFAULT_THREADS
+        )
+        if args.processes:
+            # Imported here as mahjong_shared depends on mahjong_visualizer
+            from mahjong_shared import SharedRenderPool
+
+            with SharedRenderPool(
+                args.width or MahjongVisualizer.DEFAULT_WIDTH,
+                args.height or MahjongVisualizer.DEFAULT_HEIGHT,
+                workers=args.workers,
+            ) as pool:
+                mosaic = render_mosaic(
+                    states, args.mosaic, args.width, args.height, pool=pool, **options
+                )
+        else:
+            mosaic = render_mosaic(
+                states, args.mosaic, args.width, args.height, **options
+            )
+        mosaic.save(output_file)
+    except FileNotFoundError as e:
+        print(f"Error: Input file not found: {e.filename}")
+        return 1
+    except MahjongVisualizerError as e:
+        print(f"Error: {e}")
+        return 1
+
+    print(
+        f"Wrote {len(states)} tables to {output_file} "
+        f"({mosaic.width}x{mosaic.height})"
+    )
+    return 0
@@ -0,0 +1,384 @@
+"""Dirty-rectangle patch updates for thin live-view clients
+
+Instead of a full board image per state, a PatchRenderer emits only the
+rectangles whose pixels changed since the previous state, each encoded as a
+small image, so a client holding the previous board can patch its copy. The
+first update, every update after a layout change (a different player count
+or a winner) and every update of a layout whose regions overlap, as on boards
+smaller than the default, carry the whole board.
+
+Changed rectangles are found within the regions IncrementalRenderer repaints
+(see IncrementalRenderer.dirty_boxes) by comparing their old and new pixels
+and cutting the difference along empty rows and columns, so a discard
+becomes a patch of the hand strip and one of the discard pond rather than
+the whole player zone.
+
+Update container, all integers big-endian:
+
+    header   4-byte magic "MJP1", 4-byte sequence number, 2-byte board width,
+             2-byte board height, 1-byte flags (bit 0: the update holds the
+             whole board), 1-byte image format (index into PATCH_FORMATS),
+             2-byte patch count
+    patches  per patch: 2-byte x, y, width and height of the rectangle,
+             4-byte length of the encoded image, then the encoded image
+
+Sequence numbers count updates from 0 and let clients notice a missed
+update; after one, they need the next full update, see PatchRenderer.reset().
+
+Usage:
+    python mahjong_visualizer.py --patch previous.json new.json update.mjp
+"""
+
+import io
+import struct
+from collections import namedtuple
+
+from PIL import Image, ImageChops
+
+from mahjong_visualizer import (
+    IncrementalRenderer,
+    MahjongVisualizer,
+    MahjongVisualizerError,
+)
+
+MAGIC = b"MJP1"
+HEADER = struct.Struct(">4sIHHBBH")
+PATCH_HEADER = struct.Struct(">HHHHI")
+
+# Image formats of patches, by their code in the header
+PATCH_FORMATS = ("png", "png8", "webp", "jpeg")
+
+# Header flag of updates holding the whole board
+FLAG_FULL = 1
+
+# Changed areas closer than this many pixels are sent as one patch, which is
+# cheaper than the per-image overhead of two
+MERGE_GAP = 8
+
+# A decoded update; patches is a list of ((left, top, right, bottom), bytes)
+PatchUpdate = namedtuple(
+    "PatchUpdate", ["sequence", "size", "full", "format", "patches"]
+)
+
+
+def _runs(flags, gap):
+    """Return the (start, end) runs of true flags, joining runs up to gap apart"""
+    runs = []
+    start = last = None
+    for index, flag in enumerate(flags):
+        if not flag:
+            continue
+        if start is None:
+            start = index
+        elif index - last > gap:
+            runs.append((start, last + 1))
+            start = index
+        last = index
+    if start is not None:
+        runs.append((start, last + 1))
+    return runs
+
+
+def changed_boxes(difference, box, gap=MERGE_GAP):
+    """Cut the changed pixels of a box into tight rectangles
+
+    Recursively splits the box along rows and columns without changes
+    (an XY cut) until every part is one block of changes.
+
+    Args:
+        difference: Difference image of the old and new pixels, e.g. from
+            ImageChops.difference(); nonzero pixels changed
+        box: (left, top, right, bottom) part of difference to cut
+        gap: Largest run of unchanged rows or columns kept inside a rectangle
+
+    Returns:
+        List of (left, top, right, bottom) boxes in difference coordinates
+    """
+    left, top = box[:2]
+    columns, rows = difference.crop(box).getprojection()
+    column_runs = _runs(columns, gap)
+    if not column_runs:
+        return []
+    row_runs = _runs(rows, gap)
+    if len(row_runs) == 1 and len(column_runs) == 1:
+        return [
+            (
+                left + column_runs[0][0],
+                top + row_runs[0][0],
+                left + column_runs[0][1],
+                top + row_runs[0][1],
+            )
+        ]
+
+    boxes = []
+    if len(row_runs) > 1:
+        for start, end in row_runs:
+            boxes += changed_boxes(
+                difference, (left, top + start, box[2], top + end), gap
+            )
+    else:
+        for start, end in column_runs:
+            boxes += changed_boxes(
+                difference, (left + start, top, left + end, box[3]), gap
+            )
+    return boxes
+
+
+def encode_update(patches, size, sequence=0, full=False, format="png", **options):
+    """Pack rendered patches into an update container
+
+    Args:
+        patches: List of ((left, top, right, bottom), image) pairs
+        size: (width, height) of the board
+        sequence: Sequence number of the update
+        full: Whether the patches cover the whole board
+        format: Image format of the patches, one of PATCH_FORMATS
+        **options: Encoder options, see MahjongVisualizer.encode_image()
+
+    Returns:
+        The update as bytes
+
+    Raises:
+        MahjongVisualizerError: If the format is not supported
+    """
+    format = format.lower()
+    if format == "jpg":
+        format = "jpeg"
+    if format not in PATCH_FORMATS:
+        raise MahjongVisualizerError(f"Unsupported patch format: {format}")
+
+    parts = [
+        HEADER.pack(
+            MAGIC,
+            sequence,
+            size[0],
+            size[1],
+            FLAG_FULL if full else 0,
+            PATCH_FORMATS.index(format),
+            len(patches),
+        )
+    ]
+    for (left, top, right, bottom), image in patches:
+        data = MahjongVisualizer.encode_image(image, format, **options)
+        parts.append(
+            PATCH_HEADER.pack(left, top, right - left, bottom - top, len(data))
+        )
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_update(data):
+    """Parse an update container
+
+    Returns:
+        PatchUpdate holding the encoded patch images
+
+    Raises:
+        MahjongVisualizerError: If the data is not a valid update
+    """
+    try:
+        magic, sequence, width, height, flags, format_code, count = HEADER.unpack_from(
+            data
+        )
+        if magic != MAGIC:
+            raise MahjongVisualizerError("Not a patch update")
+        offset = HEADER.size
+        patches = []
+        for _ in range(count):
+            x, y, patch_width, patch_height, length = PATCH_HEADER.unpack_from(
+                data, offset
+            )
+            offset += PATCH_HEADER.size
+            if offset + length > len(data):
+                raise MahjongVisualizerError("Truncated patch update")
+            patches.append(
+                (
+                    (x, y, x + patch_width, y + patch_height),
+                    bytes(data[offset : offset + length]),
+                )
+            )
+            offset += length
+        format = PATCH_FORMATS[format_code]
+    except (struct.error, IndexError):
+        raise MahjongVisualizerError("Truncated or invalid patch update")
+    return PatchUpdate(
+        sequence, (width, height), bool(flags & FLAG_FULL), format, patches
+    )
+
+
+def apply_update(image, data):
+    """Apply an update to a client's copy of the board
+
+    A reference for clients: decode each patch and paste it at its position.
+
+    Args:
+        image: RGB image of the board after the previous update, patched in
+            place; may be None for an update holding the whole board
+        data: Update container bytes
+
+    Returns:
+        The patched image
+
+    Raises:
+        MahjongVisualizerError: If the update is invalid or needs a board of
+            another size
+    """
+    update = decode_update(data)
+    if image is None or image.size != update.size:
+        if not update.full:
+            raise MahjongVisualizerError("A patch update needs the previous board")
+        image = Image.new("RGB", update.size, MahjongVisualizer.COLORS["background"])
+    for box, patch in update.patches:
+        with Image.open(io.BytesIO(patch)) as decoded:
+            image.paste(decoded.convert("RGB"), box[:2])
+    return image
+
+
+class PatchRenderer(IncrementalRenderer):
+    """IncrementalRenderer that reports the changed rectangles of each state"""
+
+    def __init__(
+        self,
+        width=MahjongVisualizer.DEFAULT_WIDTH,
+        height=MahjongVisualizer.DEFAULT_HEIGHT,
+        gap=MERGE_GAP,
+    ):
+        """Initialize the PatchRenderer
+
+        Args:
+            width: Width of the board in pixels
+            height: Height of the board in pixels
+            gap: Changed areas closer than this are merged into one patch
+        """
+        super().__init__(width, height)
+        self.gap = gap
+        self.sequence = 0
+        # Pixels of the dirty boxes before they were repainted
+        self.previous_pixels = []
+
+    def get_dirty_regions(self, previous, current):
+        dirty = super().get_dirty_regions(previous, current)
+        # Called before the regions are repainted: keep their old pixels
+        boxes = current.get_region_boxes()
+        self.previous_pixels = [self.image.crop(boxes[region]) for region in dirty]
+        return dirty
+
+    def render_patches(self, game_data):
+        """Render a game state and return the rectangles that changed
+
+        Args:
+            game_data: Dictionary containing the mahjong game state, or a
+                mahjong_model.GameState
+
+        Returns:
+            List of ((left, top, right, bottom), image) pairs; the whole board
+            after a full render (see full_render)
+
+        Raises:
+            InvalidInputError: If the game data is invalid
+        """
+        self.previous_pixels = []
+        image = self.render(game_data)
+        if self.full_render:
+            return [((0, 0, self.width, self.height), image.copy())]
+
+        patches = []
+        for box, before in zip(self.dirty_boxes, self.previous_pixels):
+            difference = ImageChops.difference(before, image.crop(box))
+            for left, top, right, bottom in changed_boxes(
+                difference, (0, 0) + difference.size, self.gap
+            ):
+                patch_box = (
+                    box[0] + left,
+                    box[1] + top,
+                    box[0] + right,
+                    box[1] + bottom,
+                )
+                patches.append((patch_box, image.crop(patch_box)))
+        return patches
+
+    def render_update(self, game_data, format="png", **options):
+        """Render a game state as an update container
+
+        Args:
+            game_data: Dictionary containing the mahjong game state, or a
+                mahjong_model.GameState
+            format: Image format of the patches, one of PATCH_FORMATS;
+                lossless formats keep the client's board exact
+            **options: Encoder options, see MahjongVisualizer.encode_image()
+
+        Returns:
+            The update as bytes
+        """
+        patches = self.render_patches(game_data)
+        data = encode_update(
+            patches,
+            (self.width, self.height),
+            self.sequence,
+            self.full_render,
+            format,
+            **options,
+        )
+        self.sequence += 1
+        return data
+
+
+def render_patch(previous, current, width=None, height=None, format="png", **options):
+    """Return the update turning the board of one state into that of another
+
+    Args:
+        previous: Game state the client shows
+        current: New game state
+        width: Width of the board (defaults to DEFAULT_WIDTH)
+        height: Height of the board (defaults to DEFAULT_HEIGHT)
+        format: Image format of the patches, one of PATCH_FORMATS
+        **options: Encoder options, see MahjongVisualizer.encode_image()
+
+    Returns:
+        Update container bytes; a full board if the layout changed
+    """
+    renderer = PatchRenderer(
+        width or MahjongVisualizer.DEFAULT_WIDTH,
+        height or MahjongVisualizer.DEFAULT_HEIGHT,
+    )
+    renderer.render(previous)
+    # The client already holds update 0, the board of the previous state
+    renderer.sequence = 1
+    return renderer.render_update(current, format, **options)
+
+
+def run_patch(args):
+    """Run the --patch command line mode and return the process exit code"""
+    # Imported here as mahjong_animation depends on mahjong_visualizer
+    from mahjong_animation import iter_states
+
+    if len(args.inputs) != 3:
+        print(
+            "Usage: python mahjong_visualizer.py --patch previous.json new.json "
+            "update.mjp"
+        )
+        return 1
+
+    previous_file, current_file, output_file = args.inputs
+    try:
+        previous = next(iter_states(previous_file), None)
+        current = next(iter_states(current_file), None)
+        if previous is None or current is None:
+            print("Error: No game state found in the inputs")
+            return 1
+        data = render_patch(
+            previous, current, args.width, args.height, args.format or "png"
+        )
+        with open(output_file, "wb") as f:
+            f.write(data)
+    except FileNotFoundError as e:
+        print(f"Error: Input file not found: {e.filename}")
+        return 1
+    except MahjongVisualizerError as e:
+        print(f"Error: {e}")
+        return 1
+
+    update = decode_update(data)
+    kind = "full board" if update.full else f"{len(update.patches)} patches"
+    print(f"Wrote {kind} ({len(data)} bytes) to {output_file}")
+    return 0
@@ -0,0 +1,476 @@
+"""Golden-image regression harness with time and memory budgets
+
+Renders a fixed corpus of scenarios and checks every output against a golden
+image, then checks the render time and memory of each scenario against its
+budget, so a change fails when it alters pixels or slows rendering down.
+
+Outputs are first compared by a hash of their raw pixels stored in the
+manifest, which costs a few milliseconds and needs no image decoding. Only on
+a hash mismatch is the golden image loaded and diffed; differences within
+the scenario's tolerance pass with a warning, larger ones fail and write the
+actual image and a diff image to the artifacts directory.
+
+The manifest (regression/scenarios.json) holds defaults and a list of
+scenarios. Paths are relative to the manifest. Scenario fields:
+
+    name           Unique scenario name
+    input          Game state JSON file
+    previous       Optional state rendered first with an IncrementalRenderer,
+                   so only the regions that differ are repainted for input
+    patches        Whether to send previous and input as patch updates and
+                   check the board of a client applying them instead (see
+                   mahjong_patches.apply_update())
+    width, height  Board size (default: DEFAULT_WIDTH x DEFAULT_HEIGHT)
+    level          Pyramid level of the output, see render_pyramid()
+    compositing    Tile compositing path, "pillow" or "numpy"; numpy
+                   scenarios are skipped when NumPy is not installed
+    encode         Image format also encoded in the timed render
+    golden         Golden image file
+    hash           Pixel hash of the golden image, see pixel_hash()
+    tolerance      {"max_delta": largest tolerated channel difference,
+                    "max_pixels": number of pixels allowed to exceed it}
+    time_ms        Budget of the median render time
+    memory_kib     Budget of the peak memory of one render: the growth of
+                   the process peak RSS where available (Linux), else the
+                   peak of Python allocations
+
+Usage:
+    python mahjong_regression.py [--scenario NAME] [--repeat 5]
+                                 [--time-scale 1.5] [--no-budgets]
+                                 [--update] [--output report.json]
+"""
+
+import argparse
+import ctypes
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+from PIL import Image, ImageChops
+
+from mahjong_benchmark import read_memory_status, reset_peak_rss
+from mahjong_visualizer import (
+    IncrementalRenderer,
+    MahjongVisualizer,
+    MahjongVisualizerError,
+    np,
+)
+from mahjong_patches import PatchRenderer, apply_update
+
+DEFAULT_MANIFEST = os.path.join("regression", "scenarios.json")
+DEFAULT_ARTIFACTS = os.path.join("regression", "artifacts")
+
+# Tolerance of scenarios that do not set one: exact pixels
+DEFAULT_TOLERANCE = {"max_delta": 0, "max_pixels": 0}
+
+# Outcome of one scenario; status is "pass", "fail" or "skip"
+ScenarioResult = namedtuple(
+    "ScenarioResult", ["name", "status", "time_ms", "memory_kib", "messages"]
+)
+
+# Pixel difference between an output and its golden image
+ImageDiff = namedtuple("ImageDiff", ["pixels", "max_delta", "bbox"])
+
+
+def pixel_hash(image):
+    """Return a hash of the size and raw RGB pixels of an image"""
+    image = image.convert("RGB")
+    digest = hashlib.sha1(f"{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return f"sha1:{digest.hexdigest()}"
+
+
+def channel_difference(actual, golden):
+    """Return an "L" image of the largest channel difference of each pixel"""
+    red, green, blue = ImageChops.difference(actual, golden).split()
+    return ImageChops.lighter(ImageChops.lighter(red, green), blue)
+
+
+def compare_images(actual, golden, max_delta=0):
+    """Diff an output against its golden image
+
+    Args:
+        actual: Rendered RGB image
+        golden: Golden RGB image of the same size
+        max_delta: Channel difference tolerated without counting a pixel
+
+    Returns:
+        ImageDiff of the number of pixels differing by more than max_delta,
+        the largest channel difference and the box of all differences
+    """
+    difference = channel_difference(actual, golden)
+    histogram = difference.histogram()
+    largest = max((value for value, count in enumerate(histogram) if count), default=0)
+    return ImageDiff(sum(histogram[max_delta + 1 :]), largest, difference.getbbox())
+
+
+def write_artifacts(directory, name, actual, golden):
+    """Write the actual image and an amplified diff image of a failure
+
+    Returns:
+        List of the written paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    actual_path = os.path.join(directory, f"{name}.actual.png")
+    actual.save(actual_path)
+    paths = [actual_path]
+    if golden is not None and golden.size == actual.size:
+        diff_path = os.path.join(directory, f"{name}.diff.png")
+        # Any difference shows in full red over a dimmed golden image
+        mask = channel_difference(actual, golden).point(lambda v: 255 if v else 0)
+        diff = Image.blend(golden, Image.new("RGB", golden.size), 0.6)
+        diff.paste((255, 0, 0), mask=mask)
+        diff.save(diff_path)
+        paths.append(diff_path)
+    return paths
+
+
+def load_manifest(path):
+    """Load a manifest and resolve its scenarios against the defaults
+
+    Returns:
+        (manifest dictionary, list of scenario dictionaries with every
+        field set and paths made absolute)
+
+    Raises:
+        MahjongVisualizerError: If a scenario is incomplete or duplicated
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    defaults = manifest.get("defaults", {})
+
+    scenarios = []
+    names = set()
+    for entry in manifest["scenarios"]:
+        scenario = {
+            "previous": None,
+            "patches": False,
+            "width": MahjongVisualizer.DEFAULT_WIDTH,
+            "height": MahjongVisualizer.DEFAULT_HEIGHT,
+            "level": 1,
+            "compositing": "pillow",
+            "encode": None,
+            "hash": None,
+            "tolerance": DEFAULT_TOLERANCE,
+            "time_ms": None,
+            "memory_kib": None,
+            **defaults,
+            **entry,
+        }
+        for field in ("name", "input", "golden"):
+            if field not in scenario:
+                raise MahjongVisualizerError(f"Scenario without {field}: {entry}")
+        if scenario["name"] in names:
+            raise MahjongVisualizerError(f"Duplicate scenario: {scenario['name']}")
+        names.add(scenario["name"])
+        for field in ("input", "previous", "golden"):
+            if scenario[field] is not None:
+                scenario[field] = os.path.join(base, scenario[field])
+        scenarios.append(scenario)
+    return manifest, scenarios
+
+
+def load_state(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def make_render(scenario):
+    """Return a function rendering a scenario and returning its output image"""
+    state = load_state(scenario["input"])
+    previous = load_state(scenario["previous"]) if scenario["previous"] else None
+    width, height = scenario["width"], scenario["height"]
+    level = scenario["level"]
+    if isinstance(level, list):
+        level = tuple(level)
+
+    def render():
+        if scenario["patches"]:
+            renderer = PatchRenderer(width, height)
+            board = None
+            for game_data in (previous, state):
+                if game_data is not None:
+                    board = apply_update(board, renderer.render_update(game_data))
+            image = MahjongVisualizer.reduce_image(board, level)
+        elif previous is not None:
+            renderer = IncrementalRenderer(width, height)
+            renderer.render(previous)
+            image = MahjongVisualizer.reduce_image(renderer.render(state), level)
+        else:
+            visualizer = MahjongVisualizer(state, width, height)
+            image = visualizer.render_pyramid([level])[0]
+        if scenario["encode"]:
+            MahjongVisualizer.encode_image(image, scenario["encode"])
+        return image
+
+    return render
+
+
+def measure_time(render, repeat):
+    """Return the median time of render() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def release_free_memory():
+    """Return freed heap memory to the system where the C library can (glibc)
+
+    Otherwise a render reuses the pixel buffers freed by the previous one and
+    does not raise the peak RSS at all.
+    """
+    try:
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError, TypeError):
+        pass
+
+
+def measure_memory(render):
+    """Return the peak memory of one render() in KiB, see the module docstring"""
+    release_free_memory()
+    rss_available = read_memory_status() is not None and reset_peak_rss()
+    if rss_available:
+        rss_before = read_memory_status()[0]
+    tracemalloc.start()
+    try:
+        render()
+        python_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    if rss_available:
+        return read_memory_status()[1] - rss_before
+    return python_peak / 1024
+
+
+def check_scenario(scenario, repeat=5, time_scale=1.0, budgets=True, artifacts=None):
+    """Render one scenario and check its output and budgets
+
+    Args:
+        scenario: Resolved scenario, see load_manifest()
+        repeat: Number of timed renders
+        time_scale: Factor applied to the time budget, for slower machines
+        budgets: Whether to measure and enforce the budgets
+        artifacts: Directory for the images of failures, or None
+
+    Returns:
+        ScenarioResult
+    """
+    name = scenario["name"]
+    if scenario["compositing"] == "numpy" and np is None:
+        return ScenarioResult(name, "skip", None, None, ["NumPy is not installed"])
+
+    messages = []
+    failed = False
+    previous_compositing = MahjongVisualizer.COMPOSITING
+    MahjongVisualizer.COMPOSITING = scenario["compositing"]
+    try:
+        render = make_render(scenario)
+        # The first render also warms the caches for the measurements
+        actual = render().convert("RGB")
+
+        if pixel_hash(actual) != scenario["hash"]:
+            golden = None
+            if os.path.exists(scenario["golden"]):
+                with Image.open(scenario["golden"]) as image:
+                    golden = image.convert("RGB")
+            tolerance = {**DEFAULT_TOLERANCE, **scenario["tolerance"]}
+            if golden is None:
+                messages.append("golden image is missing")
+                failed = True
+            elif golden.size != actual.size:
+                messages.append(f"size {actual.size} differs from golden {golden.size}")
+                failed = True
+            else:
+                diff = compare_images(actual, golden, tolerance["max_delta"])
+                detail = (
+                    f"{diff.pixels} pixels differ by more than "
+                    f"{tolerance['max_delta']} (largest difference {diff.max_delta}, "
+                    f"box {diff.bbox})"
+                )
+                if diff.pixels > tolerance["max_pixels"]:
+                    messages.append(f"pixels changed: {detail}")
+                    failed = True
+                else:
+                    messages.append(f"within tolerance: {detail}")
+            if failed and artifacts:
+                paths = write_artifacts(artifacts, name, actual, golden)
+                messages.append(f"wrote {', '.join(paths)}")
+
+        time_ms = memory_kib = None
+        if budgets:
+            time_ms = measure_time(render, repeat)
+            memory_kib = measure_memory(render)
+            if scenario["time_ms"] is not None:
+                budget = scenario["time_ms"] * time_scale
+                if time_ms > budget:
+                    messages.append(
+                        f"time {time_ms:.1f} ms exceeds budget {budget:.1f} ms"
+                    )
+                    failed = True
+            if (
+                scenario["memory_kib"] is not None
+                and memory_kib > scenario["memory_kib"]
+            ):
+                messages.append(
+                    f"memory {memory_kib:.0f} KiB exceeds budget "
+                    f"{scenario['memory_kib']} KiB"
+                )
+                failed = True
+    finally:
+        MahjongVisualizer.COMPOSITING = previous_compositing
+
+    return ScenarioResult(
+        name, "fail" if failed else "pass", time_ms, memory_kib, messages
+    )
+
+
+def update_golden(scenario, manifest_entry):
+    """Render a scenario, store its output as the golden image and its hash
+
+    Returns:
+        Whether the golden image was written; it is kept if its pixels match
+    """
+    previous_compositing = MahjongVisualizer.COMPOSITING
+    MahjongVisualizer.COMPOSITING = scenario["compositing"]
+    try:
+        actual = make_render(scenario)().convert("RGB")
+    finally:
+        MahjongVisualizer.COMPOSITING = previous_compositing
+    actual_hash = pixel_hash(actual)
+    manifest_entry["hash"] = actual_hash
+    if os.path.exists(scenario["golden"]):
+        with Image.open(scenario["golden"]) as golden:
+            if pixel_hash(golden) == actual_hash:
+                # Keep hand-checked files byte for byte
+                return False
+    os.makedirs(os.path.dirname(scenario["golden"]), exist_ok=True)
+    actual.save(scenario["golden"], optimize=True)
+    return True
+
+
+def format_result(result, scenario):
+    """Return a one-line summary of a scenario result"""
+    line = f"{result.status.upper():4}  {result.name}"
+    if result.time_ms is not None:
+        budget = f" / {scenario['time_ms']} ms" if scenario["time_ms"] else ""
+        line += f"  {result.time_ms:.1f} ms{budget}"
+    if result.memory_kib is not None:
+        budget = f" / {scenario['memory_kib']} KiB" if scenario["memory_kib"] else ""
+        line += f"  {result.memory_kib:.0f} KiB{budget}"
+    return "\n".join([line] + [f"      {message}" for message in result.messages])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check renders against golden images and performance budgets"
+    )
+    parser.add_argument(
+        "--manifest",
+        default=DEFAULT_MANIFEST,
+        help=f"scenario manifest (default: {DEFAULT_MANIFEST})",
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        default=None,
+        help="only run this scenario; may be repeated",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="timed renders per scenario, the median is checked (default: 5)",
+    )
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="multiply every time budget, e.g. 2 on a slow machine (default: 1)",
+    )
+    parser.add_argument(
+        "--no-budgets", action="store_true", help="only check the rendered pixels"
+    )
+    parser.add_argument(
+        "--artifacts",
+        default=DEFAULT_ARTIFACTS,
+        help=f"directory for images of failures (default: {DEFAULT_ARTIFACTS})",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="accept the current renders as the new golden images",
+    )
+    parser.add_argument(
+        "--output", default=None, help="write the results as JSON to this file"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        manifest, scenarios = load_manifest(args.manifest)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: Cannot read manifest {args.manifest}: {e}")
+        sys.exit(1)
+    except MahjongVisualizerError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.scenario:
+        unknown = set(args.scenario) - {scenario["name"] for scenario in scenarios}
+        if unknown:
+            print(f"Error: Unknown scenario: {', '.join(sorted(unknown))}")
+            sys.exit(1)
+        selected = [s for s in scenarios if s["name"] in args.scenario]
+    else:
+        selected = scenarios
+
+    if args.update:
+        entries = {entry["name"]: entry for entry in manifest["scenarios"]}
+        for scenario in selected:
+            if update_golden(scenario, entries[scenario["name"]]):
+                print(f"Updated {scenario['name']}")
+            else:
+                print(f"Unchanged {scenario['name']}")
+        with open(args.manifest, "w") as f:
+            f.write(json.dumps(manifest, indent=2) + "\n")
+        return
+
+    results = []
+    for scenario in selected:
+        try:
+            result = check_scenario(
+                scenario,
+                repeat=args.repeat,
+                time_scale=args.time_scale,
+                budgets=not args.no_budgets,
+                artifacts=args.artifacts,
+            )
+        except (OSError, ValueError, MahjongVisualizerError) as e:
+            result = ScenarioResult(scenario["name"], "fail", None, None, [str(e)])
+        results.append(result)
+        print(format_result(result, scenario))
+
+    failures = sum(result.status == "fail" for result in results)
+    skipped = sum(result.status == "skip" for result in results)
+    print(
+        f"{len(results) - failures - skipped} passed, {failures} failed, "
+        f"{skipped} skipped"
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([result._asdict() for result in results], f, indent=2)
+            f.write("\n")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
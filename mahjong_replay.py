@@ -0,0 +1,450 @@
+"""Indexed replay logs for seeking to any turn of a long session
+
+A replay is stored in two files:
+
+    game.replay      Append-only log, one JSON record per line and per turn.
+                     {"k": <state>} is a keyframe holding the full game state,
+                     {"d": <patch>} a delta holding a JSON merge patch
+                     (RFC 7386) that turns the previous state into this one.
+    game.replay.idx  Index: 4-byte magic, then one entry per turn of the
+                     byte offset of its record in the log (8 bytes) and the
+                     turn of the keyframe it builds on (4 bytes), big-endian.
+
+A keyframe is written every KEYFRAME_INTERVAL turns, so rebuilding any turn
+reads one index entry, one keyframe and at most KEYFRAME_INTERVAL - 1 deltas
+through memory maps of both files, however long the log is. States with
+changes a merge patch cannot express (an explicit null value) are stored as
+keyframes.
+
+Usage:
+    python mahjong_replay.py hand_log.jsonl [more inputs] game.replay
+                             [--keyframe-interval 64]
+    python mahjong_visualizer.py game.replay turn.png --turn 1800
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+from mahjong_model import (
+    GameState,
+    InvalidInputError,
+    MahjongVisualizerError,
+    validate_game_data,
+)
+
+# Turns between two keyframes
+KEYFRAME_INTERVAL = 64
+
+# Suffix of the index file, appended to the path of the log
+INDEX_SUFFIX = ".idx"
+
+
+def _has_null_member(value):
+    """Return whether a value holds None in a dictionary or list at any depth"""
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, list):
+        return False
+    return any(item is None or _has_null_member(item) for item in value)
+
+
+def diff_states(old, new):
+    """Return a JSON merge patch turning old into new
+
+    Lists are replaced as a whole, as in any merge patch.
+
+    Args:
+        old: Previous dictionary
+        new: Next dictionary
+
+    Returns:
+        Patch dictionary, empty if the two are equal, or None if new holds a
+        null value that a merge patch cannot express
+    """
+    patch = {}
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            patch[key] = diff_states(old[key], value)
+            if patch[key] is None:
+                return None
+        elif value is None or _has_null_member(value):
+            return None
+        else:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def apply_patch(target, patch):
+    """Apply a JSON merge patch without modifying target
+
+    The result shares the parts target and patch do not change.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_patch(result.get(key), value)
+    return result
+
+
+class ReplayIndex:
+    """Layout of the index file of a replay"""
+
+    MAGIC = b"MJR1"
+    ENTRY = struct.Struct(">QI")
+
+    @classmethod
+    def entry_count(cls, size):
+        """Return the number of complete entries in an index of size bytes"""
+        return max(0, (size - len(cls.MAGIC)) // cls.ENTRY.size)
+
+    @classmethod
+    def entry_offset(cls, turn):
+        """Return the position of the entry of a turn in the index"""
+        return len(cls.MAGIC) + turn * cls.ENTRY.size
+
+
+class ReplayWriter:
+    """Appends game states to a replay log and its index
+
+    Opening an existing replay continues it. Records written after the last
+    index entry, e.g. by a writer that was killed before flushing its index,
+    are indexed again, and a trailing partial record is cut off.
+    """
+
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL, validate=True):
+        """Open a replay for appending
+
+        Args:
+            path: Path of the log; the index is written next to it
+            keyframe_interval: Turns between two keyframes
+            validate: Whether to validate each state before storing it
+
+        Raises:
+            MahjongVisualizerError: If the index does not belong to the log
+        """
+        if keyframe_interval < 1:
+            raise MahjongVisualizerError("The keyframe interval must be at least 1")
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.keyframe_interval = keyframe_interval
+        self.validate = validate
+        self.turns = 0
+        self.keyframe_turn = 0
+        self.previous = None
+        # Index entries of the records written since the last flush()
+        self.pending = bytearray()
+
+        self.recover()
+        self.log = open(self.path, "ab")
+        self.index = open(self.index_path, "ab")
+        self.offset = self.log.tell()
+        if self.turns:
+            with ReplayReader(self.path) as reader:
+                self.previous = reader.state(self.turns - 1)
+                self.keyframe_turn = reader.keyframe_of(self.turns - 1)
+
+    def recover(self):
+        """Bring the log and index of an existing replay back in step"""
+        with open(self.path, "ab+") as log, open(self.index_path, "ab+") as index:
+            index.seek(0)
+            magic = index.read(len(ReplayIndex.MAGIC))
+            if len(magic) < len(ReplayIndex.MAGIC):
+                # New replay, or an index that was never written
+                index.truncate(0)
+                index.write(ReplayIndex.MAGIC)
+            elif magic != ReplayIndex.MAGIC:
+                raise MahjongVisualizerError(f"Not a replay index: {self.index_path}")
+
+            # Drop partial entries and entries of records that never made it
+            # into the log, then index the complete records after them
+            self.turns = ReplayIndex.entry_count(index.seek(0, os.SEEK_END))
+            end = 0
+            keyframe_turn = 0
+            while self.turns:
+                index.seek(ReplayIndex.entry_offset(self.turns - 1))
+                offset, keyframe_turn = ReplayIndex.ENTRY.unpack(
+                    index.read(ReplayIndex.ENTRY.size)
+                )
+                log.seek(offset)
+                line = log.readline()
+                if line.endswith(b"\n"):
+                    end = offset + len(line)
+                    break
+                self.turns -= 1
+            index.truncate(ReplayIndex.entry_offset(self.turns))
+
+            log.seek(end)
+            for line in log:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if "k" in record:
+                    keyframe_turn = self.turns
+                index.write(ReplayIndex.ENTRY.pack(end, keyframe_turn))
+                end += len(line)
+                self.turns += 1
+            log.truncate(end)
+
+    def append(self, game_data):
+        """Append the state of the next turn
+
+        Args:
+            game_data: Dictionary containing the game state, or a
+                mahjong_model.GameState
+
+        Returns:
+            Turn number of the state, counted from 0
+
+        Raises:
+            InvalidInputError: If validation is enabled and the state is invalid
+        """
+        if isinstance(game_data, GameState):
+            game_data = game_data.to_dict()
+        elif self.validate:
+            validate_game_data(game_data)
+        if not isinstance(game_data, dict):
+            raise InvalidInputError("Game data must be a JSON object")
+        # Round trip through JSON so later changes by the caller do not leak
+        # into the next delta, and states compare as they will be read back
+        text = json.dumps(game_data, separators=(",", ":"))
+        state = json.loads(text)
+
+        patch = None
+        if self.previous is not None and (
+            self.turns - self.keyframe_turn < self.keyframe_interval
+        ):
+            patch = diff_states(self.previous, state)
+        if patch is None:
+            record = '{"k":' + text + "}\n"
+            self.keyframe_turn = self.turns
+        else:
+            record = '{"d":' + json.dumps(patch, separators=(",", ":")) + "}\n"
+
+        data = record.encode()
+        self.log.write(data)
+        self.pending.extend(ReplayIndex.ENTRY.pack(self.offset, self.keyframe_turn))
+        self.offset += len(data)
+        self.previous = state
+        self.turns += 1
+        return self.turns - 1
+
+    def flush(self):
+        """Write buffered records to the log, then their index entries
+
+        Index entries are only written after their records, so readers never
+        see an entry of a record that is not in the log yet.
+        """
+        self.log.flush()
+        self.index.write(self.pending)
+        self.index.flush()
+        self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.log.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayReader:
+    """Rebuilds the state of any turn of a replay through memory maps
+
+    The last rebuilt state is kept, so reading turns in order applies a
+    single delta each. Returned states share unchanged parts with the states
+    of other turns and must not be modified.
+    """
+
+    def __init__(self, path):
+        """Open a replay for reading
+
+        Args:
+            path: Path of the log, as passed to ReplayWriter
+
+        Raises:
+            FileNotFoundError: If the log or its index does not exist
+            MahjongVisualizerError: If the index is not a replay index
+        """
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.log_file = open(path, "rb")
+        self.index_file = open(self.index_path, "rb")
+        self.log = None
+        self.index = None
+        self.turns = 0
+        self.cached = None
+        self.refresh()
+        if self.index is not None and self.index[:4] != ReplayIndex.MAGIC:
+            self.close()
+            raise MahjongVisualizerError(f"Not a replay index: {self.index_path}")
+
+    @staticmethod
+    def _map(f, current):
+        """Memory-map a whole file again if it grew, or return None if empty"""
+        size = os.fstat(f.fileno()).st_size
+        if current is not None and len(current) == size:
+            return current
+        if current is not None:
+            current.close()
+        if size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def refresh(self):
+        """Pick up turns appended since the replay was opened
+
+        Returns:
+            Number of turns
+        """
+        # The index first: a writer flushes it after the records it refers to
+        self.index = self._map(self.index_file, self.index)
+        self.log = self._map(self.log_file, self.log)
+        self.turns = ReplayIndex.entry_count(len(self.index) if self.index else 0)
+        return self.turns
+
+    def __len__(self):
+        return self.turns
+
+    def _entry(self, turn):
+        if turn < 0:
+            turn += self.turns
+        if not 0 <= turn < self.turns:
+            raise IndexError(f"Turn {turn} is not in the replay ({self.turns} turns)")
+        offset, keyframe_turn = ReplayIndex.ENTRY.unpack_from(
+            self.index, ReplayIndex.entry_offset(turn)
+        )
+        return turn, offset, keyframe_turn
+
+    def keyframe_of(self, turn):
+        """Return the turn of the keyframe a turn is rebuilt from"""
+        return self._entry(turn)[2]
+
+    def record(self, turn):
+        """Return the decoded log record of a turn, see the module docstring"""
+        turn, offset, _ = self._entry(turn)
+        end = self.log.find(b"\n", offset)
+        return json.loads(self.log[offset:end])
+
+    def state(self, turn):
+        """Rebuild the game state of a turn
+
+        Args:
+            turn: Turn number counted from 0; negative numbers count from the
+                end of the replay
+
+        Returns:
+            Game state dictionary, to be treated as read-only
+
+        Raises:
+            IndexError: If the replay has no such turn
+        """
+        turn, _, keyframe_turn = self._entry(turn)
+        if self.cached is not None and keyframe_turn <= self.cached[0] <= turn:
+            current, state = self.cached
+        else:
+            current, state = keyframe_turn, self.record(keyframe_turn)["k"]
+        while current < turn:
+            current += 1
+            state = apply_patch(state, self.record(current)["d"])
+        self.cached = (turn, state)
+        return state
+
+    def __getitem__(self, turn):
+        return self.state(turn)
+
+    def __iter__(self):
+        for turn in range(self.turns):
+            yield self.state(turn)
+
+    def close(self):
+        for buffer in (self.log, self.index):
+            if buffer is not None:
+                buffer.close()
+        self.log = self.index = None
+        self.log_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_replay(path):
+    """Return whether a path names a replay log"""
+    return str(path).endswith(".replay")
+
+
+def iter_replay(path, start=0, stop=None):
+    """Iterate over the game states of a range of turns of a replay"""
+    with ReplayReader(path) as reader:
+        for turn in range(*slice(start, stop).indices(len(reader))):
+            yield reader.state(turn)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Append game states to an indexed replay log"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        metavar="input",
+        help="JSON or JSONL files of states in turn order, followed by the "
+        "replay log to append to",
+    )
+    parser.add_argument(
+        "--keyframe-interval",
+        type=int,
+        default=KEYFRAME_INTERVAL,
+        help=f"turns between two full states (default: {KEYFRAME_INTERVAL})",
+    )
+    args = parser.parse_args(argv)
+    if len(args.inputs) < 2:
+        parser.error("expected at least one input and the replay log")
+
+    # Imported here as mahjong_animation depends on Pillow
+    from mahjong_animation import iter_states
+
+    *sources, output_file = args.inputs
+    appended = 0
+    try:
+        with ReplayWriter(output_file, args.keyframe_interval) as writer:
+            for source in sources:
+                for state in iter_states(source):
+                    writer.append(state)
+                    appended += 1
+            turns = writer.turns
+    except FileNotFoundError as e:
+        print(f"Error: Input file not found: {e.filename}")
+        sys.exit(1)
+    except MahjongVisualizerError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Appended {appended} states to {output_file} ({turns} turns)")
+
+
+if __name__ == "__main__":
+    main()
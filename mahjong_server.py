@@ -0,0 +1,233 @@
+"""Local HTTP render service for mahjong game states
+
+Accepts game state JSON via POST and returns the rendered image bytes. Renders
+run in a pool of worker processes that load fonts and tile images once when
+the server starts, and responses are cached in a RenderCache keyed on the
+canonicalized game state.
+
+Usage:
+    python mahjong_server.py [--host 127.0.0.1] [--port 8000] [--workers N]
+
+Endpoints:
+    POST /render    Body: game state JSON. Query: width, height, format
+    GET /health     Liveness check
+    GET /stats      Cache statistics as JSON
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from mahjong_cache import RenderCache
+from mahjong_visualizer import (
+    MahjongVisualizer,
+    MahjongVisualizerError,
+    _init_batch_worker,
+)
+
+# Content type of each supported output format
+CONTENT_TYPES = {
+    "png": "image/png",
+    "png8": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+# Largest accepted request body in bytes
+MAX_BODY_SIZE = 1024 * 1024
+
+
+def render_state_bytes(game_data, format="png", width=None, height=None):
+    """Render a game state and return the encoded image bytes
+
+    Runs inside the worker processes.
+    """
+    visualizer = MahjongVisualizer(
+        game_data,
+        width or MahjongVisualizer.DEFAULT_WIDTH,
+        height or MahjongVisualizer.DEFAULT_HEIGHT,
+    )
+    return visualizer.render_bytes(format)
+
+
+def _ping():
+    """No-op task used to start and warm up the worker processes"""
+    return os.getpid()
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler rendering game states through the server's worker pool"""
+
+    server_version = "MahjongRender/0.1"
+
+    def send_json(self, status, payload):
+        """Send a JSON response"""
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif path == "/stats":
+            self.send_json(200, self.server.cache.stats())
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/render":
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        # Parse render parameters
+        query = parse_qs(url.query)
+        format = query.get("format", ["png"])[0].lower()
+        if format not in CONTENT_TYPES:
+            self.send_json(400, {"error": f"Unsupported format: {format}"})
+            return
+        try:
+            width = int(query["width"][0]) if "width" in query else None
+            height = int(query["height"][0]) if "height" in query else None
+        except ValueError:
+            self.send_json(400, {"error": "width and height must be integers"})
+            return
+
+        # Read and parse the game state
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_SIZE:
+            self.send_json(413, {"error": "Request body too large"})
+            return
+        try:
+            game_data = json.loads(self.rfile.read(length))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self.send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+
+        key = self.server.cache.key(game_data, width, height, format)
+        data = self.server.cache.get(key)
+        cache_status = "HIT"
+        if data is None:
+            cache_status = "MISS"
+            try:
+                data = self.server.executor.submit(
+                    render_state_bytes, game_data, format, width, height
+                ).result()
+            except MahjongVisualizerError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            except Exception as e:
+                self.send_json(500, {"error": f"Unexpected error: {e}"})
+                return
+            self.server.cache.put(key, data)
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[format])
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", f'"{key}"')
+        self.send_header("X-Cache", cache_status)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class RenderServer(ThreadingHTTPServer):
+    """HTTP server owning the worker pool and the response cache"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        workers=None,
+        cache_bytes=64 * 1024 * 1024,
+        cache_dir=None,
+        quiet=False,
+    ):
+        """Initialize the RenderServer and warm up its workers
+
+        Args:
+            address: (host, port) to listen on
+            workers: Number of worker processes (defaults to the CPU count)
+            cache_bytes: Maximum total size of cached responses
+            cache_dir: Directory for cached responses, None keeps them in memory
+            quiet: Whether to suppress the per-request log lines
+        """
+        self.workers = workers or os.cpu_count() or 1
+        # Created before binding, as a failed bind calls server_close()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_batch_worker
+        )
+        self.cache = RenderCache(cache_dir, max_bytes=cache_bytes)
+        self.quiet = quiet
+        super().__init__(address, RenderRequestHandler)
+
+        # Start every worker now so the first requests find them warm
+        for future in [self.executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mahjong render service")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of render worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--cache-mb",
+        type=int,
+        default=64,
+        help="size of the response cache in MB (default: 64)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="keep cached responses in this directory instead of in memory",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="do not log individual requests"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        server = RenderServer(
+            (args.host, args.port),
+            workers=args.workers,
+            cache_bytes=args.cache_mb * 1024 * 1024,
+            cache_dir=args.cache_dir,
+            quiet=args.quiet,
+        )
+    except OSError as e:
+        print(f"Error: Cannot listen on {args.host}:{args.port}: {e}")
+        sys.exit(1)
+
+    print(f"Serving on http://{args.host}:{args.port}/render")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
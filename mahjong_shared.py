@@ -0,0 +1,291 @@
+"""Render worker pool handing images back through shared memory
+
+Worker processes normally return a render either encoded, which ties
+encoding to the worker, or as an image, which pickles about 5 MB of pixels
+per 1400x1200 board and copies them through a pipe. A SharedRenderPool
+instead preallocates canvases in multiprocessing.shared_memory, maps each of
+them as a Pillow image in every worker and in the parent, and has workers
+draw straight into a free canvas. Only the canvas number travels back; the
+parent then encodes, composites or streams the pixels in place.
+
+Canvases hold Pillow's own layout of RGB pixels, 4 bytes per pixel (R, G, B
+and a padding byte), so the buffers are mapped as images without conversion.
+
+Example:
+    with SharedRenderPool(workers=4) as pool:
+        for frame in pool.imap(states):
+            data = MahjongVisualizer.encode_image(frame.image, "png")
+"""
+
+import os
+import queue
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import PIL
+from PIL import Image
+
+from mahjong_model import MahjongVisualizerError
+from mahjong_visualizer import MahjongVisualizer
+
+# Bytes per pixel of Pillow's in-memory RGB images
+PIXEL_SIZE = 4
+
+# Pillow major versions map_canvas() has been checked against
+PILLOW_VERSIONS = range(9, 13)
+
+# Marks the end of the states passed to imap()
+_END = object()
+
+# Shared memory and canvases of a worker process, set by _init_shared_worker()
+_worker_segments = []
+_worker_canvases = []
+
+
+def map_canvas(buffer, width, height):
+    """Wrap a buffer of 4-byte RGB pixels as an RGB image without copying
+
+    Image.frombuffer() only maps modes such as RGBX or RGBA, and marks the
+    image read-only so that drawing on it copies the pixels out of the
+    buffer. The buffer is therefore mapped with Pillow's core directly, as
+    frombuffer() does for those modes, and drawing on the image writes into
+    the buffer. These are Pillow internals, not public API; see
+    check_canvas_mapping().
+    """
+    core = Image.core.map_buffer(buffer, (width, height), "raw", 0, ("RGB", 0, 1))
+    return Image.new("RGB", (0, 0))._new(core)
+
+
+def check_canvas_mapping():
+    """Check that map_canvas() works with the installed Pillow
+
+    Raises:
+        MahjongVisualizerError: If the Pillow version has not been checked
+            against, or if drawing on a mapped canvas does not write into
+            its buffer
+    """
+    version = PIL.__version__
+    if int(version.split(".")[0]) not in PILLOW_VERSIONS:
+        raise MahjongVisualizerError(
+            f"SharedRenderPool supports Pillow {PILLOW_VERSIONS.start}"
+            f"-{PILLOW_VERSIONS.stop - 1}, found {version}"
+        )
+    buffer = bytearray(PIXEL_SIZE)
+    try:
+        canvas = map_canvas(buffer, 1, 1)
+        canvas.putpixel((0, 0), (1, 2, 3))
+        mapped = canvas.mode == "RGB" and buffer[:3] == b"\x01\x02\x03"
+        del canvas
+    except (AttributeError, TypeError, ValueError):
+        mapped = False
+    if not mapped:
+        raise MahjongVisualizerError(
+            f"Pillow {version} cannot map shared memory as an RGB canvas"
+        )
+
+
+def _init_shared_worker(names, width, height):
+    """Attach the shared canvases and warm the caches of a worker process"""
+    for name in names:
+        segment = shared_memory.SharedMemory(name=name)
+        _worker_segments.append(segment)
+        _worker_canvases.append(map_canvas(segment.buf, width, height))
+    MahjongVisualizer.preload_resources()
+
+
+def _render_shared(slot, game_data):
+    """Render a game state into a shared canvas of the worker process"""
+    canvas = _worker_canvases[slot]
+    MahjongVisualizer(game_data, canvas.width, canvas.height, canvas).render()
+    return slot
+
+
+class SharedFrame:
+    """A render held in a shared canvas of a SharedRenderPool
+
+    The image maps the shared memory and stays valid until release(), after
+    which the canvas is reused by another render; copy the image to keep it.
+    """
+
+    def __init__(self, pool, slot):
+        self.pool = pool
+        self.slot = slot
+        self.image = pool.canvases[slot]
+
+    def raw(self):
+        """Return a memoryview of the pixels, 4 bytes per pixel (RGBX)
+
+        Suits streaming without conversion, e.g. to encoders that accept
+        padded RGB input such as ffmpeg's rgb0 pixel format. Release the
+        view before the pool is closed.
+        """
+        return self.pool.segments[self.slot].buf[: self.pool.frame_size]
+
+    def release(self):
+        """Hand the canvas back to the pool"""
+        if self.slot is not None:
+            self.pool.release_slot(self.slot)
+            self.slot = None
+            self.image = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class SharedRenderPool:
+    """Pool of worker processes rendering into shared memory canvases"""
+
+    def __init__(
+        self,
+        width=MahjongVisualizer.DEFAULT_WIDTH,
+        height=MahjongVisualizer.DEFAULT_HEIGHT,
+        workers=None,
+        canvases=None,
+    ):
+        """Initialize the SharedRenderPool and start its workers
+
+        Args:
+            width: Width of the rendered images in pixels
+            height: Height of the rendered images in pixels
+            workers: Number of worker processes (defaults to the CPU count)
+            canvases: Number of shared canvases, i.e. renders in flight plus
+                frames held by the caller (defaults to twice the workers, so
+                workers keep rendering while the parent handles results)
+
+        Raises:
+            MahjongVisualizerError: If the installed Pillow cannot map the
+                shared canvases, see check_canvas_mapping()
+        """
+        check_canvas_mapping()
+        workers = workers or os.cpu_count() or 1
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * PIXEL_SIZE
+        self.segments = [
+            shared_memory.SharedMemory(create=True, size=self.frame_size)
+            for _ in range(canvases or 2 * workers)
+        ]
+        self.canvases = []
+        for segment in self.segments:
+            canvas = map_canvas(segment.buf, width, height)
+            # Images held past close() keep their segment; an image releases
+            # its mapping before its attributes, so the segment then closes
+            # cleanly once the last such image is dropped
+            canvas.shared_segment = segment
+            self.canvases.append(canvas)
+        self.free = queue.Queue()
+        for slot in range(len(self.segments)):
+            self.free.put(slot)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_shared_worker,
+            initargs=([segment.name for segment in self.segments], width, height),
+        )
+
+    def release_slot(self, slot):
+        self.free.put(slot)
+
+    def submit(self, game_data):
+        """Render a game state in a worker
+
+        Blocks while every canvas is in use, until a frame is released.
+
+        Args:
+            game_data: Dictionary containing the mahjong game state, or a
+                mahjong_model.GameState
+
+        Returns:
+            Future of the SharedFrame; the future raises InvalidInputError
+            if the game data is invalid
+        """
+        slot = self.free.get()
+        result = Future()
+
+        def done(future):
+            error = future.exception()
+            if error is not None:
+                self.release_slot(slot)
+                result.set_exception(error)
+            else:
+                result.set_result(SharedFrame(self, slot))
+
+        try:
+            self.executor.submit(_render_shared, slot, game_data).add_done_callback(
+                done
+            )
+        except BaseException:
+            self.release_slot(slot)
+            raise
+        return result
+
+    def render(self, game_data):
+        """Render a game state in a worker and wait for its SharedFrame"""
+        return self.submit(game_data).result()
+
+    def imap(self, states):
+        """Render game states in the workers, yielding frames in order
+
+        Every frame is released when the next one is requested, so handle or
+        copy it before advancing. Errors of invalid states are raised when
+        their frame is reached.
+
+        Args:
+            states: Iterable of game states
+
+        Yields:
+            SharedFrame of each state
+        """
+        # One canvas stays free for the frame held by the caller
+        in_flight = max(1, len(self.segments) - 1)
+        pending = deque()
+        frame = None
+        states = iter(states)
+        try:
+            while True:
+                while len(pending) < in_flight:
+                    state = next(states, _END)
+                    if state is _END:
+                        break
+                    pending.append(self.submit(state))
+                if not pending:
+                    return
+                frame = pending.popleft().result()
+                yield frame
+                frame.release()
+                frame = None
+        finally:
+            if frame is not None:
+                frame.release()
+            for future in pending:
+                # Hand back the canvases of renders nobody will look at
+                if future.exception() is None:
+                    future.result().release()
+
+    def close(self):
+        """Stop the workers and free the shared memory
+
+        Images of frames still referenced by the caller stay valid and keep
+        their memory mapped until they are dropped. Views returned by
+        SharedFrame.raw() must be released before closing the pool.
+        """
+        self.executor.shutdown()
+        self.canvases = []
+        for segment in self.segments:
+            segment.unlink()
+            try:
+                segment.close()
+            except BufferError:
+                # A held image still maps the segment and keeps it referenced,
+                # it is closed when that image is dropped
+                pass
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
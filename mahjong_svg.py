@@ -0,0 +1,285 @@
+"""SVG output for mahjong game states
+
+SvgVisualizer runs the same drawing steps as MahjongVisualizer (player
+zones, center wind, game information) but records every shape and text as
+SVG elements instead of rasterizing them. Tiles become <use> references to
+symbols of a tile sprite sheet, so a board is a few kilobytes of markup and
+no pixels are drawn or encoded.
+
+The sprite sheet is a separate SVG document holding one symbol per tile
+image, named after the tile size and tile images (e.g.
+tiles-35x46-0123456789abcdef.svg), so clients can cache it for good. It can
+also be inlined into each document for standalone files.
+
+Usage:
+    python mahjong_visualizer.py game.json board.svg [--inline-sprites]
+"""
+
+import base64
+import io
+import os
+from xml.sax.saxutils import escape, quoteattr
+
+from mahjong_model import TILE_CODES
+from mahjong_visualizer import MahjongVisualizer, TileAtlas
+
+# Prefix of the element id of each tile symbol in the sprite sheet
+SPRITE_ID_PREFIX = "tile-"
+
+
+def svg_color(color):
+    """Format an RGB tuple as an SVG color"""
+    return "#{:02x}{:02x}{:02x}".format(*color[:3])
+
+
+def svg_number(value):
+    """Format a coordinate without a trailing .0"""
+    return f"{value:g}"
+
+
+class SvgDraw:
+    """Stand-in for ImageDraw.Draw that records shapes as SVG elements
+
+    Coordinates follow Pillow: boxes include their right and bottom edges and
+    outlines are drawn inside the box, so shapes cover the same pixels as
+    when rasterized by Pillow.
+    """
+
+    def __init__(self):
+        self.elements = []
+
+    def rectangle(self, xy, fill=None, outline=None, width=1):
+        x0, y0, x1, y1 = xy
+        self.elements.append(
+            self.box_element("rect", x0, y0, x1, y1, fill, outline, width)
+        )
+
+    def ellipse(self, xy, fill=None, outline=None, width=1):
+        x0, y0, x1, y1 = xy
+        self.elements.append(
+            self.box_element("ellipse", x0, y0, x1, y1, fill, outline, width)
+        )
+
+    def line(self, xy, fill=None, width=0):
+        x0, y0, x1, y1 = xy
+        self.elements.append(
+            f'<line x1="{x0}" y1="{y0}" x2="{x1}" y2="{y1}" '
+            f'stroke="{svg_color(fill)}" stroke-width="{max(width, 1)}"/>'
+        )
+
+    def text(self, xy, text, fill, font):
+        """Record text positioned like ImageDraw.text() at its top left corner"""
+        x, y = xy
+        try:
+            family, style = font.getname()
+            ascent = font.getmetrics()[0]
+            size = font.size
+        except AttributeError:
+            # Pillow's built-in bitmap font
+            family, style, ascent, size = "monospace", "", 9, 11
+        weight = ' font-weight="bold"' if "Bold" in style else ""
+        self.elements.append(
+            f'<text x="{x}" y="{y + ascent}" font-family={quoteattr(family + ", sans-serif")} '
+            f'font-size="{size}"{weight} fill="{svg_color(fill)}">'
+            f"{escape(text)}</text>"
+        )
+
+    def use(self, href, x, y, width, height):
+        self.elements.append(
+            f'<use href={quoteattr(href)} x="{x}" y="{y}" '
+            f'width="{width}" height="{height}"/>'
+        )
+
+    @staticmethod
+    def box_element(tag, x0, y0, x1, y1, fill, outline, width):
+        """Return a rect or ellipse element covering a Pillow-style box"""
+        # Pillow boxes include x1 and y1, and the outline lies inside the box
+        # while SVG centers strokes on the shape edge
+        inset = width / 2 if outline is not None else 0
+        left, top = x0 + inset, y0 + inset
+        box_width = x1 - x0 + 1 - 2 * inset
+        box_height = y1 - y0 + 1 - 2 * inset
+        paint = f'fill="{svg_color(fill)}"' if fill is not None else 'fill="none"'
+        if outline is not None:
+            paint += f' stroke="{svg_color(outline)}" stroke-width="{width}"'
+        if tag == "rect":
+            geometry = (
+                f'x="{svg_number(left)}" y="{svg_number(top)}" '
+                f'width="{svg_number(box_width)}" height="{svg_number(box_height)}"'
+            )
+        else:
+            geometry = (
+                f'cx="{svg_number(left + box_width / 2)}" '
+                f'cy="{svg_number(top + box_height / 2)}" '
+                f'rx="{svg_number(box_width / 2)}" ry="{svg_number(box_height / 2)}"'
+            )
+        return f"<{tag} {geometry} {paint}/>"
+
+
+class SvgVisualizer(MahjongVisualizer):
+    """Renders game states as SVG documents instead of images"""
+
+    # Tiles are emitted one by one as <use> references
+    COMPOSITING = "pillow"
+
+    # Tile code -> <symbol> element of the loaded tile atlas, see
+    # get_sprite_symbols()
+    sprite_symbols = None
+
+    def __init__(
+        self,
+        game_data,
+        width=MahjongVisualizer.DEFAULT_WIDTH,
+        height=MahjongVisualizer.DEFAULT_HEIGHT,
+        sprite_href=None,
+    ):
+        """Initialize the SvgVisualizer
+
+        Args:
+            game_data: Dictionary containing the mahjong game state, or a
+                mahjong_model.GameState
+            width: Width of the board in pixels
+            height: Height of the board in pixels
+            sprite_href: URL of the sprite sheet the tiles refer to, relative
+                to the document; None inlines the symbols of the tiles in use
+        """
+        self.sprite_href = sprite_href
+        super().__init__(game_data, width, height)
+
+    def create_canvas(self, image=None):
+        """Return an SvgDraw in place of an image and its ImageDraw"""
+        return None, SvgDraw()
+
+    def draw_text(self, xy, text, fill, font):
+        self.draw.text(xy, text, fill, font)
+
+    def draw_tile(self, x, y, tile):
+        """Draw a tile as a reference to its sprite, or as a placeholder"""
+        if isinstance(tile, int):
+            # Sprites are referenced by tile code
+            tile = TILE_CODES[tile]
+        if tile not in self.tile_images:
+            super().draw_tile(x, y, tile)
+            return
+        href = f"{self.sprite_href or ''}#{SPRITE_ID_PREFIX}{tile}"
+        self.draw.use(href, x, y, self.TILE_WIDTH, self.TILE_HEIGHT)
+        self.used_tiles.add(tile)
+
+    @classmethod
+    def get_sprite_symbols(cls):
+        """Return a dictionary of tile code to its SVG <symbol> element
+
+        Each symbol embeds the tile image as a PNG. Tiles are drawn without
+        their alpha channel, as MahjongVisualizer pastes them. The symbols
+        are built once per loaded tile atlas.
+        """
+        cls.load_tile_images()
+        atlas = cls.tile_atlas
+        if cls.sprite_symbols is not None and cls.sprite_symbols[0] is atlas:
+            return cls.sprite_symbols[1]
+
+        symbols = {}
+        for code, image in cls.tile_images.items():
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, "PNG", optimize=True)
+            data = base64.b64encode(buffer.getvalue()).decode("ascii")
+            symbols[code] = (
+                f'<symbol id="{SPRITE_ID_PREFIX}{code}" '
+                f'viewBox="0 0 {image.width} {image.height}">'
+                f'<image width="{image.width}" height="{image.height}" '
+                f'href="data:image/png;base64,{data}"/></symbol>'
+            )
+        cls.sprite_symbols = (atlas, symbols)
+        return symbols
+
+    @classmethod
+    def sprite_sheet_name(cls):
+        """Return the file name of the sprite sheet of the current tiles
+
+        The name changes with the tile size and the tile images, so a sheet
+        can be cached by clients indefinitely.
+        """
+        key = TileAtlas.cache_key(
+            cls.IMG_DIR, cls.TILE_FILES, cls.TILE_WIDTH, cls.TILE_HEIGHT
+        )
+        return os.path.splitext(key)[0].replace("atlas-", "tiles-", 1) + ".svg"
+
+    @classmethod
+    def sprite_sheet(cls):
+        """Return the sprite sheet document holding every tile symbol"""
+        symbols = "\n".join(cls.get_sprite_symbols().values())
+        return (
+            '<svg xmlns="http://www.w3.org/2000/svg">\n'
+            f"<defs>\n{symbols}\n</defs>\n</svg>\n"
+        )
+
+    def render(self):
+        """Render the game state as an SVG document
+
+        Returns:
+            The SVG document as a string
+        """
+        self.draw = SvgDraw()
+        self.used_tiles = set()
+        self.draw.rectangle(
+            [0, 0, self.width - 1, self.height - 1], fill=self.COLORS["background"]
+        )
+        self.draw_board_frames()
+        self.draw_all_player_zones(draw_frame=False)
+        self.draw_center_wind(draw_frame=False)
+        self.draw_game_info(draw_frame=False)
+
+        defs = ""
+        if self.sprite_href is None and self.used_tiles:
+            symbols = self.get_sprite_symbols()
+            defs = (
+                "<defs>\n"
+                + "\n".join(symbols[tile] for tile in sorted(self.used_tiles))
+                + "\n</defs>\n"
+            )
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" '
+            f'height="{self.height}" viewBox="0 0 {self.width} {self.height}">\n'
+            + defs
+            + "\n".join(self.draw.elements)
+            + "\n</svg>\n"
+        )
+
+    def render_bytes(self, format="svg", **options):
+        """Render the game state as a UTF-8 encoded SVG document"""
+        return self.render().encode("utf-8")
+
+    def generate(self, output_path, **options):
+        """Write the SVG document to output_path"""
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+
+
+def write_svg(game_data, output_path, width=None, height=None, inline=False):
+    """Render a game state to an SVG file
+
+    Unless inline is set, the tiles refer to the sprite sheet named by
+    SvgVisualizer.sprite_sheet_name() in the directory of output_path, which
+    is written there if it does not exist yet.
+
+    Returns:
+        Path of the sprite sheet, or None if the sprites are inlined
+    """
+    sprite_path = None
+    sprite_href = None
+    if not inline:
+        sprite_href = SvgVisualizer.sprite_sheet_name()
+        sprite_path = os.path.join(os.path.dirname(output_path), sprite_href)
+        if not os.path.exists(sprite_path):
+            tmp_path = f"{sprite_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(SvgVisualizer.sprite_sheet())
+            os.replace(tmp_path, sprite_path)
+
+    SvgVisualizer(
+        game_data,
+        width or MahjongVisualizer.DEFAULT_WIDTH,
+        height or MahjongVisualizer.DEFAULT_HEIGHT,
+        sprite_href,
+    ).generate(output_path)
+    return sprite_path
@@ -0,0 +1,435 @@
+"""Standalone validation of mahjong game state corpora
+
+Checks game states without rendering them, and without importing Pillow:
+the structure checked by the renderer, the legality of every tile code and
+the tile counts against the wall in use (no more than four copies of a tile,
+one of each red five, no more tiles than the wall holds, and only sanma tiles
+in three player games).
+
+JSONL files are streamed in batches of lines that are checked in parallel
+worker processes, so corpora of millions of records run in constant memory.
+
+Usage:
+    python mahjong_validator.py corpus.jsonl states/ 'more/*.json'
+                                [--workers N] [--wall auto|standard|sanma]
+                                [--max-errors 50] [--report-json report.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from mahjong_model import (
+    RED_FIVES,
+    TILE_CODES,
+    TILE_IDS,
+    TILE_KIND,
+    TILE_KINDS,
+    InvalidInputError,
+    validate_game_data,
+)
+
+# One problem found in a record; code is a short identifier of its kind
+ValidationIssue = namedtuple("ValidationIssue", ["code", "message"])
+
+# Problems of one invalid record; line is the line in a JSONL file, or the
+# position in a JSON list, starting at 1
+RecordError = namedtuple("RecordError", ["source", "line", "issues"])
+
+# Copies of each tile kind in a wall
+COPIES_PER_TILE = 4
+
+# Tile kinds removed from the wall in three player games (the 2 to 8 of
+# characters), and the red five among them
+SANMA_EXCLUDED = frozenset(TILE_IDS[f"M{n}"] for n in range(2, 9)) | {TILE_IDS["M0"]}
+
+# Number of tiles in each wall
+WALL_SIZES = {
+    "standard": TILE_KINDS * COPIES_PER_TILE,
+    "sanma": (TILE_KINDS - 7) * COPIES_PER_TILE,
+}
+
+# Number of records handed to a worker at a time
+BATCH_SIZE = 2000
+
+
+def check_state(data, wall="auto"):
+    """Check one game state
+
+    Args:
+        data: Decoded JSON game state
+        wall: "standard" (136 tiles), "sanma" (108 tiles, no 2-8 of
+            characters) or "auto" for sanma with three players
+
+    Returns:
+        List of ValidationIssue, empty if the state is valid
+    """
+    try:
+        validate_game_data(data)
+    except InvalidInputError as e:
+        return [ValidationIssue("structure", str(e))]
+
+    players = data["players"]
+    if wall == "auto":
+        wall = "sanma" if len(players) == 3 else "standard"
+
+    issues = []
+    tiles = []
+    for player in players.values():
+        tiles += player["hand"]
+        tiles += player.get("discards") or ()
+
+    # Count with Counter, in C, and only look at individual tiles again to
+    # describe unknown ones
+    try:
+        tile_counts = Counter(tiles)
+    except TypeError:
+        tile_counts = None
+    counts = [0] * len(TILE_CODES)
+    unknown = tile_counts is None
+    if not unknown:
+        for code, count in tile_counts.items():
+            tile_id = TILE_IDS.get(code)
+            if tile_id is None:
+                unknown = True
+            else:
+                counts[tile_id] = count
+    if unknown:
+        for player_id, player in players.items():
+            for field in ("hand", "discards"):
+                for code in player.get(field) or ():
+                    if not isinstance(code, str) or code not in TILE_IDS:
+                        issues.append(
+                            ValidationIssue(
+                                "unknown_tile",
+                                f"Player {player_id} {field} has unknown tile: "
+                                f"{code!r}",
+                            )
+                        )
+    total = sum(counts)
+
+    # Red fives also count as copies of their five
+    kind_counts = [0] * TILE_KINDS
+    for tile_id, count in enumerate(counts):
+        if count:
+            kind_counts[TILE_KIND[tile_id]] += count
+
+    for tile_id, count in enumerate(kind_counts):
+        if count > COPIES_PER_TILE:
+            issues.append(
+                ValidationIssue(
+                    "too_many_copies",
+                    f"{count} copies of {TILE_CODES[tile_id]} "
+                    f"(at most {COPIES_PER_TILE})",
+                )
+            )
+    for tile_id in RED_FIVES:
+        if counts[tile_id] > 1:
+            issues.append(
+                ValidationIssue(
+                    "too_many_copies",
+                    f"{counts[tile_id]} copies of red five {TILE_CODES[tile_id]} "
+                    "(at most 1)",
+                )
+            )
+
+    if wall == "sanma":
+        illegal = [TILE_CODES[i] for i in sorted(SANMA_EXCLUDED) if counts[i]]
+        if illegal:
+            issues.append(
+                ValidationIssue(
+                    "not_in_wall",
+                    f"Tiles not in the sanma wall: {', '.join(illegal)}",
+                )
+            )
+
+    if total > WALL_SIZES[wall]:
+        issues.append(
+            ValidationIssue(
+                "wall_exceeded",
+                f"{total} tiles in play, the {wall} wall has {WALL_SIZES[wall]}",
+            )
+        )
+    return issues
+
+
+def check_record(text, wall="auto"):
+    """Decode and check one JSON record, returning a list of ValidationIssue"""
+    try:
+        data = json.loads(text)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return [ValidationIssue("invalid_json", f"Invalid JSON: {e}")]
+    return check_state(data, wall)
+
+
+def _check_batch(source, lines, wall):
+    """Check a batch of (line number, record) pairs in a worker
+
+    Returns:
+        (number of records, list of RecordError for the invalid ones)
+    """
+    errors = []
+    for line, text in lines:
+        issues = check_record(text, wall)
+        if issues:
+            errors.append(RecordError(source, line, issues))
+    return len(lines), errors
+
+
+def _check_json_file(source, wall):
+    """Check a .json file holding one state or a list of states"""
+    try:
+        with open(source, "rb") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return 1, [
+            RecordError(
+                source, 1, [ValidationIssue("invalid_json", f"Invalid JSON: {e}")]
+            )
+        ]
+
+    states = data if isinstance(data, list) else [data]
+    errors = []
+    for position, state in enumerate(states, start=1):
+        issues = check_state(state, wall)
+        if issues:
+            errors.append(RecordError(source, position, issues))
+    return len(states), errors
+
+
+def collect_corpus(sources):
+    """Expand corpus specifications into a list of .json and .jsonl files
+
+    Sources may be files, directories (every .json and .jsonl inside), glob
+    patterns, or @listfile entries naming one path per line.
+    """
+    paths = []
+    for source in sources:
+        if source.startswith("@"):
+            with open(source[1:]) as f:
+                paths.extend(line.strip() for line in f if line.strip())
+        elif os.path.isdir(source):
+            paths.extend(
+                sorted(
+                    glob.glob(os.path.join(source, "*.json"))
+                    + glob.glob(os.path.join(source, "*.jsonl"))
+                )
+            )
+        elif glob.has_magic(source):
+            paths.extend(sorted(glob.glob(source)))
+        else:
+            paths.append(source)
+    return paths
+
+
+def iter_tasks(paths, wall, batch_size=BATCH_SIZE):
+    """Split a corpus into (function, arguments) tasks for the workers
+
+    JSONL files are read lazily, batch_size lines at a time; blank lines are
+    skipped but still counted for line numbers.
+    """
+    for path in paths:
+        if not path.endswith(".jsonl"):
+            yield _check_json_file, (path, wall)
+            continue
+        with open(path, "rb") as f:
+            batch = []
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    batch.append((line_number, line))
+                if len(batch) >= batch_size:
+                    yield _check_batch, (path, batch, wall)
+                    batch = []
+            if batch:
+                yield _check_batch, (path, batch, wall)
+
+
+class CorpusReport:
+    """Outcome of validating a corpus"""
+
+    def __init__(self, max_errors=1000):
+        """Initialize an empty CorpusReport
+
+        Args:
+            max_errors: Number of invalid records kept in errors; all of them
+                are still counted
+        """
+        self.max_errors = max_errors
+        self.files = 0
+        self.records = 0
+        self.invalid = 0
+        self.issue_counts = Counter()
+        self.errors = []
+
+    def add(self, records, errors):
+        """Add the results of one task"""
+        self.records += records
+        self.invalid += len(errors)
+        for error in errors:
+            self.issue_counts.update(issue.code for issue in error.issues)
+        room = self.max_errors - len(self.errors)
+        if room > 0:
+            self.errors.extend(errors[:room])
+
+    def to_dict(self):
+        """Return the report as a JSON-serializable dictionary"""
+        return {
+            "files": self.files,
+            "records": self.records,
+            "invalid": self.invalid,
+            "issue_counts": dict(self.issue_counts.most_common()),
+            "errors": [
+                {
+                    "source": error.source,
+                    "line": error.line,
+                    "issues": [issue._asdict() for issue in error.issues],
+                }
+                for error in self.errors
+            ],
+        }
+
+
+def validate_corpus(
+    sources, workers=None, wall="auto", max_errors=1000, batch_size=BATCH_SIZE
+):
+    """Validate every record of a corpus
+
+    Args:
+        sources: Corpus specifications, see collect_corpus()
+        workers: Number of worker processes (defaults to the CPU count),
+            1 validates in this process
+        wall: Wall to check tile counts against, see check_state()
+        max_errors: Number of invalid records kept in the report
+        batch_size: Number of JSONL records handed to a worker at a time
+
+    Returns:
+        CorpusReport
+
+    Raises:
+        FileNotFoundError: If an input file does not exist
+    """
+    paths = collect_corpus(sources)
+    report = CorpusReport(max_errors)
+    report.files = len(paths)
+    tasks = iter_tasks(paths, wall, batch_size)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for function, arguments in tasks:
+            report.add(*function(*arguments))
+        return report
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Bound the batches in flight so the corpus is never read ahead
+        # further than the workers can keep up with
+        limit = workers * 4
+        pending = deque()
+        for function, arguments in tasks:
+            pending.append(executor.submit(function, *arguments))
+            if len(pending) >= limit:
+                report.add(*pending.popleft().result())
+        while pending:
+            report.add(*pending.popleft().result())
+    return report
+
+
+def print_report(report):
+    """Print a compact human-readable report"""
+    for error in report.errors:
+        for issue in error.issues:
+            print(f"{error.source}:{error.line}: {issue.code}: {issue.message}")
+    if report.invalid > len(report.errors):
+        print(f"... {report.invalid - len(report.errors)} more invalid records")
+
+    print(
+        f"Checked {report.records} records in {report.files} files: "
+        f"{report.invalid} invalid"
+    )
+    for code, count in report.issue_counts.most_common():
+        print(f"  {code}: {count}")
+
+
+def add_arguments(parser):
+    """Add the validation options to an argument parser"""
+    parser.add_argument(
+        "--wall",
+        choices=("auto", "standard", "sanma"),
+        default="auto",
+        help="wall for tile counts; auto uses sanma for 3 players (default: auto)",
+    )
+    parser.add_argument(
+        "--max-errors",
+        type=int,
+        default=50,
+        help="number of invalid records listed in the report (default: 50)",
+    )
+    parser.add_argument(
+        "--report-json",
+        default=None,
+        help="also write the full report as JSON to this file",
+    )
+
+
+def run_validation(args):
+    """Validate args.inputs and return the process exit code
+
+    Exit code 0 means every record is valid, 1 that some are invalid or an
+    input could not be read.
+    """
+    try:
+        report = validate_corpus(
+            args.inputs,
+            workers=args.workers,
+            wall=args.wall,
+            max_errors=args.max_errors,
+        )
+    except OSError as e:
+        print(f"Error: Cannot read input: {e}")
+        return 1
+
+    print_report(report)
+    if args.report_json:
+        with open(args.report_json, "w") as f:
+            json.dump(report.to_dict(), f, indent=2)
+            f.write("\n")
+    return 1 if report.invalid else 0
+
+
+def positive_int(text):
+    """Parse a command line count that must be at least 1, such as --workers"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {text!r}")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Validate mahjong game state files without rendering them"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        metavar="input",
+        help="JSON or JSONL file, directory, glob or @listfile",
+    )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=None,
+        help="number of worker processes (default: CPU count)",
+    )
+    add_arguments(parser)
+    sys.exit(run_validation(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
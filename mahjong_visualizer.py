@@ -1,6 +1,18 @@
 # Import necessary libraries
+import argparse  # For command line option parsing
+import copy  # For keeping private copies of game states
+import glob  # For expanding batch input patterns
+import hashlib  # For keying the on-disk tile atlas
+import io  # For encoding images in memory
 import json  # For parsing input game data in JSON format
+import mmap  # For memory-mapping the tile atlas
+import struct  # For the tile atlas file header
 import sys  # For command line argument handling and error codes
+import threading  # For sharing the process-wide caches between threads
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor  # For batch rendering
+from functools import lru_cache  # For memoizing layout plans
 from PIL import (
     Image,
     ImageDraw,
@@ -10,24 +22,410 @@ from pathlib import Path  # For path handling
 import os
 import os.path  # For file operations and path management
 
+try:
+    import numpy as np  # Optional, for vectorized tile grid compositing
+except ImportError:
+    np = None
 
-class MahjongVisualizerError(Exception):
-    """Base exception for MahjongVisualizer
+# Exceptions and the state model live in a Pillow-free module shared with the
+# standalone tools, and are re-exported here
+from mahjong_model import (
+    GameState,
+    InvalidInputError,
+    MahjongVisualizerError,
+    TILE_CODES,
+    validate_game_data,
+)
+import mahjong_validator  # For the --validate-only mode
 
-    Serves as the parent class for all custom exceptions in the visualizer.
-    Allows for catching all visualizer-specific errors with a single except block.
+
+class TileAtlas:
+    """Pre-resized tile images stored together as a single RGBA sprite sheet
+
+    The sheet is one row of tiles, each TILE_WIDTH x TILE_HEIGHT pixels, in the
+    order given by codes. On disk it is a raw RGBA blob behind a small header,
+    so loading it is a memory-map instead of a PNG decode and resize per tile.
+
+    File layout: 4-byte magic, 4-byte big-endian header length, JSON header
+    (tile codes and tile size), then the raw RGBA pixels of the sheet.
     """
 
-    pass
+    MAGIC = b"MJA1"
+
+    def __init__(self, sheet, codes, tile_width, tile_height, buffer=None):
+        """Initialize the TileAtlas
+
+        Args:
+            sheet: RGBA image holding all tiles side by side
+            codes: List of tile codes, in sheet order
+            tile_width: Width of each tile in pixels
+            tile_height: Height of each tile in pixels
+            buffer: Memory map backing the sheet, kept open while in use
+        """
+        self.sheet = sheet
+        self.codes = codes
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.buffer = buffer
+
+    @classmethod
+    def from_tiles(cls, tiles, tile_width, tile_height):
+        """Build an atlas from a dictionary of already resized tile images"""
+        codes = list(tiles)
+        sheet = Image.new("RGBA", (tile_width * len(codes), tile_height))
+        for index, code in enumerate(codes):
+            sheet.paste(tiles[code].convert("RGBA"), (index * tile_width, 0))
+        return cls(sheet, codes, tile_width, tile_height)
+
+    @staticmethod
+    def cache_key(img_dir, tile_files, tile_width, tile_height):
+        """Compute the key identifying an atlas for a tile size and source files
+
+        The key changes whenever a source image is added, removed or modified,
+        so a stale atlas is never reused.
+        """
+        digest = hashlib.sha1(f"{tile_width}x{tile_height}".encode())
+        for code, filename in tile_files.items():
+            try:
+                stat = os.stat(os.path.join(img_dir, filename))
+                digest.update(
+                    f"{code}:{filename}:{stat.st_mtime_ns}:{stat.st_size};".encode()
+                )
+            except OSError:
+                digest.update(f"{code}:{filename}:missing;".encode())
+        return f"atlas-{tile_width}x{tile_height}-{digest.hexdigest()[:16]}.rgba"
+
+    def tiles(self):
+        """Return a dictionary mapping each tile code to its image"""
+        return {
+            code: self.sheet.crop(
+                (
+                    index * self.tile_width,
+                    0,
+                    (index + 1) * self.tile_width,
+                    self.tile_height,
+                )
+            )
+            for index, code in enumerate(self.codes)
+        }
+
+    def save(self, path):
+        """Write the atlas to disk atomically"""
+        header = json.dumps(
+            {
+                "codes": self.codes,
+                "tile_width": self.tile_width,
+                "tile_height": self.tile_height,
+            }
+        ).encode()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(struct.pack(">I", len(header)))
+            f.write(header)
+            f.write(self.sheet.tobytes())
+        # Rename into place so concurrent readers never see a partial file
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map an atlas previously written by save()
+
+        Returns:
+            TileAtlas, or None if the file is missing or not a valid atlas
+        """
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if buffer[:4] != cls.MAGIC:
+            buffer.close()
+            return None
+
+        try:
+            (header_length,) = struct.unpack(">I", buffer[4:8])
+            header = json.loads(buffer[8 : 8 + header_length])
+            tile_width = header["tile_width"]
+            tile_height = header["tile_height"]
+            size = (tile_width * len(header["codes"]), tile_height)
+        except (struct.error, ValueError, KeyError, TypeError):
+            # Truncated or corrupt header
+            buffer.close()
+            return None
+        offset = 8 + header_length
+        if not header["codes"] or len(buffer) - offset != size[0] * size[1] * 4:
+            buffer.close()
+            return None
+
+        # Wrap the mapped pixels directly, without copying them
+        sheet = Image.frombuffer(
+            "RGBA", size, memoryview(buffer)[offset:], "raw", "RGBA", 0, 1
+        )
+        return cls(sheet, header["codes"], tile_width, tile_height, buffer)
 
 
-class InvalidInputError(MahjongVisualizerError):
-    """Raised when input JSON is invalid
+class FontRegistry:
+    """Process-wide cache of fonts, text measurements and rasterized text
 
-    Used when the input game data has formatting or structure issues.
+    Fonts are keyed by (path, size) and loaded lazily the first time they are
+    requested. Text bounding boxes and pre-rasterized text masks are memoized
+    per (font, text), so constant strings such as section labels are measured
+    and rasterized once per process. Hit and miss counters for each cache are
+    kept in stats.
+
+    Lookups of cached entries take no lock. Cache misses, which load fonts,
+    call FreeType and evict entries, are serialized by a lock so the registry
+    can be shared by renders running in threads.
     """
 
-    pass
+    # Maximum number of measurements or rasterized texts kept per cache
+    MAX_ENTRIES = 4096
+
+    def __init__(self):
+        """Initialize an empty FontRegistry"""
+        self.fonts = {}
+        self.measurements = {}
+        self.labels = {}
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(
+            [
+                "font_hits",
+                "font_misses",
+                "measure_hits",
+                "measure_misses",
+                "label_hits",
+                "label_misses",
+            ],
+            0,
+        )
+
+    def get_font(self, path, size):
+        """Return the font at path and size, loading it on first use
+
+        Falls back to Pillow's default font if the font file cannot be loaded.
+        """
+        key = (path, size)
+        font = self.fonts.get(key)
+        if font is not None:
+            self.stats["font_hits"] += 1
+            return font
+
+        with self.lock:
+            font = self.fonts.get(key)
+            if font is None:
+                self.stats["font_misses"] += 1
+                try:
+                    font = ImageFont.truetype(path, size)
+                except OSError:
+                    font = ImageFont.load_default()
+                self.fonts[key] = font
+        return font
+
+    def text_bbox(self, text, font):
+        """Return the bounding box of text drawn at (0, 0), like textbbox()"""
+        key = (font, text)
+        bbox = self.measurements.get(key)
+        if bbox is not None:
+            self.stats["measure_hits"] += 1
+            return bbox
+
+        with self.lock:
+            self.stats["measure_misses"] += 1
+            bbox = font.getbbox(text)
+            self._store(self.measurements, key, bbox)
+        return bbox
+
+    def text_label(self, text, font):
+        """Return the rasterized mask of text and its offset from the origin
+
+        Returns:
+            Tuple of (L mode mask image, (x, y) offset), or None if the font
+            cannot be rasterized ahead of time
+        """
+        key = (font, text)
+        label = self.labels.get(key)
+        if label is not None:
+            self.stats["label_hits"] += 1
+            return label
+
+        self.stats["label_misses"] += 1
+        if not isinstance(font, ImageFont.FreeTypeFont):
+            return None
+
+        with self.lock:
+            # Render the text the same way ImageDraw.text() does, into a mask
+            mask, offset = font.getmask2(text, "L")
+            mask_image = Image.new("L", mask.size)
+            ImageDraw.Draw(mask_image).text(
+                (-offset[0], -offset[1]), text, fill=255, font=font
+            )
+            label = (mask_image, offset)
+            self._store(self.labels, key, label)
+        return label
+
+    def draw_text(self, draw, xy, text, fill, font):
+        """Draw text through the rasterized text cache
+
+        Produces the same pixels as draw.text(xy, text, fill=fill, font=font)
+        for integer coordinates.
+        """
+        label = self.text_label(text, font)
+        if label is None:
+            with self.lock:
+                draw.text(xy, text, fill=fill, font=font)
+            return
+
+        mask, offset = label
+        draw.bitmap((xy[0] + offset[0], xy[1] + offset[1]), mask, fill=fill)
+
+    def _store(self, cache, key, value):
+        """Add an entry to a cache, evicting the oldest entry when full
+
+        Called with the lock held.
+        """
+        if len(cache) >= self.MAX_ENTRIES:
+            del cache[next(iter(cache))]
+        cache[key] = value
+
+    def reset_stats(self):
+        """Reset all hit and miss counters to zero"""
+        for key in self.stats:
+            self.stats[key] = 0
+
+
+# Registry shared by every visualizer in the process
+font_registry = FontRegistry()
+
+
+# Position of one tile in a zone layout; section is "hand" or "discards" and
+# index is the position of the tile within that section
+TileSlot = namedtuple("TileSlot", ["section", "index", "x", "y"])
+
+# Text in a zone layout; kind is "section" for a section label or "note" for
+# plain text such as the truncated discards indicator
+LabelSlot = namedtuple("LabelSlot", ["kind", "x", "y", "text"])
+
+# Layout plan of a player zone, see plan_zone_layout()
+ZoneLayout = namedtuple(
+    "ZoneLayout", ["tiles", "labels", "hand_shown", "discards_shown"]
+)
+
+
+@lru_cache(maxsize=1024)
+def plan_zone_layout(
+    zone_width,
+    zone_height,
+    hand_count,
+    discard_count,
+    tile_width,
+    tile_height,
+    tile_spacing,
+    hand_label_height,
+    discards_label_height,
+):
+    """Plan where the hand and discard tiles of a player zone are drawn
+
+    Pure geometry: the plan only depends on the zone size and the number of
+    tiles, never on the tiles themselves, so results are memoized. Sections
+    that do not fit are truncated and a note reports how many discards are
+    shown.
+
+    Args:
+        zone_width: Width of the player zone in pixels
+        zone_height: Height of the player zone in pixels
+        hand_count: Number of tiles in the hand
+        discard_count: Number of discarded tiles
+        tile_width: Width of a tile in pixels
+        tile_height: Height of a tile in pixels
+        tile_spacing: Spacing between tiles in pixels
+        hand_label_height: Height of the "Hand" section label
+        discards_label_height: Height of the "Discards" section label
+
+    Returns:
+        ZoneLayout with coordinates relative to the zone's top left corner
+    """
+    step_x = tile_width + tile_spacing
+    step_y = tile_height + tile_spacing
+    left = 15  # Left margin of the tile sections
+
+    # Tiles per row, at most 10 so up to 20 hand tiles fit in two rows
+    tiles_per_row = max(1, min(10, int((zone_width - 20) // step_x)))
+
+    # Start hand zone below the player information box (3 lines + padding)
+    info_box_height = 3 * 25 + 8
+    hand_y = info_box_height + 30
+
+    # Calculate maximum available height for the rest of the content
+    max_remaining_height = zone_height - hand_y - 20  # 20px bottom margin
+
+    if discard_count:
+        # Hand gets at most half of the remaining height
+        max_hand_rows = max(1, (max_remaining_height // 2 - 30) // step_y)
+    else:
+        # Only hand tiles to draw - can use more space
+        max_hand_rows = max(1, (max_remaining_height - 20) // step_y)
+
+    hand_rows = min((hand_count + tiles_per_row - 1) // tiles_per_row, max_hand_rows)
+    hand_shown = min(hand_count, hand_rows * tiles_per_row)
+
+    labels = []
+    discards_shown = 0
+    discards_y = 0
+    if discard_count:
+        hand_height = hand_rows * step_y + 20
+        discard_rows = (discard_count + tiles_per_row - 1) // tiles_per_row
+
+        def rows_fitting(section_y):
+            # Rows of tiles (without trailing spacing) fitting above the
+            # 10px bottom margin, below the "Discards" label and its 5px gap
+            available = zone_height - 10 - (section_y + discards_label_height + 5)
+            return max(1, (available + tile_spacing) // step_y)
+
+        # Ensure minimum spacing between hand and discards (at least 50px)
+        discards_y = hand_y + hand_height + 50
+
+        # Strict boundary check for discards zone
+        if rows_fitting(discards_y) < discard_rows:
+            # Emergency adjustment - reduce spacing if still too tight
+            discards_y = hand_y + hand_height + 30
+
+            max_allowed_rows = rows_fitting(discards_y)
+            if max_allowed_rows < discard_rows:
+                discard_rows = max_allowed_rows
+                labels.append(
+                    LabelSlot(
+                        "note",
+                        left,
+                        discards_y - 15,
+                        f"(Showing {max_allowed_rows * tiles_per_row} of "
+                        f"{discard_count} discards)",
+                    )
+                )
+
+        discards_shown = min(discard_count, discard_rows * tiles_per_row)
+
+    tiles = []
+    for section, count, section_y, label, label_height in (
+        ("hand", hand_shown, hand_y, "Hand", hand_label_height),
+        ("discards", discards_shown, discards_y, "Discards", discards_label_height),
+    ):
+        if not count:
+            continue
+        labels.append(LabelSlot("section", left, section_y, label))
+        tiles_y = section_y + label_height + 5
+        tiles.extend(
+            TileSlot(
+                section,
+                index,
+                left + (index % tiles_per_row) * step_x,
+                tiles_y + (index // tiles_per_row) * step_y,
+            )
+            for index in range(count)
+        )
+
+    return ZoneLayout(tuple(tiles), tuple(labels), hand_shown, discards_shown)
 
 
 class MahjongVisualizer:
@@ -41,9 +439,63 @@ class MahjongVisualizer:
     DEFAULT_WIDTH = 1400  # Width in pixels
     DEFAULT_HEIGHT = 1200  # Height in pixels
 
+    # Version of the rendered output, bump whenever a change alters the pixels
+    # produced for a game state so that cached renders are not reused
+    RENDER_VERSION = 4
+
     # Cache for loaded tile images to avoid reloading the same tiles
     tile_images = {}
 
+    # Serializes filling the process-wide caches (fonts, tile images, palette
+    # and tile array) so renders in threads never see them half built
+    resource_lock = threading.RLock()
+
+    # Tile atlas backing tile_images, set once the tiles have been loaded
+    tile_atlas = None
+
+    # Tile image of each tile id (None for tiles without an image), so tile
+    # ids from a mahjong_model.GameState are drawn without decoding them
+    tile_sprites = [None] * len(TILE_CODES)
+
+    # Directory holding the source tile images
+    IMG_DIR = "img"
+
+    # Directory for persisted tile atlases, None disables the on-disk atlas
+    ATLAS_DIR = os.environ.get(
+        "MAHJONG_ATLAS_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "mahjongscript"),
+    )
+
+    # Image file for each tile code
+    TILE_FILES = {
+        **{f"M{i}": f"Man{i}-bordered-numbered.png" for i in range(1, 10)},
+        **{f"P{i}": f"Pin{i}-bordered-numbered.png" for i in range(1, 10)},
+        **{f"S{i}": f"Sou{i}-bordered-numbered.png" for i in range(1, 10)},
+        "E": "Ton-bordered-lettered.png",  # East wind
+        "S": "Nan-bordered-lettered.png",  # South wind
+        "W": "Shaa-bordered-lettered.png",  # West wind
+        "N": "Pei-bordered-lettered.png",  # North wind
+    }
+
+    # Cache for loaded fonts by role, shared by every instance in the process
+    fonts = {}
+
+    # Font file and size for each font role
+    FONT_SPECS = {
+        "normal": ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16),
+        "bold": ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 20),
+        "small": ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14),
+        "info": ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 24),
+        "info_normal": ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 18),
+        "wind": ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 120),
+    }
+
+    # Cache of pre-rendered static board layers, see get_board_template()
+    board_templates = {}
+
+    # Whether the regions of each layout overlap, see regions_overlap()
+    overlapping_layouts = {}
+
     # Color scheme for the visualization elements
     COLORS = {
         "background": (0, 100, 0),  # dark green
@@ -62,22 +514,60 @@ class MahjongVisualizer:
         "riichi_stick": (255, 215, 0),  # gold
     }
 
+    # Palette for palette-quantized output, see get_board_palette()
+    board_palette = None
+
+    # Active instrumentation, see enable_instrumentation()
+    instrumentation = None
+
+    # How tiles are composited onto the board: "pillow" pastes every tile,
+    # "numpy" writes each hand and discard grid in one vectorized operation
+    # (see draw_tile_grid()) and falls back to "pillow" without NumPy
+    COMPOSITING = "pillow"
+
+    # Tile atlas as an array for NumPy compositing, see get_tile_array()
+    tile_array = None
+
+    # Pillow format and default save options of each render_bytes() format
+    ENCODERS = {
+        "png": ("PNG", {"compress_level": 6}),
+        "png8": ("PNG", {"compress_level": 6}),  # palette-quantized PNG
+        "webp": ("WEBP", {"quality": 80, "method": 4}),
+        "jpeg": ("JPEG", {"quality": 85}),
+    }
+
+    # Levels of the default output pyramid: full size, half-size preview and
+    # quarter-size thumbnail, see render_pyramid()
+    PYRAMID_LEVELS = (1, 2, 4)
+
     # Tile dimensions in pixels - enlarged by 15% from original values for better visibility
     TILE_WIDTH = 35  # Width of each mahjong tile (was 30)
     TILE_HEIGHT = 46  # Height of each mahjong tile (was 40)
     TILE_SPACING = 6  # Spacing between tiles (was 5)
 
-    def __init__(self, game_data, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+    # Radius of the round wind circle in the center of the board
+    CENTER_WIND_RADIUS = 140
+
+    def __init__(
+        self, game_data, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, image=None
+    ):
         """Initialize the MahjongVisualizer
 
         Args:
-            game_data: Dictionary containing the mahjong game state
+            game_data: Dictionary containing the mahjong game state, or a
+                mahjong_model.GameState
             width: Width of the output image in pixels
             height: Height of the output image in pixels
+            image: Existing RGB image of the same size to draw on instead of
+                allocating a new one; its current content is kept
         """
+        if isinstance(game_data, GameState):
+            # Already validated when parsed; hands and discards stay tile ids
+            game_data = game_data.to_dict(tile_ids=True)
+        else:
+            # Validate input data structure
+            self.validate_game_data(game_data)
         self.game_data = game_data
-        # Validate input data structure
-        self.validate_game_data(self.game_data)
         # Set image dimensions
         self.width = width
         self.height = height
@@ -88,116 +578,246 @@ class MahjongVisualizer:
         self.player_width = int(self.width * 0.35)
         self.player_height = int(self.height * 0.35)
 
-        # Initialize the image with background color
-        self.image = Image.new(
-            "RGB", (self.width, self.height), self.COLORS["background"]
-        )
-        self.draw = ImageDraw.Draw(self.image)
+        self.image, self.draw = self.create_canvas(image)
 
-        # Try to load fonts - using DejaVu fonts which are common on Linux distributions
-        try:
-            self.font_normal = ImageFont.truetype(
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16
-            )
-            self.font_bold = ImageFont.truetype(
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 20
-            )
-            self.font_small = ImageFont.truetype(
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14
-            )
-            self.font_info = ImageFont.truetype(
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 24
-            )
-            self.font_info_normal = ImageFont.truetype(
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 18
-            )
-        except:
-            self.font_normal = ImageFont.load_default()
-            self.font_bold = ImageFont.load_default()
-            self.font_small = ImageFont.load_default()
-            self.font_info = ImageFont.load_default()
-            self.font_info_normal = ImageFont.load_default()
+        # Fonts are loaded once per process and shared between instances
+        fonts = self.load_fonts()
+        self.font_normal = fonts["normal"]
+        self.font_bold = fonts["bold"]
+        self.font_small = fonts["small"]
+        self.font_info = fonts["info"]
+        self.font_info_normal = fonts["info_normal"]
+        self.font_wind = fonts["wind"]
 
         # Preload tile images
         # Preload tile images
         self.load_tile_images()
 
-    def validate_game_data(self, data):
-        """Validate the game data structure
-
-        Checks that the game data has the required fields and structure.
-        Raises InvalidInputError if the data doesn't meet requirements.
+    def create_canvas(self, image=None):
+        """Return the (image, draw) pair that rendering draws on
 
         Args:
-            data: Dictionary containing the game state to validate
+            image: Existing RGB image of the canvas size to reuse, or None to
+                allocate one filled with the background color
+
+        Raises:
+            MahjongVisualizerError: If image has the wrong mode or size
+        """
+        if image is None:
+            image = Image.new(
+                "RGB", (self.width, self.height), self.COLORS["background"]
+            )
+        elif image.mode != "RGB" or image.size != (self.width, self.height):
+            raise MahjongVisualizerError(
+                f"Canvas must be an RGB image of size {self.width}x{self.height}"
+            )
+        return image, ImageDraw.Draw(image)
+
+    @classmethod
+    def load_fonts(cls):
+        """Load and cache the fonts used for all text
+
+        Fonts come from the shared font_registry and are stored by role in the
+        fonts class dictionary the first time they are requested, so later
+        instances reuse them without touching the disk.
 
         Returns:
-            True if the data is valid
+            Dictionary mapping font roles to loaded font objects
+        """
+        if not cls.fonts:
+            with cls.resource_lock:
+                if not cls.fonts:
+                    # Using DejaVu fonts which are common on Linux distributions
+                    cls.fonts.update(
+                        {
+                            role: font_registry.get_font(path, size)
+                            for role, (path, size) in cls.FONT_SPECS.items()
+                        }
+                    )
+        return cls.fonts
 
-        Raises:
-            InvalidInputError: If the data structure is invalid
+    @classmethod
+    def preload_resources(cls):
+        """Load fonts and tile images into the process-wide caches
+
+        Called once per batch worker so that every render in that worker
+        starts with warm caches.
         """
-        # Check required top-level keys
-        if not isinstance(data, dict):
-            raise InvalidInputError("Game data must be a dictionary")
+        cls.load_fonts()
+        cls.load_tile_images()
+
+    @classmethod
+    def enable_instrumentation(cls):
+        """Start recording per-method timings and rendering event counters
 
-        if "players" not in data:
-            raise InvalidInputError("Game data missing 'players' field")
+        Instrumentation is off by default and costs nothing until enabled;
+        see mahjong_metrics for what is recorded and how to export it.
 
-        if "round_wind" not in data:
-            raise InvalidInputError("Game data missing 'round_wind' field")
+        Returns:
+            The active mahjong_metrics.Instrumentation
+        """
+        # Imported here as mahjong_metrics depends on this module
+        from mahjong_metrics import Instrumentation
 
-        # Validate players section
-        if not isinstance(data["players"], dict):
-            raise InvalidInputError("Players data must be a dictionary")
+        if cls.instrumentation is None:
+            cls.instrumentation = Instrumentation(cls)
+            cls.instrumentation.install()
+        return cls.instrumentation
 
-        if not data["players"]:
-            raise InvalidInputError("Players data cannot be empty")
+    @classmethod
+    def disable_instrumentation(cls):
+        """Stop recording and restore the uninstrumented methods
 
-        # Validate each player's data structure
-        for player_id, player_data in data["players"].items():
-            # Check player data structure
-            if not isinstance(player_data, dict):
-                raise InvalidInputError(f"Player {player_id} data must be a dictionary")
+        Returns:
+            The Instrumentation that was active, holding the recorded metrics,
+            or None
+        """
+        instrumentation = cls.instrumentation
+        if instrumentation is not None:
+            instrumentation.uninstall()
+            cls.instrumentation = None
+        return instrumentation
+
+    @classmethod
+    def get_board_palette(cls):
+        """Return a 256 color palette image covering the colors of a board
+
+        The palette starts with the exact COLORS entries. The remaining
+        entries are quantized from the tile atlas pasted over each color and
+        from blends between every pair of colors, which is where anti-aliased
+        text and shape edges fall. The palette only depends on COLORS and the
+        tile images, so it is built once per tile size and color scheme and
+        every render maps to it without a per-image quantization.
 
-            # Check required player fields
-            for field in ["wind", "score", "hand"]:
-                if field not in player_data:
-                    raise InvalidInputError(
-                        f"Player {player_id} missing required field: {field}"
+        Returns:
+            Image in "P" mode holding the palette
+        """
+        key = (cls.TILE_WIDTH, cls.TILE_HEIGHT, tuple(cls.COLORS.values()))
+        board_palette = cls.board_palette
+        if board_palette is not None and board_palette[0] == key:
+            return board_palette[1]
+
+        with cls.resource_lock:
+            if cls.board_palette is not None and cls.board_palette[0] == key:
+                # Another thread built the palette meanwhile
+                return cls.board_palette[1]
+
+            cls.load_tile_images()
+
+            colors = list(dict.fromkeys(cls.COLORS.values()))
+            sheet = cls.tile_atlas.sheet
+            ramp_steps = 16
+            pairs = [
+                (first, second)
+                for index, first in enumerate(colors)
+                for second in colors[index + 1 :]
+            ]
+            seed = Image.new(
+                "RGB",
+                (
+                    max(sheet.width, 64),
+                    sheet.height * len(colors) + len(pairs) * ramp_steps,
+                ),
+            )
+
+            # Tiles over every board color
+            for index, color in enumerate(colors):
+                backdrop = Image.new("RGB", sheet.size, color)
+                backdrop.paste(sheet, (0, 0), sheet)
+                seed.paste(backdrop, (0, index * sheet.height))
+
+            # Blends between every pair of colors, one row per step
+            y = sheet.height * len(colors)
+            for first, second in pairs:
+                for step in range(ramp_steps):
+                    blend = tuple(
+                        round(a + (b - a) * step / (ramp_steps - 1))
+                        for a, b in zip(first, second)
                     )
+                    seed.paste(blend, (0, y, 64, y + 1))
+                    y += 1
 
-            # Validate score is a number
-            if not isinstance(player_data["score"], (int, float)):
-                raise InvalidInputError(f"Player {player_id} score must be a number")
+            quantized = seed.quantize(256 - len(colors), Image.Quantize.MEDIANCUT)
+            extra = quantized.getpalette()
+            colors.extend(tuple(extra[i : i + 3]) for i in range(0, len(extra), 3))
 
-            # Validate hand is a list
-            if not isinstance(player_data["hand"], list):
-                raise InvalidInputError(f"Player {player_id} hand must be a list")
+            palette = bytearray(768)
+            for index, color in enumerate(colors[:256]):
+                palette[index * 3 : index * 3 + 3] = bytes(color)
+            palette_image = Image.new("P", (1, 1))
+            palette_image.putpalette(palette)
+            cls.board_palette = (key, palette_image)
+            return palette_image
 
-            # Validate optional discards
-            if "discards" in player_data and not isinstance(
-                player_data["discards"], list
-            ):
-                raise InvalidInputError(f"Player {player_id} discards must be a list")
+    @classmethod
+    def get_tile_array(cls):
+        """Return the tile atlas as an array for NumPy compositing
 
-            # Validate riichi flag
-            if "riichi" in player_data and not isinstance(player_data["riichi"], bool):
-                raise InvalidInputError(f"Player {player_id} riichi must be a boolean")
+        Tiles are pasted without a mask, so only the RGB channels of the atlas
+        are kept. The array is built once per loaded atlas.
 
-        # Validate optional winner_id
-        if "winner_id" in data and str(data["winner_id"]) not in data["players"]:
-            raise InvalidInputError(
-                f"Winner ID {data['winner_id']} is not a valid player ID"
+        Returns:
+            (index, tiles) tuple, where index maps each tile code and tile id
+            to its position in tiles, a (count, TILE_HEIGHT, TILE_WIDTH, 3)
+            uint8 array
+        """
+        cls.load_tile_images()
+        atlas = cls.tile_atlas
+        tile_array = cls.tile_array
+        if tile_array is not None and tile_array[0] is atlas:
+            return tile_array[1:]
+
+        with cls.resource_lock:
+            if cls.tile_array is not None and cls.tile_array[0] is atlas:
+                # Another thread built the array meanwhile
+                return cls.tile_array[1:]
+
+            count = len(atlas.codes)
+            sheet = np.asarray(atlas.sheet.convert("RGBA"))[:, :, :3]
+            tiles = np.ascontiguousarray(
+                sheet.reshape(atlas.tile_height, count, atlas.tile_width, 3).transpose(
+                    1, 0, 2, 3
+                )
+            )
+            index = {code: position for position, code in enumerate(atlas.codes)}
+            index.update(
+                (tile_id, index[code])
+                for tile_id, code in enumerate(TILE_CODES)
+                if code in index
             )
+            cls.tile_array = (atlas, index, tiles)
+            return index, tiles
+
+    def text_bbox(self, text, font):
+        """Return the bounding box of text at (0, 0), memoized per font and text"""
+        return font_registry.text_bbox(text, font)
 
-        # All validations passed
-        return True
+    def draw_text(self, xy, text, fill, font):
+        """Draw text using the shared cache of rasterized text"""
+        font_registry.draw_text(self.draw, xy, text, fill, font)
+
+    def validate_game_data(self, data):
+        """Validate the game data structure
+
+        Checks that the game data has the required fields and structure.
+        Raises InvalidInputError if the data doesn't meet requirements.
+
+        Args:
+            data: Dictionary containing the game state to validate
+
+        Returns:
+            True if the data is valid
+
+        Raises:
+            InvalidInputError: If the data structure is invalid
+        """
+        return validate_game_data(data)
 
     def get_tile_image_filename(self, tile):
         """Map a tile code to its corresponding image filename
 
-        Converts tile codes (like 'M1', 'P2', 'E') to their respective image filenames.
+        Converts tile codes (like 'M1', 'P2', 'E') to their respective image
+        filenames with a single TILE_FILES lookup.
 
         Args:
             tile: String tile code ('M1'-'M9' for Man/Characters, 'P1'-'P9' for Pin/Dots,
@@ -206,66 +826,67 @@ class MahjongVisualizer:
         Returns:
             String filename for the tile image, or None if not recognized
         """
-        if len(tile) == 1:
-            # Honor tile (wind or dragon)
-            if tile == "E":
-                return "Ton-bordered-lettered.png"  # East wind
-            elif tile == "S":
-                return "Nan-bordered-lettered.png"  # South wind
-            elif tile == "W":
-                return "Shaa-bordered-lettered.png"  # West wind
-            elif tile == "N":
-                return "Pei-bordered-lettered.png"  # North wind
-            else:
-                # Default case if unknown
-                return None
-        elif len(tile) == 2:
-            # Numbered tiles (Man, Pin, Sou)
-            suit = tile[0]
-            number = tile[1]
-
-            if suit == "M":
-                return f"Man{number}-bordered-numbered.png"  # Man/Character suit
-            elif suit == "P":
-                return f"Pin{number}-bordered-numbered.png"  # Pin/Dots suit
-            elif suit == "S":
-                return f"Sou{number}-bordered-numbered.png"  # Sou/Bamboo suit
-            else:
-                return None
-        return None
+        return self.TILE_FILES.get(tile)
 
-    def load_tile_images(self):
+    @classmethod
+    def load_tile_images(cls):
         """Load and cache all tile images
 
-        Preloads all possible tile images from the img directory to avoid
-        loading them repeatedly during rendering. Images are stored in the
-        tile_images class dictionary.
-        """
-        # Man (Characters) 1-9
-        for i in range(1, 10):
-            tile_code = f"M{i}"  # M1, M2, ..., M9
-            filename = f"Man{i}-bordered-numbered.png"
-            self.load_and_cache_tile_image(tile_code, filename)
-
-        # Pin (Dots) 1-9
-        for i in range(1, 10):
-            tile_code = f"P{i}"  # P1, P2, ..., P9
-            filename = f"Pin{i}-bordered-numbered.png"
-            self.load_and_cache_tile_image(tile_code, filename)
-
-        # Sou (Bamboo) 1-9
-        for i in range(1, 10):
-            tile_code = f"S{i}"  # S1, S2, ..., S9
-            filename = f"Sou{i}-bordered-numbered.png"
-            self.load_and_cache_tile_image(tile_code, filename)
-
-        # Honor tiles - Winds (East, South, West, North)
-        self.load_and_cache_tile_image("E", "Ton-bordered-lettered.png")
-        self.load_and_cache_tile_image("S", "Nan-bordered-lettered.png")
-        self.load_and_cache_tile_image("W", "Shaa-bordered-lettered.png")
-        self.load_and_cache_tile_image("N", "Pei-bordered-lettered.png")
-
-    def load_and_cache_tile_image(self, tile_code, filename):
+        Tiles are loaded once per process and tile size. The resized tiles are
+        persisted as a TileAtlas in ATLAS_DIR, so later processes memory-map
+        the atlas instead of decoding and resizing every PNG in the img
+        directory. Images are stored in the tile_images class dictionary.
+        """
+        atlas = cls.tile_atlas
+        if (
+            atlas is not None
+            and atlas.tile_width == cls.TILE_WIDTH
+            and atlas.tile_height == cls.TILE_HEIGHT
+        ):
+            # Already warm for this tile size
+            return
+
+        with cls.resource_lock:
+            if cls.tile_atlas is not atlas:
+                # Another thread loaded the tiles meanwhile, check them again
+                return cls.load_tile_images()
+
+            atlas_path = None
+            if cls.ATLAS_DIR:
+                atlas_path = os.path.join(
+                    cls.ATLAS_DIR,
+                    TileAtlas.cache_key(
+                        cls.IMG_DIR, cls.TILE_FILES, cls.TILE_WIDTH, cls.TILE_HEIGHT
+                    ),
+                )
+                atlas = TileAtlas.load(atlas_path)
+            else:
+                atlas = None
+
+            if atlas is None:
+                # Cold start - decode and resize each source image
+                cls.tile_images.clear()
+                for tile_code, filename in cls.TILE_FILES.items():
+                    cls.load_and_cache_tile_image(tile_code, filename)
+                atlas = TileAtlas.from_tiles(
+                    cls.tile_images, cls.TILE_WIDTH, cls.TILE_HEIGHT
+                )
+                # Only persist a complete atlas, never one built while source
+                # images were missing or unreadable
+                if atlas_path and len(cls.tile_images) == len(cls.TILE_FILES):
+                    try:
+                        os.makedirs(cls.ATLAS_DIR, exist_ok=True)
+                        atlas.save(atlas_path)
+                    except OSError as e:
+                        print(f"Warning: Failed to save tile atlas {atlas_path}: {e}")
+
+            cls.tile_images.clear()
+            cls.tile_images.update(atlas.tiles())
+            cls.tile_sprites = [cls.tile_images.get(code) for code in TILE_CODES]
+            cls.tile_atlas = atlas
+
+    @classmethod
+    def load_and_cache_tile_image(cls, tile_code, filename):
         """Load a single tile image and cache it
 
         Loads an image from the img directory, resizes it to the current
@@ -276,15 +897,15 @@ class MahjongVisualizer:
             filename: Name of the image file to load from the img directory
         """
         try:
-            img_path = os.path.join("img", filename)
+            img_path = os.path.join(cls.IMG_DIR, filename)
             if os.path.exists(img_path):
                 # Load and resize the image
                 img = Image.open(img_path)
                 img = img.resize(
-                    (self.TILE_WIDTH, self.TILE_HEIGHT), Image.Resampling.LANCZOS
+                    (cls.TILE_WIDTH, cls.TILE_HEIGHT), Image.Resampling.LANCZOS
                 )
                 # Store in cache
-                self.tile_images[tile_code] = img
+                cls.tile_images[tile_code] = img
             else:
                 print(f"Warning: Tile image file not found: {img_path}")
         except Exception as e:
@@ -310,15 +931,36 @@ class MahjongVisualizer:
             if player.get("riichi", False)
         )
 
-    def draw_game_info(self):
-        """Draw game information box"""
-        info_width = 280
+    def get_game_info_items(self):
+        """Return the [label, value] rows shown in the game information box"""
+        # Calculate game information
+        remaining_tiles = self.calculate_remaining_tiles()
+        riichi_bets = self.count_riichi_bets()
+
+        return [
+            ["Round:", f"{self.game_data['round_wind']}"],
+            ["Remaining:", f"{remaining_tiles}"],
+            ["Riichi Bets:", f"{riichi_bets}"],
+            ["Honba:", f"{self.game_data.get('honba', 0)}"],
+        ]
+
+    def get_game_info_box(self):
+        """Return the (x, y, width, height) of the game information box"""
         info_width = 300
         info_height = 260
-        padding = 20
         # Position in center right of the screen
         x = self.width - info_width - 30
         y = (self.height - info_height) // 2
+        return x, y, info_width, info_height
+
+    def draw_game_info_frame(self):
+        """Draw the static parts of the game information box
+
+        Draws the box, its title and the separator line, which are the same
+        for every game state.
+        """
+        x, y, info_width, info_height = self.get_game_info_box()
+        padding = 20
 
         # Draw info box
         self.draw.rectangle(
@@ -328,16 +970,12 @@ class MahjongVisualizer:
             width=3,
         )
 
-        # Calculate game information
-        remaining_tiles = self.calculate_remaining_tiles()
-        riichi_bets = self.count_riichi_bets()
-
         # Draw title
         title = "Game Information"
-        title_bbox = self.draw.textbbox((0, 0), title, font=self.font_info)
+        title_bbox = self.text_bbox(title, self.font_info)
         title_width = title_bbox[2] - title_bbox[0]
 
-        self.draw.text(
+        self.draw_text(
             (x + (info_width - title_width) // 2, y + padding),
             title,
             fill=self.COLORS["text"],
@@ -352,20 +990,29 @@ class MahjongVisualizer:
             width=2,
         )
 
+    def draw_game_info(self, draw_frame=True):
+        """Draw game information box
+
+        Args:
+            draw_frame: Whether to draw the static box, title and separator
+                too, False when they already come from the board template
+        """
+        if draw_frame:
+            self.draw_game_info_frame()
+
+        x, y, info_width, info_height = self.get_game_info_box()
+        padding = 20
+        separator_y = y + padding * 3
+
         # Draw information text
-        info_items = [
-            ["Round:", f"{self.game_data['round_wind']}"],
-            ["Remaining:", f"{remaining_tiles}"],
-            ["Riichi Bets:", f"{riichi_bets}"],
-            ["Honba:", f"{self.game_data.get('honba', 0)}"],
-        ]
+        info_items = self.get_game_info_items()
 
         text_y = separator_y + padding * 2
         line_spacing = 40  # Increased line spacing
 
         for label, value in info_items:
             # Draw label
-            self.draw.text(
+            self.draw_text(
                 (x + padding * 2, text_y),
                 label,
                 fill=self.COLORS["text"],
@@ -373,7 +1020,7 @@ class MahjongVisualizer:
             )
 
             # Calculate value text dimensions to ensure it stays within bounds
-            value_bbox = self.draw.textbbox((0, 0), value, font=self.font_info_normal)
+            value_bbox = self.text_bbox(value, self.font_info_normal)
             value_width = value_bbox[2] - value_bbox[0]
 
             # Calculate maximum width available for the value
@@ -387,7 +1034,7 @@ class MahjongVisualizer:
                 display_value = value[:10] + "..."  # Simple truncation approach
 
             # Draw value text
-            self.draw.text(
+            self.draw_text(
                 (x + info_width - padding * 2 - value_width, text_y),
                 display_value,
                 fill=self.COLORS["text"],
@@ -420,13 +1067,23 @@ class MahjongVisualizer:
             width=1,
         )
 
+    def get_tile_sprite(self, tile):
+        """Return the image of a tile code or tile id, or None if it has none"""
+        if isinstance(tile, int):
+            return self.tile_sprites[tile]
+        return self.tile_images.get(tile)
+
     def draw_tile(self, x, y, tile):
-        """Draw a single mahjong tile"""
+        """Draw a single mahjong tile, given as a tile code or a tile id"""
         # Check if we have the image in our cache
-        if tile in self.tile_images:
+        sprite = self.get_tile_sprite(tile)
+        if sprite is not None:
             # Paste the tile image
-            self.image.paste(self.tile_images[tile], (x, y))
+            self.image.paste(sprite, (x, y))
         else:
+            if isinstance(tile, int):
+                tile = TILE_CODES[tile]
+
             # Fallback to text-based drawing if image not available
             is_honor = len(tile) == 1 or tile[0] in ["E", "S", "W", "N", "G", "R"]
 
@@ -439,92 +1096,71 @@ class MahjongVisualizer:
             )
 
             # Draw tile text
-            text_bbox = self.draw.textbbox((0, 0), tile, font=self.font_small)
+            text_bbox = self.text_bbox(tile, self.font_small)
             text_width = text_bbox[2] - text_bbox[0]
             text_height = text_bbox[3] - text_bbox[1]
 
             text_x = x + (self.TILE_WIDTH - text_width) // 2
             text_y = y + (self.TILE_HEIGHT - text_height) // 2
 
-            self.draw.text(
-                (text_x, text_y), tile, fill=self.COLORS["border"], font=self.font_small
+            self.draw_text(
+                (text_x, text_y),
+                tile,
+                fill=self.COLORS["border"],
+                font=self.font_small,
             )
 
-    def draw_tiles(self, x, y, tiles, is_discards=False):
-        """Draw a group of tiles"""
-        if not tiles:
-            return
-
-        # Draw section label with clear visual marking
-        label = "Discards" if is_discards else "Hand"
-        label_height = self.draw_section_label(x, y, label)
-        y += label_height + 5
-
-        # Calculate available space
-        available_width = self.player_width - 20  # Allow for margin
-
-        if is_discards:
-            # Remove separating line for cleaner look
-
-            # Calculate grid layout for discards
-            # Calculate grid layout for discards - optimized for larger tiles
-            max_cols = int(available_width // (self.TILE_WIDTH + self.TILE_SPACING))
-            if max_cols < 1:
-                max_cols = 1
-
-            # Ensure we can fit at least 6 tiles per row for up to 18 tiles
-            # Ensure we can fit at least 10 tiles per row for up to 18 tiles
-            max_cols = min(max_cols, 10)
-            # Check how many rows we can fit - account for larger tiles
-            max_rows = int(
-                (self.player_height - (y - int(self.player_height * 0.3)) - 20)
-                // (self.TILE_HEIGHT + self.TILE_SPACING)
-            )
-            if max_rows < 1:
-                max_rows = 1
-
-            # Calculate total tiles that can be displayed
-            total_tiles_displayable = max_cols * max_rows
-
-            # If we have more tiles than can fit, limit the display
-            tiles_to_display = (
-                tiles[:total_tiles_displayable]
-                if len(tiles) > total_tiles_displayable
-                else tiles
-            )
-
-            for i, tile in enumerate(tiles_to_display):
-                col = i % max_cols
-                row = i // max_cols
+    def draw_tile_grid(self, x, y, tiles, per_row):
+        """Draw a grid of tiles with NumPy, as draw_tile() would one by one
 
-                tile_x = x + col * (self.TILE_WIDTH + self.TILE_SPACING)
-                tile_y = y + row * (self.TILE_HEIGHT + self.TILE_SPACING)
+        The board area under the grid is read into an array, every tile with
+        an image is written into it with a single vectorized assignment from
+        get_tile_array() and the area is pasted back. Tiles without an image
+        are then drawn by draw_tile(), whose placeholder covers the tile.
 
-                self.draw_tile(tile_x, tile_y, tile)
-        else:
-            # For hand tiles, calculate how many can fit in a row
-            # For hand tiles, calculate how many can fit in a row
-            # For hand tiles, calculate how many can fit in a row - optimized for larger tiles
-            tiles_per_row = int(
-                available_width // (self.TILE_WIDTH + self.TILE_SPACING)
-            )
-            if tiles_per_row < 1:
-                tiles_per_row = 1
-
-            # Ensure we can fit at least 10 tiles per row for up to 18 tiles
-            tiles_per_row = min(tiles_per_row, 10)
-            for i, tile in enumerate(tiles):
-                row = i // tiles_per_row
-                col = i % tiles_per_row
-
-                tile_x = x + col * (self.TILE_WIDTH + self.TILE_SPACING)
-                tile_y = y + row * (self.TILE_HEIGHT + self.TILE_SPACING)
-
-                self.draw_tile(tile_x, tile_y, tile)
+        Args:
+            x: Left edge of the first tile
+            y: Top edge of the first tile
+            tiles: Tile codes or tile ids, filling rows of per_row tiles left
+                to right
+            per_row: Number of tiles per row
+        """
+        if not tiles:
+            return
+        index, tile_array = self.get_tile_array()
+        step_x = self.TILE_WIDTH + self.TILE_SPACING
+        step_y = self.TILE_HEIGHT + self.TILE_SPACING
+        rows = -(-len(tiles) // per_row)
+        width = (min(len(tiles), per_row) - 1) * step_x + self.TILE_WIDTH
+        height = (rows - 1) * step_y + self.TILE_HEIGHT
+        box = (x, y, x + width, y + height)
+
+        # Pad the area to whole cells so it can be viewed as rows x columns of
+        # tile-sized cells
+        grid = np.empty((rows * step_y, per_row * step_x, 3), np.uint8)
+        grid[:height, :width] = np.asarray(self.image.crop(box))
+        cells = grid.reshape(rows, step_y, per_row, step_x, 3)[
+            :, : self.TILE_HEIGHT, :, : self.TILE_WIDTH
+        ].transpose(0, 2, 1, 3, 4)
+
+        # Placeholder tiles are overdrawn below, any sprite will do for them
+        positions = np.arange(len(tiles))
+        cells[positions // per_row, positions % per_row] = tile_array[
+            [index.get(tile, 0) for tile in tiles]
+        ]
+        self.image.paste(Image.fromarray(grid[:height, :width]), box[:2])
+
+        for position, tile in enumerate(tiles):
+            if tile not in index:
+                self.draw_tile(
+                    x + position % per_row * step_x,
+                    y + position // per_row * step_y,
+                    tile,
+                )
 
     def draw_section_label(self, x, y, text):
         """Draw a labeled section with background"""
-        text_bbox = self.draw.textbbox((0, 0), text, font=self.font_small)
+        text_bbox = self.text_bbox(text, self.font_small)
         text_width = text_bbox[2] - text_bbox[0]
         text_height = text_bbox[3] - text_bbox[1]
 
@@ -540,7 +1176,7 @@ class MahjongVisualizer:
         )
 
         # Draw label text
-        self.draw.text(
+        self.draw_text(
             (x + padding, y + padding),
             text,
             fill=self.COLORS["border"],
@@ -549,8 +1185,8 @@ class MahjongVisualizer:
 
         return label_height
 
-    def draw_player_zone(self, player_id, position):
-        """Draw a player's zone with all components"""
+    def get_zone_origin(self, position):
+        """Return the top left corner of the player zone at a position"""
         positions = {
             "top_right": (self.width - self.player_width, 0),
             "bottom_right": (
@@ -560,10 +1196,11 @@ class MahjongVisualizer:
             "bottom_left": (0, self.height - self.player_height),
             "top_left": (0, 0),
         }
+        return positions[position]
 
-        x, y = positions[position]
-        player_data = self.game_data["players"][str(player_id)]
-        is_winner = str(player_id) == self.game_data.get("winner_id", "")
+    def draw_player_zone_frame(self, position, is_winner):
+        """Draw the background and border of a player zone"""
+        x, y = self.get_zone_origin(position)
 
         # Draw zone background
         self.draw.rectangle(
@@ -575,8 +1212,21 @@ class MahjongVisualizer:
             width=3,  # Make the border thicker for better visibility
         )
 
-        # Calculate total available space for content
-        total_available_height = self.player_height - 30  # Allocate space for margins
+    def draw_player_zone(self, player_id, position, draw_frame=True):
+        """Draw a player's zone with all components
+
+        Args:
+            player_id: ID of the player whose zone is drawn
+            position: Zone position, e.g. 'top_right'
+            draw_frame: Whether to draw the zone background and border too,
+                False when they already come from the board template
+        """
+        x, y = self.get_zone_origin(position)
+        player_data = self.game_data["players"][str(player_id)]
+        is_winner = str(player_id) == self.game_data.get("winner_id", "")
+
+        if draw_frame:
+            self.draw_player_zone_frame(position, is_winner)
 
         # Draw player information
         info_y = y + 10  # Reduced top margin
@@ -588,11 +1238,9 @@ class MahjongVisualizer:
 
         # Draw information box background for better readability
         text_width = max(
-            self.draw.textbbox((0, 0), line, font=self.font_bold)[2]
-            for line in player_info
+            self.text_bbox(line, self.font_bold)[2] for line in player_info
         )
         text_height = len(player_info) * 25  # Reduced line height
-        info_box_height = text_height + 8  # Reduced padding
 
         self.draw.rectangle(
             [x + 8, info_y - 5, x + text_width + 25, info_y + text_height + 5],
@@ -602,7 +1250,7 @@ class MahjongVisualizer:
         )
 
         for line in player_info:
-            self.draw.text(
+            self.draw_text(
                 (x + 15, info_y),  # Increased left margin
                 line,
                 fill=self.COLORS["text"],
@@ -614,141 +1262,87 @@ class MahjongVisualizer:
         if player_data.get("riichi", False):
             self.draw_riichi_sticks(x, y, True)
 
-        # Calculate available width for tiles
-        available_width = self.player_width - 30  # Increased margin for safety
-
-        # Calculate optimal tiles per row based on available width
-        # Calculate optimal tiles per row based on available width
-        tiles_per_row = max(
-            1, min(10, int(available_width // (self.TILE_WIDTH + self.TILE_SPACING)))
-        )
-        # Calculate space needed for hand and discards
-        # Start hand zone after info box with padding
-        hand_y = y + info_box_height + 30  # Reduced padding
-
-        # Calculate maximum available height for the rest of the content
-        max_remaining_height = (
-            self.player_height - (hand_y - y) - 20
-        )  # 20px bottom margin
-
-        # Calculate how many rows we can fit for hand tiles
-        max_hand_rows = max(
-            1,
-            (max_remaining_height // 2 - 30) // (self.TILE_HEIGHT + self.TILE_SPACING),
-        )
-
-        # Limit hand rows if we have too many tiles
-        hand_rows_needed = (
-            len(player_data["hand"]) + tiles_per_row - 1
-        ) // tiles_per_row
-        hand_rows = min(hand_rows_needed, max_hand_rows)
-
-        # Calculate actual hand height with optimized rows
-        hand_height = (
-            hand_rows * (self.TILE_HEIGHT + self.TILE_SPACING) + 20
-        )  # Reduced label height
-
-        # Calculate remaining space after hand
-        remaining_height = max_remaining_height - hand_height - 50  # 50px min spacing
-        # Check if we have discards to display
-        if "discards" in player_data and player_data["discards"]:
-            # Calculate discards space requirements
-            discards_tiles = player_data["discards"]
-            discards_tiles = player_data["discards"]
-            discards_tiles_per_row = max(
-                1,
-                min(10, int(available_width // (self.TILE_WIDTH + self.TILE_SPACING))),
-            )
-            # Calculate how many rows we can fit in remaining space
-            max_discard_rows = max(
-                1, (remaining_height - 20) // (self.TILE_HEIGHT + self.TILE_SPACING)
-            )
+        # Draw hand and discard tiles following the cached layout plan
+        hand = player_data["hand"]
+        discards = player_data.get("discards") or []
+        layout = self.plan_player_zone(len(hand), len(discards))
 
-            # Limit discard rows if we have too many tiles
-            discard_rows_needed = (
-                len(discards_tiles) + discards_tiles_per_row - 1
-            ) // discards_tiles_per_row
-            discard_rows = min(discard_rows_needed, max_discard_rows)
-
-            # Calculate actual discards height with optimized rows
-            discards_height = (
-                discard_rows * (self.TILE_HEIGHT + self.TILE_SPACING) + 20
-            )  # Reduced label height
-
-            # Ensure minimum spacing between hand and discards (at least 50px)
-            min_spacing = 50
-
-            # Calculate discards position with sufficient spacing
-            discards_y = hand_y + hand_height + min_spacing
-            # Strict boundary check for discards zone
-            if (discards_y + discards_height) > (y + self.player_height - 10):
-                # Emergency adjustment - reduce spacing if still too tight
-                if min_spacing > 30:
-                    min_spacing = 30
-                    discards_y = hand_y + hand_height + min_spacing
-
-                # Final check to ensure we're within boundaries
-                max_allowed_height = (y + self.player_height - 10) - discards_y
-                max_allowed_rows = max(
-                    1,
-                    int(max_allowed_height - 20)
-                    // (self.TILE_HEIGHT + self.TILE_SPACING),
+        for label in layout.labels:
+            if label.kind == "section":
+                self.draw_section_label(x + label.x, y + label.y, label.text)
+            else:
+                # Indicator that not all tiles are shown
+                self.draw_text(
+                    (x + label.x, y + label.y),
+                    label.text,
+                    fill=self.COLORS["text"],
+                    font=self.font_small,
                 )
 
-                # Adjust display if still not enough space
-                if max_allowed_rows < discard_rows:
-                    discard_rows = max_allowed_rows
-
-                    # Add an indicator that not all discards are shown
-                    truncated_message = f"(Showing {max_allowed_rows * discards_tiles_per_row} of {len(discards_tiles)} discards)"
-                    self.draw.text(
-                        (x + 15, discards_y - 15),
-                        truncated_message,
-                        fill=self.COLORS["text"],
-                        font=self.font_small,
-                    )
-
-            # Draw hand tiles first
-            self.draw_tiles(x + 15, hand_y, player_data["hand"])
+        sections = {"hand": hand, "discards": discards}
+        if self.COMPOSITING == "numpy" and np is not None:
+            # Slots of a section are consecutive and fill rows left to right
+            start = 0
+            while start < len(layout.tiles):
+                first = layout.tiles[start]
+                end = start
+                per_row = 0
+                while (
+                    end < len(layout.tiles)
+                    and layout.tiles[end].section == first.section
+                ):
+                    if layout.tiles[end].y == first.y:
+                        per_row += 1
+                    end += 1
+                self.draw_tile_grid(
+                    x + first.x,
+                    y + first.y,
+                    sections[first.section][: end - start],
+                    per_row,
+                )
+                start = end
+        else:
+            for slot in layout.tiles:
+                self.draw_tile(
+                    x + slot.x, y + slot.y, sections[slot.section][slot.index]
+                )
 
-            # Draw discards below with proper spacing
-            self.draw_tiles(x + 15, discards_y, player_data["discards"], True)
+    def get_section_label_height(self, text):
+        """Return the height of a section label drawn by draw_section_label()"""
+        text_bbox = self.text_bbox(text, self.font_small)
+        return text_bbox[3] - text_bbox[1] + 2 * 3
 
-            # Limit the number of discards shown based on available space
-            tiles_to_show = min(
-                len(discards_tiles), discard_rows * discards_tiles_per_row
-            )
+    def plan_player_zone(self, hand_count, discard_count):
+        """Return the layout plan for a player zone
 
-            # Draw hand tiles first
-            self.draw_tiles(
-                x + 15, hand_y, player_data["hand"][: hand_rows * tiles_per_row]
-            )
+        Plans only depend on the zone size and the number of tiles, so they
+        are shared between players and game states, see plan_zone_layout().
 
-            # Draw discards below with proper spacing
-            self.draw_tiles(x + 15, discards_y, discards_tiles[:tiles_to_show], True)
+        Args:
+            hand_count: Number of tiles in the player's hand
+            discard_count: Number of tiles in the player's discards
 
-            # Draw debug measurements if needed - uncomment for debugging
-            # debug_color = (255, 0, 0)  # red
-            # self.draw.line([x + 5, y + self.player_height - 10, x + self.player_width - 5, y + self.player_height - 10], fill=debug_color, width=2)
-            # self.draw.line([x + 5, hand_y, x + self.player_width - 5, hand_y], fill=debug_color, width=1)
-            # self.draw.line([x + 5, hand_y + hand_height, x + self.player_width - 5, hand_y + hand_height], fill=debug_color, width=1)
-            # self.draw.line([x + 5, discards_y, x + self.player_width - 5, discards_y], fill=debug_color, width=1)
-            # self.draw.line([x + 5, discards_y + discards_height, x + self.player_width - 5, discards_y + discards_height], fill=debug_color, width=1)
-        else:
-            # Only hand tiles to draw - can use more space
-            max_hand_rows = max(
-                1, (max_remaining_height - 20) // (self.TILE_HEIGHT + self.TILE_SPACING)
-            )
-            hand_rows = min(
-                (len(player_data["hand"]) + tiles_per_row - 1) // tiles_per_row,
-                max_hand_rows,
-            )
-            tiles_to_show = min(len(player_data["hand"]), hand_rows * tiles_per_row)
+        Returns:
+            ZoneLayout with coordinates relative to the zone's top left corner
+        """
+        return plan_zone_layout(
+            self.player_width,
+            self.player_height,
+            hand_count,
+            discard_count,
+            self.TILE_WIDTH,
+            self.TILE_HEIGHT,
+            self.TILE_SPACING,
+            self.get_section_label_height("Hand"),
+            self.get_section_label_height("Discards"),
+        )
 
-            self.draw_tiles(x + 15, hand_y, player_data["hand"][:tiles_to_show])
+    def get_player_positions(self):
+        """Return the zone position of every player drawn on the board
 
-    def draw_all_player_zones(self):
-        """Draw all player zones"""
+        Returns:
+            Dictionary mapping player IDs to zone positions
+        """
         positions_4_players = {
             "1": "top_right",
             "2": "bottom_right",
@@ -764,16 +1358,32 @@ class MahjongVisualizer:
             else positions_3_players
         )
 
-        for player_id, position in positions.items():
-            if player_id in self.game_data["players"]:
-                self.draw_player_zone(player_id, position)
+        return {
+            player_id: position
+            for player_id, position in positions.items()
+            if player_id in self.game_data["players"]
+        }
 
-    def draw_center_wind(self):
-        """Draw the round wind in the center of the board"""
-        wind = self.game_data["round_wind"]
+    def get_winner_position(self):
+        """Return the zone position of the winning player, or None"""
+        for player_id, position in self.get_player_positions().items():
+            if player_id == self.game_data.get("winner_id", ""):
+                return position
+        return None
 
+    def draw_all_player_zones(self, draw_frame=True):
+        """Draw all player zones
+
+        Args:
+            draw_frame: Whether to draw the zone backgrounds and borders too
+        """
+        for player_id, position in self.get_player_positions().items():
+            self.draw_player_zone(player_id, position, draw_frame)
+
+    def draw_center_wind_frame(self):
+        """Draw the wind indicator circle and its "Round Wind" caption"""
         # Create a circular background for the wind indicator
-        circle_radius = 140  # Larger circle for more prominence
+        circle_radius = self.CENTER_WIND_RADIUS
 
         # Draw circle background
         self.draw.ellipse(
@@ -788,68 +1398,1094 @@ class MahjongVisualizer:
             width=4,  # Thicker outline for better visibility
         )
 
-        # Draw wind character - get appropriate large font
-        try:
-            wind_font = ImageFont.truetype(
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 120
-            )  # Larger font for better prominence
-        except:
-            wind_font = self.font_info
+        # Add "Round Wind" text below the circle
+        label_text = "Round Wind"
+        label_bbox = self.text_bbox(label_text, self.font_bold)
+        label_width = label_bbox[2] - label_bbox[0]
+
+        self.draw_text(
+            (self.center_x - label_width // 2, self.center_y + circle_radius + 10),
+            label_text,
+            fill=self.COLORS["text"],
+            font=self.font_info,  # Use larger font for better visibility
+        )
+
+    def draw_center_wind(self, draw_frame=True):
+        """Draw the round wind in the center of the board
+
+        Args:
+            draw_frame: Whether to draw the circle and caption too, False when
+                they already come from the board template
+        """
+        if draw_frame:
+            self.draw_center_wind_frame()
+
+        wind = self.game_data["round_wind"]
+
+        # Draw wind character with the large wind font
+        wind_font = self.font_wind
 
         # Draw wind text
         wind_text = wind
-        text_bbox = self.draw.textbbox((0, 0), wind_text, font=wind_font)
+        text_bbox = self.text_bbox(wind_text, wind_font)
         text_width = text_bbox[2] - text_bbox[0]
         text_height = text_bbox[3] - text_bbox[1]
 
-        self.draw.text(
+        self.draw_text(
             (self.center_x - text_width // 2, self.center_y - text_height // 2),
             wind_text,
             fill=self.COLORS["border"],
             font=wind_font,
         )
 
-        # Add "Round Wind" text below the circle
-        label_text = "Round Wind"
-        label_bbox = self.draw.textbbox((0, 0), label_text, font=self.font_bold)
-        label_width = label_bbox[2] - label_bbox[0]
+    def get_layout_key(self):
+        """Return the key identifying the static layout of the board
 
-        self.draw.text(
-            (self.center_x - label_width // 2, self.center_y + circle_radius + 10),
-            label_text,
-            fill=self.COLORS["text"],
-            font=self.font_info,  # Use larger font for better visibility
+        Two game states with the same layout key share the same board
+        template and region boxes.
+        """
+        return (
+            tuple(sorted(self.get_player_positions().values())),
+            self.width,
+            self.height,
+            self.get_winner_position(),
+        )
+
+    def get_region_boxes(self):
+        """Return the bounding box of every independently drawn board region
+
+        Unless regions_overlap(), each region can be repainted on its own by
+        restoring its part of the board template and drawing its content.
+
+        Returns:
+            Dictionary mapping region names to (left, top, right, bottom)
+            boxes; player zones are named ("player", player_id), the other
+            regions "center_wind" and "game_info"
+        """
+        boxes = {}
+        for player_id, position in self.get_player_positions().items():
+            x, y = self.get_zone_origin(position)
+            # Rectangles include their end coordinates
+            boxes[("player", player_id)] = (
+                x,
+                y,
+                min(x + self.player_width + 1, self.width),
+                min(y + self.player_height + 1, self.height),
+            )
+
+        radius = self.CENTER_WIND_RADIUS
+        boxes["center_wind"] = (
+            self.center_x - radius,
+            self.center_y - radius,
+            self.center_x + radius + 1,
+            self.center_y + radius + 1,
+        )
+
+        x, y, info_width, info_height = self.get_game_info_box()
+        boxes["game_info"] = (x, y, x + info_width + 1, y + info_height + 1)
+        return boxes
+
+    def regions_overlap(self):
+        """Return whether any two regions of the layout intersect
+
+        Regions are apart on the default board, but on smaller boards, e.g.
+        1000x800 or 700x600, player zones run into the center wind and the
+        game information box. Repainting one of two overlapping regions
+        would paint over the other, so such layouts are only drawn whole.
+        The result is cached per layout key.
+        """
+        key = self.get_layout_key()
+        overlap = self.overlapping_layouts.get(key)
+        if overlap is None:
+            boxes = list(self.get_region_boxes().values())
+            overlap = any(
+                first[0] < second[2]
+                and second[0] < first[2]
+                and first[1] < second[3]
+                and second[1] < first[3]
+                for index, first in enumerate(boxes)
+                for second in boxes[index + 1 :]
+            )
+            self.overlapping_layouts[key] = overlap
+        return overlap
+
+    def draw_region(self, region):
+        """Repaint one region returned by get_region_boxes()
+
+        Restores the region from the board template and draws its
+        state-dependent content on top.
+        """
+        box = self.get_region_boxes()[region]
+        self.image.paste(self.get_board_template().crop(box), box[:2])
+
+        if region == "center_wind":
+            self.draw_center_wind(draw_frame=False)
+        elif region == "game_info":
+            self.draw_game_info(draw_frame=False)
+        else:
+            player_id = region[1]
+            self.draw_player_zone(
+                player_id, self.get_player_positions()[player_id], draw_frame=False
+            )
+
+    def draw_board_frames(self):
+        """Draw the static layers of the board held by the board template
+
+        These are the player zone frames, the center wind circle with its
+        caption and the game information frame.
+        """
+        key = self.get_layout_key()
+        for position in key[0]:
+            self.draw_player_zone_frame(position, position == key[3])
+        self.draw_center_wind_frame()
+        self.draw_game_info_frame()
+
+    def get_board_template(self):
+        """Return the pre-rendered static layers of the board
+
+        The template holds the background, player zone frames, center wind
+        circle with its caption and the game information frame. These only
+        depend on the zone positions in use, the canvas size and the winner's
+        position, so one template is rendered per combination and cached in
+        the board_templates class dictionary.
+
+        Returns:
+            RGB image that must not be modified; callers paste or copy it
+        """
+        key = self.get_layout_key()
+        template = self.board_templates.get(key)
+        if template is None:
+            template = Image.new(
+                "RGB", (self.width, self.height), self.COLORS["background"]
+            )
+            # Draw the static layers through this instance onto the template
+            image, draw = self.image, self.draw
+            self.image, self.draw = template, ImageDraw.Draw(template)
+            try:
+                self.draw_board_frames()
+            finally:
+                self.image, self.draw = image, draw
+            self.board_templates[key] = template
+        return template
+
+    def render(self):
+        """Render the game state onto the image
+
+        Starts from the cached board template and draws only the content that
+        depends on the game state.
+
+        Returns:
+            The rendered PIL Image
+        """
+        self.image.paste(self.get_board_template())
+        self.draw_all_player_zones(draw_frame=False)
+        self.draw_center_wind(draw_frame=False)
+        self.draw_game_info(draw_frame=False)
+        return self.image
+
+    @classmethod
+    def encode_image(cls, image, format="png", **options):
+        """Encode a rendered board image in memory
+
+        Args:
+            image: RGB image produced by render()
+            format: Output format, one of png, png8 (PNG quantized to
+                get_board_palette()), webp or jpeg
+            **options: Encoder options overriding the ENCODERS defaults, such
+                as compress_level for PNG, quality for JPEG and WebP or
+                lossless for WebP
+
+        Returns:
+            Encoded image as bytes
+
+        Raises:
+            MahjongVisualizerError: If the format is not supported
+        """
+        format = format.lower()
+        if format == "jpg":
+            format = "jpeg"
+        if format not in cls.ENCODERS:
+            raise MahjongVisualizerError(f"Unsupported image format: {format}")
+
+        if format == "png8":
+            image = image.quantize(
+                palette=cls.get_board_palette(), dither=Image.Dither.NONE
+            )
+
+        pil_format, defaults = cls.ENCODERS[format]
+        buffer = io.BytesIO()
+        image.save(buffer, pil_format, **{**defaults, **options})
+        return buffer.getvalue()
+
+    def render_bytes(self, format="png", **options):
+        """Render the game state and encode it in memory
+
+        Args:
+            format: Output format, see encode_image()
+            **options: Encoder options, see encode_image()
+
+        Returns:
+            Encoded image as bytes
+
+        Raises:
+            MahjongVisualizerError: If the format is not supported
+        """
+        return self.encode_image(self.render(), format, **options)
+
+    def generate(self, output_path, **options):
+        """Generate the visualization
+
+        Args:
+            output_path: Path of the image file, its extension selects the format
+            **options: Encoder options passed to Image.save()
+        """
+        self.render()
+        self.image.save(output_path, **options)
+
+    @staticmethod
+    def reduce_image(image, level):
+        """Downsample a rendered board to one pyramid level
+
+        Args:
+            image: Image to downsample
+            level: Integer reduction factor, reduced with Image.reduce() box
+                averaging, or a (width, height) size, reduced by the largest
+                integer factor that keeps at least twice the size and then
+                resampled with LANCZOS
+
+        Returns:
+            The downsampled image, or image itself for a factor of 1
+        """
+        if isinstance(level, int):
+            return image if level == 1 else image.reduce(level)
+        return image.resize(level, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    def render_pyramid(self, levels=None):
+        """Render the game state once and derive smaller versions of it
+
+        Drawing happens at the full resolution only. Each integer factor is
+        reduced from the previous level it is a multiple of, e.g. the quarter
+        size from the half size, so every level costs a fraction of the last.
+
+        Args:
+            levels: Pyramid levels, see reduce_image() (defaults to
+                PYRAMID_LEVELS)
+
+        Returns:
+            List of images in the order of levels; the full size image is
+            the render canvas, which is reused by the next render
+        """
+        base = self.render()
+        images = []
+        reduced = {1: base}
+        for level in levels or self.PYRAMID_LEVELS:
+            if isinstance(level, int):
+                if level not in reduced:
+                    source = max(factor for factor in reduced if level % factor == 0)
+                    reduced[level] = self.reduce_image(reduced[source], level // source)
+                images.append(reduced[level])
+            else:
+                images.append(self.reduce_image(base, level))
+        return images
+
+    def render_pyramid_bytes(self, levels=None, format="png", **options):
+        """Render the game state once and encode every pyramid level
+
+        Args:
+            levels: Pyramid levels, see render_pyramid()
+            format: Output format of every level, see encode_image()
+            **options: Encoder options, see encode_image()
+
+        Returns:
+            List of encoded images as bytes, in the order of levels
+
+        Raises:
+            MahjongVisualizerError: If the format is not supported
+        """
+        return [
+            self.encode_image(image, format, **options)
+            for image in self.render_pyramid(levels)
+        ]
+
+    def generate_pyramid(self, output_path, levels=None, **options):
+        """Generate the visualization at every pyramid level
+
+        The full size image is written to output_path, smaller levels next to
+        it with their size appended to the name, e.g. board_700x600.png.
+
+        Args:
+            output_path: Path of the full size image file, its extension
+                selects the format of every level
+            levels: Pyramid levels, see render_pyramid()
+            **options: Encoder options passed to Image.save()
+
+        Returns:
+            List of the written paths, in the order of levels
+        """
+        stem, extension = os.path.splitext(output_path)
+        paths = []
+        for image in self.render_pyramid(levels):
+            if image.size == (self.width, self.height):
+                path = output_path
+            else:
+                path = f"{stem}_{image.width}x{image.height}{extension}"
+            image.save(path, **options)
+            paths.append(path)
+        return paths
+
+
+class IncrementalRenderer:
+    """Renderer for sequences of game states that repaints only what changed
+
+    Keeps the previous game state and canvas. Each new state is compared with
+    the previous one per board region (player zones, center wind and game
+    information box) and only the regions whose content changed are
+    repainted. A full render is done for the first state, whenever the
+    layout changes, e.g. a different player count or winner, and for every
+    state of layouts whose regions overlap (see
+    MahjongVisualizer.regions_overlap()), as on boards smaller than the
+    default.
+
+    The returned image is reused by the next call; copy it to keep it.
+    """
+
+    def __init__(
+        self,
+        width=MahjongVisualizer.DEFAULT_WIDTH,
+        height=MahjongVisualizer.DEFAULT_HEIGHT,
+    ):
+        """Initialize the IncrementalRenderer
+
+        Args:
+            width: Width of the output images in pixels
+            height: Height of the output images in pixels
+        """
+        self.width = width
+        self.height = height
+        self.image = None
+        self.previous = None
+        self.previous_layout = None
+        # Regions repainted by the last render() call and their boxes
+        self.dirty_regions = []
+        self.dirty_boxes = []
+        # Whether the last render() call repainted the whole canvas
+        self.full_render = False
+
+    @staticmethod
+    def copy_game_data(game_data):
+        """Copy the mutable parts of a game state used for diffing
+
+        Cheaper than a deep copy: only the players and their tile lists are
+        copied, which is all that is compared between states.
+        """
+        if not isinstance(game_data, dict) or not isinstance(
+            game_data.get("players"), dict
+        ):
+            # Leave invalid data for validation to report
+            return copy.deepcopy(game_data)
+
+        game_data = dict(game_data)
+        game_data["players"] = {
+            player_id: (
+                {
+                    key: list(value) if isinstance(value, list) else value
+                    for key, value in player.items()
+                }
+                if isinstance(player, dict)
+                else player
+            )
+            for player_id, player in game_data["players"].items()
+        }
+        return game_data
+
+    def reset(self):
+        """Forget the previous state so the next render is a full render"""
+        self.previous = None
+        self.previous_layout = None
+
+    def get_dirty_regions(self, previous, current):
+        """Return the regions whose content differs between two visualizers
+
+        Both visualizers must share the same layout key.
+        """
+        dirty = []
+        for region in current.get_region_boxes():
+            if region == "center_wind":
+                changed = (
+                    previous.game_data["round_wind"] != current.game_data["round_wind"]
+                )
+            elif region == "game_info":
+                changed = (
+                    previous.get_game_info_items() != current.get_game_info_items()
+                )
+            else:
+                player_id = region[1]
+                changed = (
+                    previous.game_data["players"][player_id]
+                    != current.game_data["players"][player_id]
+                )
+            if changed:
+                dirty.append(region)
+        return dirty
+
+    def render(self, game_data):
+        """Render a game state, repainting only the regions that changed
+
+        Args:
+            game_data: Dictionary containing the mahjong game state, or a
+                mahjong_model.GameState
+
+        Returns:
+            The rendered PIL Image, owned by this renderer
+
+        Raises:
+            InvalidInputError: If the game data is invalid; the previous
+                state and canvas are kept
+        """
+        if not isinstance(game_data, GameState):
+            # Keep a private copy so callers may mutate their state afterwards;
+            # converting a GameState in MahjongVisualizer already copies it
+            game_data = self.copy_game_data(game_data)
+        visualizer = MahjongVisualizer(game_data, self.width, self.height, self.image)
+        self.image = visualizer.image
+        layout = visualizer.get_layout_key()
+
+        if (
+            self.previous is None
+            or layout != self.previous_layout
+            or visualizer.regions_overlap()
+        ):
+            # Layout changed or its regions overlap - full render
+            visualizer.render()
+            self.dirty_regions = list(visualizer.get_region_boxes())
+            self.dirty_boxes = [(0, 0, self.width, self.height)]
+            self.full_render = True
+        else:
+            self.dirty_regions = self.get_dirty_regions(self.previous, visualizer)
+            boxes = visualizer.get_region_boxes()
+            for region in self.dirty_regions:
+                visualizer.draw_region(region)
+            self.dirty_boxes = [boxes[region] for region in self.dirty_regions]
+            self.full_render = False
+
+        self.previous = visualizer
+        self.previous_layout = layout
+        return self.image
+
+
+class PooledRenderer:
+    """Long-lived renderer that can be shared between threads
+
+    Construct it once and call render() for every state, from any number of
+    threads, e.g. from a ThreadPoolExecutor. Fonts and tile images are loaded
+    when the renderer is created. Renders draw on canvases taken from a pool
+    of pre-allocated images instead of allocating about 5 MB per state; each
+    render starts by pasting the board template over the whole canvas, which
+    resets it. Pillow releases the GIL while encoding, so encoding in threads
+    runs in parallel.
+
+    Instrumentation (enable_instrumentation()) is not thread-safe and should
+    stay off while rendering in threads.
+    """
+
+    def __init__(
+        self,
+        width=MahjongVisualizer.DEFAULT_WIDTH,
+        height=MahjongVisualizer.DEFAULT_HEIGHT,
+        canvases=4,
+    ):
+        """Initialize the PooledRenderer
+
+        Args:
+            width: Width of the rendered images in pixels
+            height: Height of the rendered images in pixels
+            canvases: Number of canvases allocated up front and kept in the
+                pool; set it to the number of threads rendering at once.
+                More concurrent renders allocate extra canvases that are
+                dropped afterwards
+        """
+        self.width = width
+        self.height = height
+        self.max_canvases = canvases
+        self.pool = []
+        self.lock = threading.Lock()
+        MahjongVisualizer.preload_resources()
+        for _ in range(canvases):
+            self.pool.append(self.new_canvas())
+
+    def new_canvas(self):
+        """Allocate a canvas of the renderer's size"""
+        return Image.new(
+            "RGB", (self.width, self.height), MahjongVisualizer.COLORS["background"]
+        )
+
+    def acquire_canvas(self):
+        """Take a canvas from the pool, or allocate one if the pool is empty"""
+        with self.lock:
+            if self.pool:
+                return self.pool.pop()
+        return self.new_canvas()
+
+    def release_canvas(self, canvas):
+        """Return a canvas to the pool, unless the pool is already full"""
+        with self.lock:
+            if len(self.pool) < self.max_canvases:
+                self.pool.append(canvas)
+
+    @contextmanager
+    def rendered(self, game_data):
+        """Render a game state on a pooled canvas
+
+        The canvas goes back to the pool when the block ends, so the image
+        must not be used afterwards; copy it to keep it.
+
+        Args:
+            game_data: Game state dictionary or mahjong_model.GameState
+
+        Yields:
+            The rendered RGB image
+
+        Raises:
+            InvalidInputError: If the game state is invalid
+        """
+        canvas = self.acquire_canvas()
+        try:
+            yield MahjongVisualizer(game_data, self.width, self.height, canvas).render()
+        finally:
+            self.release_canvas(canvas)
+
+    def render(self, game_data, format="png", **options):
+        """Render a game state and encode it in memory
+
+        Args:
+            game_data: Game state dictionary or mahjong_model.GameState
+            format: Output format, see MahjongVisualizer.encode_image()
+            **options: Encoder options, see MahjongVisualizer.encode_image()
+
+        Returns:
+            Encoded image as bytes
+
+        Raises:
+            InvalidInputError: If the game state is invalid
+            MahjongVisualizerError: If the format is not supported
+        """
+        with self.rendered(game_data) as image:
+            return MahjongVisualizer.encode_image(image, format, **options)
+
+
+# Outcome of rendering one input file in batch mode, metrics holds the
+# instrumentation record of the render when instrumentation is enabled
+RenderResult = namedtuple(
+    "RenderResult",
+    ["input_path", "output_path", "error", "metrics"],
+    defaults=(None,),
+)
+
+
+def collect_inputs(sources):
+    """Expand batch input specifications into a list of JSON file paths
+
+    Each source may be a directory (all ``*.json`` files inside it), a glob
+    pattern, a list file prefixed with ``@`` (one path per line), or a plain
+    file path.
+
+    Args:
+        sources: Iterable of input specifications
+
+    Returns:
+        List of input file paths, in the order they were given
+    """
+    inputs = []
+    for source in sources:
+        if source.startswith("@"):
+            # List file - one input path per line, blank lines and comments ignored
+            with open(source[1:], "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        inputs.append(line)
+        elif os.path.isdir(source):
+            inputs.extend(sorted(glob.glob(os.path.join(source, "*.json"))))
+        elif glob.has_magic(source):
+            inputs.extend(sorted(glob.glob(source, recursive=True)))
+        else:
+            inputs.append(source)
+    return inputs
+
+
+def render_file(input_path, output_path, width=None, height=None, cache_dir=None):
+    """Render a single JSON game state file to an image file
+
+    Args:
+        input_path: Path to the JSON file containing the game state
+        output_path: Path for the output image file
+        width: Width of the output image in pixels (defaults to DEFAULT_WIDTH)
+        height: Height of the output image in pixels (defaults to DEFAULT_HEIGHT)
+        cache_dir: Directory of a render cache to reuse earlier renders from
+
+    Raises:
+        InvalidInputError: If the file does not contain valid game data
+    """
+    try:
+        with open(input_path, "r") as f:
+            game_data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise InvalidInputError(f"Invalid JSON in input file: {e}")
+
+    if cache_dir is not None:
+        # Imported here as mahjong_cache depends on this module
+        from mahjong_cache import open_cache
+
+        open_cache(cache_dir).generate(game_data, output_path, width, height)
+        return
+
+    visualizer = MahjongVisualizer(
+        game_data,
+        width or MahjongVisualizer.DEFAULT_WIDTH,
+        height or MahjongVisualizer.DEFAULT_HEIGHT,
+    )
+    visualizer.generate(output_path)
+
+
+def _init_batch_worker(instrument=False):
+    """Warm the font and tile caches once per batch worker process"""
+    if instrument:
+        MahjongVisualizer.enable_instrumentation()
+    MahjongVisualizer.preload_resources()
+
+
+def _render_batch_item(input_path, output_path, width, height, cache_dir):
+    """Render one batch item, reporting failures instead of raising them"""
+    instrumentation = MahjongVisualizer.instrumentation
+    renders = instrumentation.renders if instrumentation else 0
+    try:
+        render_file(input_path, output_path, width, height, cache_dir)
+        error = None
+    except FileNotFoundError:
+        error = "Input file not found"
+    except MahjongVisualizerError as e:
+        error = str(e)
+    except Exception as e:
+        error = f"Unexpected error: {e}"
+
+    # Only report metrics if a visualizer was created, not for cache hits
+    metrics = None
+    if instrumentation and instrumentation.renders > renders:
+        metrics = instrumentation.to_dict()["current"]
+    return RenderResult(input_path, output_path, error, metrics)
+
+
+def render_many(
+    sources,
+    output_dir,
+    workers=None,
+    width=None,
+    height=None,
+    output_format="png",
+    chunksize=16,
+    cache_dir=None,
+    instrument=False,
+):
+    """Render many game state files across a pool of worker processes
+
+    Each worker loads fonts and tile images once and then renders every
+    file it is given. A failing file is reported in its result and does
+    not abort the rest of the batch.
+
+    Args:
+        sources: Input specifications, see collect_inputs()
+        output_dir: Directory receiving one image per input, named after it;
+            inputs from different directories keep their directories
+            relative to the directory all inputs share, e.g. a/game.json
+            and b/game.json become a/game.png and b/game.png
+        workers: Number of worker processes (defaults to the CPU count)
+        width: Width of the output images in pixels
+        height: Height of the output images in pixels
+        output_format: File extension of the output images
+        chunksize: Number of files handed to a worker at a time
+        cache_dir: Directory of a render cache shared by the workers
+        instrument: Whether to enable instrumentation in the workers and
+            return the metrics of each render in its result
+
+    Yields:
+        RenderResult for each input, in input order; error is None on success
+    """
+    inputs = collect_inputs(sources)
+    directories = [os.path.dirname(os.path.abspath(path)) for path in inputs]
+    common = os.path.commonpath(directories) if directories else ""
+    outputs = []
+    for path, directory in zip(inputs, directories):
+        output_subdir = os.path.join(output_dir, os.path.relpath(directory, common))
+        os.makedirs(output_subdir, exist_ok=True)
+        outputs.append(
+            os.path.normpath(
+                os.path.join(output_subdir, f"{Path(path).stem}.{output_format}")
+            )
+        )
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_batch_worker,
+        initargs=(instrument,),
+    ) as executor:
+        yield from executor.map(
+            _render_batch_item,
+            inputs,
+            outputs,
+            [width] * len(inputs),
+            [height] * len(inputs),
+            [cache_dir] * len(inputs),
+            chunksize=chunksize,
+        )
+
+
+def run_batch(args):
+    """Run the --batch command line mode and return the process exit code"""
+    failures = 0
+    total = 0
+    if args.metrics:
+        # Imported here as mahjong_metrics depends on this module
+        from mahjong_metrics import RenderMetrics, write_metrics
+
+        metrics = RenderMetrics()
+        renders = 0
+
+    results = render_many(
+        args.inputs,
+        args.output_dir,
+        workers=args.workers,
+        width=args.width,
+        height=args.height,
+        output_format=args.format or "png",
+        cache_dir=args.cache_dir,
+        instrument=bool(args.metrics),
+    )
+    try:
+        for result in results:
+            total += 1
+            if result.metrics is not None:
+                metrics.merge(result.metrics)
+                renders += 1
+            if result.error is None:
+                print(f"OK: {result.input_path} -> {result.output_path}")
+            else:
+                failures += 1
+                print(f"Error: {result.input_path}: {result.error}")
+    except FileNotFoundError as e:
+        # Renders report their own errors; this is a missing @ list file
+        print(f"Error: Input file not found: {e.filename}")
+        return 1
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+
+    print(f"Rendered {total - failures} of {total} files ({failures} failed)")
+    if args.metrics:
+        write_metrics(args.metrics, metrics, renders)
+    return 1 if failures else 0
+
+
+def run_animation(args):
+    """Run the --animate command line mode and return the process exit code"""
+    # Imported here as mahjong_animation depends on this module
+    from mahjong_animation import iter_states, write_animation
+
+    if len(args.inputs) != 2:
+        print("Usage: python mahjong_visualizer.py --animate states.jsonl replay.gif")
+        return 1
+
+    input_file, output_file = args.inputs
+    try:
+        frame_count = write_animation(
+            iter_states(input_file),
+            output_file,
+            format=args.format,
+            duration=args.frame_duration,
+            loop=args.loop,
+            width=args.width,
+            height=args.height,
         )
+    except FileNotFoundError:
+        print(f"Error: Input file not found: {input_file}")
+        return 1
+    except MahjongVisualizerError as e:
+        print(f"Error: {e}")
+        return 1
+
+    print(f"Wrote {frame_count} frames to {output_file}")
+    return 0
+
+
+def parse_pyramid_levels(text):
+    """Parse a --pyramid value such as "1,2,4" or "1,4,320x274"
+
+    Returns:
+        List of pyramid levels, see MahjongVisualizer.reduce_image()
+    """
+    levels = []
+    for item in text.split(","):
+        item = item.strip().lower()
+        try:
+            if "x" in item:
+                width, height = (int(value) for value in item.split("x"))
+                if width < 1 or height < 1:
+                    raise ValueError
+                levels.append((width, height))
+            else:
+                factor = int(item)
+                if factor < 1:
+                    raise ValueError
+                levels.append(factor)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"invalid pyramid level {item!r}, expected a factor or WIDTHxHEIGHT"
+            )
+    return levels
 
-    def generate(self, output_path):
-        """Generate the visualization"""
-        self.draw_all_player_zones()
-        self.draw_center_wind()
-        self.draw_game_info()
-        self.image.save(output_path)
+
+def parse_level(text):
+    """Parse a single reduction level such as "4" or "350x300"
+
+    Returns:
+        Pyramid level, see MahjongVisualizer.reduce_image()
+    """
+    levels = parse_pyramid_levels(text)
+    if len(levels) != 1:
+        raise argparse.ArgumentTypeError(f"expected a single level, got {text!r}")
+    return levels[0]
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Generate images of mahjong game states from JSON data"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        metavar="input",
+        help="input JSON file, followed by the output image in single file mode",
+    )
+    # Each mode reads the inputs its own way, so at most one can be chosen
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument(
+        "--batch",
+        action="store_true",
+        help="render every input (file, directory, glob or @listfile) in parallel",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="output",
+        help="directory for batch output images (default: output)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=mahjong_validator.positive_int,
+        default=None,
+        help="number of batch or validation worker processes (default: CPU "
+        "count), or of mosaic rendering threads (default: 4)",
+    )
+    modes.add_argument(
+        "--validate-only",
+        action="store_true",
+        help="only validate the inputs (JSON, JSONL, directories, globs), in parallel",
+    )
+    mahjong_validator.add_arguments(parser)
+    modes.add_argument(
+        "--animate",
+        action="store_true",
+        help="render a sequence of states (JSONL or JSON list) as an animation",
+    )
+    parser.add_argument(
+        "--format",
+        default=None,
+        help="animation format: gif, apng or webp (default: output extension); "
+        "daemon and patch format: png, png8, webp or jpeg (default: png); "
+        "batch output file extension, e.g. png, jpg or webp (default: png)",
+    )
+    parser.add_argument(
+        "--frame-duration",
+        type=int,
+        default=500,
+        help="display time of each animation frame in ms (default: 500)",
+    )
+    parser.add_argument(
+        "--loop",
+        type=int,
+        default=0,
+        help="number of animation loops, 0 for forever (default: 0)",
+    )
+    modes.add_argument(
+        "--daemon",
+        action="store_true",
+        help="stay resident and render newline-delimited JSON states read from "
+        "stdin (input -) or a Unix socket (input is its path)",
+    )
+    parser.add_argument(
+        "--reply",
+        choices=("bytes", "paths"),
+        default="bytes",
+        help="daemon replies: length-prefixed image bytes, or paths of images "
+        "written to --output-dir (default: bytes)",
+    )
+    modes.add_argument(
+        "--mosaic",
+        type=int,
+        default=None,
+        metavar="COLUMNS",
+        help="render every state of the inputs into one mosaic image with this "
+        "many tables per row; the last input is the output image",
+    )
+    parser.add_argument(
+        "--cell",
+        type=parse_level,
+        default=1,
+        metavar="LEVEL",
+        help="mosaic table size: reduction factor or WIDTHxHEIGHT (default: 1)",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="render mosaic tables in --workers processes that hand back "
+        "their images through shared memory, instead of in threads",
+    )
+    parser.add_argument(
+        "--gap",
+        type=int,
+        default=0,
+        help="space between mosaic tables in pixels (default: 0)",
+    )
+    modes.add_argument(
+        "--patch",
+        action="store_true",
+        help="write only the rectangles that changed between two states "
+        "(inputs: previous state, new state, update file)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="reuse renders of identical game states cached in this directory",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="record render timings and counters into this JSON or .prom file",
+    )
+    parser.add_argument(
+        "--inline-sprites",
+        action="store_true",
+        help="for .svg output, embed the tile sprites instead of referring to "
+        "a sprite sheet written next to the output",
+    )
+    parser.add_argument(
+        "--pyramid",
+        type=parse_pyramid_levels,
+        default=None,
+        metavar="LEVELS",
+        help="render once and also write reduced copies, as comma separated "
+        "factors or WIDTHxHEIGHT sizes, e.g. 1,2,4 (bypasses --cache-dir)",
+    )
+    parser.add_argument(
+        "--turn",
+        type=int,
+        default=-1,
+        help="turn of a .replay input to render, counted from 0; negative "
+        "turns count from the end (default: -1, the last turn)",
+    )
+    parser.add_argument("--width", type=int, default=None, help="image width")
+    parser.add_argument("--height", type=int, default=None, help="image height")
+    return parser.parse_args(argv)
 
 
 def main():
-    if len(sys.argv) < 2:
+    args = parse_args()
+
+    if args.validate_only:
+        sys.exit(mahjong_validator.run_validation(args))
+
+    if args.batch:
+        sys.exit(run_batch(args))
+
+    if args.animate:
+        sys.exit(run_animation(args))
+
+    if args.mosaic is not None:
+        # Imported here as mahjong_mosaic depends on this module
+        from mahjong_mosaic import run_mosaic
+
+        sys.exit(run_mosaic(args))
+
+    if args.patch:
+        # Imported here as mahjong_patches depends on this module
+        from mahjong_patches import run_patch
+
+        sys.exit(run_patch(args))
+
+    if args.daemon:
+        # Imported here as mahjong_daemon depends on this module
+        from mahjong_daemon import run_daemon
+
+        sys.exit(run_daemon(args))
+
+    if len(args.inputs) > 2:
         print("Usage: python mahjong_visualizer.py input.json [output.png]")
         sys.exit(1)
 
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "output.png"
+    input_file = args.inputs[0]
+    output_file = args.inputs[1] if len(args.inputs) > 1 else "output.png"
+
+    if args.metrics:
+        MahjongVisualizer.enable_instrumentation()
 
     try:
-        with open(input_file, "r") as f:
-            game_data = json.load(f)
+        if input_file.endswith(".replay"):
+            # Imported here to keep replay support out of plain renders
+            from mahjong_replay import ReplayReader
+
+            with ReplayReader(input_file) as replay:
+                game_data = replay.state(args.turn)
+        else:
+            with open(input_file, "r") as f:
+                game_data = json.load(f)
     except json.JSONDecodeError as e:
         print(f"Error: Invalid JSON in input file: {e}")
         sys.exit(1)
     except FileNotFoundError:
         print(f"Error: Input file not found: {input_file}")
         sys.exit(1)
+    except (IndexError, MahjongVisualizerError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
     try:
-        visualizer = MahjongVisualizer(game_data)
-        visualizer.generate(output_file)
+        if output_file.lower().endswith(".svg"):
+            # Imported here as mahjong_svg depends on this module
+            from mahjong_svg import write_svg
+
+            write_svg(
+                game_data, output_file, args.width, args.height, args.inline_sprites
+            )
+        elif args.pyramid:
+            visualizer = MahjongVisualizer(
+                game_data,
+                args.width or MahjongVisualizer.DEFAULT_WIDTH,
+                args.height or MahjongVisualizer.DEFAULT_HEIGHT,
+            )
+            for path in visualizer.generate_pyramid(output_file, args.pyramid):
+                print(f"Wrote {path}")
+        elif args.cache_dir is not None:
+            from mahjong_cache import open_cache
+
+            open_cache(args.cache_dir).generate(
+                game_data, output_file, args.width, args.height
+            )
+        else:
+            visualizer = MahjongVisualizer(
+                game_data,
+                args.width or MahjongVisualizer.DEFAULT_WIDTH,
+                args.height or MahjongVisualizer.DEFAULT_HEIGHT,
+            )
+            visualizer.generate(output_file)
     except MahjongVisualizerError as e:
         print(f"Error: {e}")
         sys.exit(1)
@@ -857,6 +2493,16 @@ def main():
         print(f"Unexpected error: {e}")
         sys.exit(1)
 
+    if args.metrics:
+        from mahjong_metrics import write_metrics
+
+        instrumentation = MahjongVisualizer.disable_instrumentation()
+        write_metrics(args.metrics, instrumentation.total, instrumentation.renders)
+
 
 if __name__ == "__main__":
+    # Run through the importable module so that helper modules importing
+    # mahjong_visualizer share its classes and caches
+    from mahjong_visualizer import main
+
     main()